@@ -51,9 +51,12 @@ def main():
     apcp_file = args["file"]
     troposphere_file = args["tfile"]
 
+    # apcpとtroposphereではlatが逆向きに入っているが、readncが向きを揃えるので緯度経度を使い回せる。
+    meteo_tool = meteotool.MeteoTools(
+        troposphere_file if troposphere_file is not None else apcp_file)
+    lat, lon = meteo_tool.get_lat_lon()
+
     if args["tfile"] is not None:
-        meteo_tool = meteotool.MeteoTools(troposphere_file)
-        lat, lon = meteo_tool.get_lat_lon()
         rh_surf = meteo_tool.get_parameter("r", isobaric_surface=1000)
 
         temp_c_850 = meteo_tool.get_parameter("t", isobaric_surface=850) - 273.15
@@ -63,15 +66,12 @@ def main():
         snow_ratio = meteo_tool.snow_or_rain(
             temp_k_surf, rh_surf, isobaric_surface=1000)
 
-    # apcpとtroposphereではlatが逆向きに入っているため緯度経度やjp_maskの使い回しができない。
-    meteo_tool2 = meteotool.MeteoTools(apcp_file)
-    lat2, lon2 = meteo_tool2.get_lat_lon()
-    apcp = meteo_tool2.get_parameter("APCP_surface")
+    apcp = meteo_tool.get_parameter("APCP_surface", ncfile=apcp_file)
 
     # plot
     outname = output_name(apcp_file)
-    jp_map = japanmap.JpMap()
-    jp_map.shade_plot(lon2, lat2, apcp,
+    jp_map = japanmap.JpMap(grid=meteo_tool.get_grid())
+    jp_map.shade_plot(lon, lat, apcp,
                       label=f'Precipitation (kg/$m^2$)/6h',
                       color_bar_label_max=20,
                       color_bar_label_min=0,
@@ -59,9 +59,12 @@ def main():
     end_event_file = args["file"][1]
     troposphere_file = args["tfile"]
 
+    # apcpとtroposphereではlatが逆向きに入っているが、readncが向きを揃えるので緯度経度を使い回せる。
+    meteo_tool = meteotool.MeteoTools(
+        troposphere_file if troposphere_file is not None else begin_event_file)
+    lat, lon = meteo_tool.get_lat_lon()
+
     if args["tfile"] is not None:
-        meteo_tool = meteotool.MeteoTools(troposphere_file)
-        lat, lon = meteo_tool.get_lat_lon()
         rh_surf = meteo_tool.get_parameter("r", isobaric_surface=1000)
 
         temp_c_850 = meteo_tool.get_parameter("t", isobaric_surface=850) - 273.15
@@ -71,18 +74,15 @@ def main():
         snow_ratio = meteo_tool.snow_or_rain(
             temp_k_surf, rh_surf, isobaric_surface=1000)
 
-    # apcpとtroposphereではlatが逆向きに入っているため緯度経度やjp_maskの使い回しができない。
-    cal_phys = meteotool.MeteoTools(begin_event_file)
-    lat2, lon2 = cal_phys.get_lat_lon()
     apcp_data = []
     for file_ in begin_event_file, end_event_file:
-        apcp_data.append(cal_phys.get_parameter("APCP_surface", ncfile=file_))
+        apcp_data.append(meteo_tool.get_parameter("APCP_surface", ncfile=file_))
     diff_apcp = apcp_data[1] - apcp_data[0]
 
     # plot
     outname, cumulative_time = output_name(args["file"])
-    jp_map = japanmap.JpMap()
-    jp_map.shade_plot(lon2, lat2, diff_apcp,
+    jp_map = japanmap.JpMap(grid=meteo_tool.get_grid())
+    jp_map.shade_plot(lon, lat, diff_apcp,
             label=f'Precipitation (kg$m^2$)/{str(cumulative_time)}h',
             color_bar_label_max=60,
             color_bar_label_min=0,
@@ -57,20 +57,16 @@ def main():
     lat, lon = meteo_tool.get_lat_lon()
     isobaric_surface = (250, 850)
 
-    u_wind_list = []
-    v_wind_list = []
-    for pressure in isobaric_surface:
-        u_wind_list.append(meteo_tool.get_parameter('u', isobaric_surface=pressure))
-        v_wind_list.append(meteo_tool.get_parameter('v', isobaric_surface=pressure))
+    params = meteo_tool.get_parameters(['u', 'v'], levels=isobaric_surface)
 
     # sub 850 hPa - 250 hPa wind.
-    diff_u_wind = np.array(u_wind_list[0]) - np.array(u_wind_list[1])
-    diff_v_wind = np.array(v_wind_list[0]) - np.array(v_wind_list[1])
+    diff_u_wind = params['u'][0] - params['u'][1]
+    diff_v_wind = params['v'][0] - params['v'][1]
 
     diff_wind_size = vector_size(diff_u_wind, diff_v_wind)
 
     # plot
-    jp_map = japanmap.JpMap()
+    jp_map = japanmap.JpMap(grid=meteo_tool.get_grid())
     jp_map.shade_plot(lon, lat, diff_wind_size,
             label="upper-lower wind (m/s)",
             color_bar_label_max=80,
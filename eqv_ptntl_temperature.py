@@ -70,7 +70,7 @@ def main():
     height_gpm = meteo_tool.get_parameter('gh', isobaric_surface=isobaric_surface)
 
     # plot
-    jp_map = japanmap.JpMap()
+    jp_map = japanmap.JpMap(grid=meteo_tool.get_grid())
     jp_map.contour_plot(lon, lat, height_gpm)
     jp_map.shade_plot(lon, lat, eqv_potential_temperature,
         label="equivalent potential temperature (K)",
@@ -72,6 +72,7 @@ def main():
 
     meteo_tool = meteotool.MeteoTools(args["file"])
     lat, lon = meteo_tool.get_lat_lon_xr()
+    grid = meteo_tool.get_grid()
 
     isobaric_surface = (850, 500, 300)
     for pressure in isobaric_surface:
@@ -94,7 +95,7 @@ def main():
         v_wind = meteo_tool.get_parameter('v', isobaric_surface=pressure)
 
         # plot
-        jp_map = japanmap.JpMap()
+        jp_map = japanmap.JpMap(grid=grid)
         jp_map.contour_plot(lon, lat, temp_k)
 
         if pressure == 850:
@@ -65,18 +65,21 @@ def main():
 
     meteo_tool = meteotool.MeteoTools(args["file"])
     lat, lon = meteo_tool.get_lat_lon()
+    grid = meteo_tool.get_grid()
     isobaric_surface = (850, 500, 300)
     label_max = (30, 50, 80)
     lebel_min = (10, 20, 40)
 
+    # get parameter (level, lat, lon)
+    params = meteo_tool.get_parameters(['gh', 'u', 'v'], levels=isobaric_surface)
+
     for i, pressure in enumerate(isobaric_surface):
-        # get parameter
-        height_gpm = meteo_tool.get_parameter('gh', isobaric_surface=pressure)
-        u_wind = meteo_tool.get_parameter('u', isobaric_surface=pressure)
-        v_wind = meteo_tool.get_parameter('v', isobaric_surface=pressure)
+        height_gpm = params['gh'][i]
+        u_wind = params['u'][i]
+        v_wind = params['v'][i]
         wind_size = vector_size(u_wind, v_wind)
 
-        jp_map = japanmap.JpMap()
+        jp_map = japanmap.JpMap(grid=grid)
         jp_map.contour_plot(lon, lat, height_gpm)
         jp_map.shade_plot(lon, lat, wind_size,
                 label="wind speed (m/s)",
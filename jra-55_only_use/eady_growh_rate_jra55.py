@@ -12,6 +12,7 @@ Date: 2021/10/22
 import argparse
 import numpy as np
 from ncmagics import japanmap, meteotool
+from ncmagics.grid import Grid
 
 
 def parse_args() -> dict:
@@ -66,7 +67,7 @@ def cal_eady_growh_rate(N: np.ndarray, d_u: np.ndarray, d_z: np.ndarray,
         np.ndarray:
     """
     omega = 6.28 / 86400
-    _, lat_2d = np.meshgrid(lon, lat)
+    lat_2d = Grid.from_axes(lat, lon).lat_2d
     f = 2 * omega * np.sin(np.radians(lat_2d))
 
     sigma = 0.31 * (f/N) * np.abs(d_u/d_z) * 3600 * 24
@@ -119,7 +120,7 @@ def main():
     sigma = cal_eady_growh_rate(N, d_u, d_z, lat, lon)
 
     # plot data
-    jp_map = japanmap.JpMap()
+    jp_map = japanmap.JpMap(grid=meteo_tool.get_grid())
     jp_map.contour_plot(lon, lat, sigma)
     jp_map.shade_plot(lon, lat, sigma, label="eady growth rate (day$^{-1}$)", color_bar_label_min=0, color_bar_label_max=1,)
     jp_map.save_fig("sigma", "Eady growth rate (day$^{-1}$)")
@@ -12,10 +12,10 @@ Date: 2021/09/29
 import argparse
 from datetime import datetime, timedelta
 import os
-from os.path import abspath, dirname, join
+from os.path import abspath, dirname
 import re
-from netCDF4 import Dataset
 import xarray as xr
+from ncmagics import inventory, ncpool
 
 
 def parse_args() -> dict:
@@ -30,16 +30,13 @@ def parse_args() -> dict:
 
 def mk_file_lists(root_dir, filter_) -> list:
     """Make ncfile list sorted by datetime order."""
-    file_list = sorted([
-        ncfile
-        for ncfile in map(lambda ncfile: join(root_dir, ncfile) ,os.listdir(root_dir))
-        if filter_ in ncfile
-    ])
+    file_list = inventory.list_files(root_dir, filter_)
     return file_list
 
 
 def read_ncfile(ncfile, param):
-    nc = Dataset(ncfile).variables[param][:]
+    with ncpool.open_dataset(ncfile) as (dataset, lock), lock:
+        nc = dataset.variables[param][:]
     return nc
 
 
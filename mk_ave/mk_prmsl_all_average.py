@@ -12,10 +12,10 @@ Date: 2021/11/11
 import argparse
 from datetime import datetime, timedelta
 import os
-from os.path import abspath, dirname, join
+from os.path import abspath, dirname
 import re
-from netCDF4 import Dataset
 import xarray as xr
+from ncmagics import inventory, ncpool
 
 
 def parse_args() -> dict:
@@ -30,17 +30,17 @@ def parse_args() -> dict:
 
 def mk_file_lists(root_dir, filter_) -> list:
     """Make ncfile list sorted by datetime order."""
-    file_list = sorted([
+    file_list = [
         ncfile
-        for ncfile in map(lambda ncfile: join(root_dir, ncfile) ,os.listdir(root_dir))
-        if filter_ in ncfile
+        for ncfile in inventory.list_files(root_dir, filter_)
         if not "prmsl" in ncfile
-    ])
+    ]
     return file_list
 
 
 def read_ncfile(ncfile, param):
-    nc = Dataset(ncfile).variables[param][:]
+    with ncpool.open_dataset(ncfile) as (dataset, lock), lock:
+        nc = dataset.variables[param][:]
     return nc
 
 
@@ -13,11 +13,11 @@ Date: 2021/09/29
 import argparse
 from datetime import datetime, timedelta
 import os
-from os.path import abspath, join
+from os.path import abspath
 import re
 from numpy.ma.core import MaskedArray
-from netCDF4 import Dataset
 import xarray as xr
+from ncmagics import inventory, ncpool
 
 
 def parse_args() -> dict:
@@ -43,11 +43,7 @@ def mk_file_lists(root_dir: str, filter_: str) -> list:
     Returns:
         list:
     """
-    file_list = sorted([
-        ncfile
-        for ncfile in map(lambda ncfile: join(root_dir, ncfile) ,os.listdir(root_dir))
-        if filter_ in ncfile
-    ])
+    file_list = inventory.list_files(root_dir, filter_)
     return file_list
 
 
@@ -62,7 +58,8 @@ def read_ncfile(ncfile: str, param: str) -> MaskedArray:
     Returns:
         numpy.ma.core.MaskedArray:
     """
-    return Dataset(ncfile).variables[param][:]
+    with ncpool.open_dataset(ncfile) as (dataset, lock), lock:
+        return dataset.variables[param][:]
 
 
 def mk_6h_ago_ncfile_name(ncfile: str) -> str:
@@ -0,0 +1,46 @@
+# coding: utf-8
+"""
+Name: arrayutil.py
+
+small helpers shared by grid, vinterp and meteotool.
+
+example:
+    from ncmagics.arrayutil import cached, plain
+    field = plain(masked_array)  # masked values are NaN
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from typing import Callable
+import functools
+import numpy as np
+
+
+def cached(method: Callable) -> property:
+    """cached.
+    read-only property computed once per instance.
+    The instance has _cache (dict) and _lock (threading.RLock or Lock).
+
+    Args:
+        method (Callable): method
+    """
+    @functools.wraps(method)
+    def _wrapper(self):
+        try:
+            return self._cache[method.__name__]
+        except KeyError:
+            with self._lock:
+                return self._cache.setdefault(method.__name__, method(self))
+    return property(_wrapper)
+
+
+def plain(array) -> np.ndarray:
+    """plain.
+    float ndarray. masked values are NaN.
+
+    Args:
+        array: np.ndarray, np.ma.MaskedArray or xr.DataArray
+    """
+    if np.ma.isMaskedArray(array):
+        return np.ma.filled(array.astype(np.result_type(array, np.float32)), np.nan)
+    return np.asarray(array)
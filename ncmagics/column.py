@@ -0,0 +1,204 @@
+# coding: utf-8
+"""
+Name: column.py
+
+Vertical integration in pressure of (..., level, lat, lon) arrays
+(e.g. (level, lat, lon) or (time, level, lat, lon) of get_parameters()).
+(1/g) * integral of field dp is a weighted sum over the level axis (-3).
+The trapezoid weights are computed once per (levels, bottom, top), and
+levels below the ground are masked by surface_pressure.
+Units are SI: pressure [Pa], specific humidity [kg/kg], wind [m/s].
+
+example:
+    from ncmagics import column
+    pressure = [100000, 92500, 85000, 70000, 50000, 30000]
+    pw = column.precipitable_water(pressure, q, bottom=100000, top=30000)  # [mm]
+    ivt_u, ivt_v = column.integrated_vapor_transport(pressure, q, u_wind, v_wind)
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from typing import Optional, Sequence, Tuple
+import functools
+import numpy as np
+
+G = 9.80665  # [m/s^2] (same as metpy.constants.g)
+
+
+def column_weights(pressure: Sequence[float], bottom: Optional[float] = None,
+                   top: Optional[float] = None, surface_pressure=None) -> np.ndarray:
+    """column_weights.
+    dp / g of each level [kg/m^2] for the piecewise linear (trapezoid)
+    integral from bottom to top. Layers cut by bottom or top are interpolated
+    linearly in pressure. No extrapolation outside the levels.
+    Levels below surface_pressure are not used, and the layer between the ground
+    and the lowest level above it has the value of that level.
+
+    Args:
+        pressure (Sequence[float]): levels [Pa] in the order of the level axis (ascending or descending).
+        bottom (Optional[float]): bottom of the column [Pa]. None means the highest pressure.
+        top (Optional[float]): top of the column [Pa]. None means the lowest pressure.
+        surface_pressure: (..., lat, lon) [Pa] or None.
+
+    Returns:
+        np.ndarray: (level, 1, 1) or (..., level, lat, lon) if surface_pressure is given.
+    """
+    pressure = tuple(float(level) for level in pressure)
+    bottom = max(pressure) if bottom is None else float(bottom)
+    top = min(pressure) if top is None else float(top)
+    if surface_pressure is None:
+        return _cached_weights(pressure, bottom, top)
+
+    surface_pressure = np.asarray(surface_pressure, dtype=np.float64)
+    weights = _weights(np.array(pressure), np.minimum(surface_pressure, bottom), top,
+                       surface_pressure)
+    return np.moveaxis(weights, 0, -3)
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_weights(pressure: Tuple[float, ...], bottom: float, top: float) -> np.ndarray:
+    """_cached_weights.
+    column_weights() without surface_pressure, shape is (level, 1, 1). read-only.
+
+    Args:
+        pressure (Tuple[float, ...]): levels [Pa]
+        bottom (float): bottom [Pa]
+        top (float): top [Pa]
+    """
+    weights = _weights(np.array(pressure), np.float64(bottom), top, None)
+    weights = weights[:, np.newaxis, np.newaxis]
+    weights.setflags(write=False)
+    return weights
+
+
+def _weights(pressure: np.ndarray, bottom: np.ndarray, top: float,
+             surface_pressure: Optional[np.ndarray]) -> np.ndarray:
+    """_weights.
+    integral of the linear interpolation of f between level k and k+1
+    over [max(p_low, top), min(p_high, bottom)] is
+    length * ((1 - s) f_k + s f_k+1), where s is the position of the middle of the
+    layer between p_k and p_k+1.
+
+    Args:
+        pressure (np.ndarray): (level,) [Pa]
+        bottom (np.ndarray): scalar or (...) [Pa]
+        top (float): top [Pa]
+        surface_pressure (Optional[np.ndarray]): (...) [Pa]
+
+    Returns:
+        np.ndarray: (level,) + bottom.shape
+    """
+    shape = (len(pressure) - 1,) + (1,) * np.ndim(bottom)
+    p_k = pressure[:-1].reshape(shape)
+    p_k1 = pressure[1:].reshape(shape)
+    lower = np.maximum(np.minimum(p_k, p_k1), top)
+    upper = np.minimum(np.maximum(p_k, p_k1), bottom)
+    length = np.maximum(upper - lower, 0.)
+    position = ((lower + upper) / 2 - p_k) / (p_k1 - p_k)
+    if surface_pressure is not None:
+        # values below the ground are not used.
+        position = np.where(p_k > surface_pressure, 1., position)
+        position = np.where(p_k1 > surface_pressure, 0., position)
+
+    weights = np.zeros((len(pressure),) + np.shape(bottom))
+    weights[:-1] += length * (1 - position)
+    weights[1:] += length * position
+    return weights / G
+
+
+def column_integral(field: np.ndarray, pressure: Sequence[float], bottom: Optional[float] = None,
+                    top: Optional[float] = None, surface_pressure=None) -> np.ndarray:
+    """column_integral.
+    (1/g) * integral of field dp from bottom to top [unit * kg/m^2].
+    NaN of levels which are not used (outside the column, below the ground)
+    doesn't make the result NaN.
+
+    Args:
+        field (np.ndarray): (..., level, lat, lon)
+        pressure (Sequence[float]): levels of the level axis [Pa]
+        bottom (Optional[float]): bottom [Pa]
+        top (Optional[float]): top [Pa]
+        surface_pressure: (..., lat, lon) [Pa] or None.
+
+    Returns:
+        np.ndarray: (..., lat, lon)
+    """
+    field = np.asarray(field)
+    dtype = np.result_type(field, np.float32)
+    weights = column_weights(pressure, bottom, top, surface_pressure)
+    if surface_pressure is None:
+        used = np.flatnonzero(weights[:, 0, 0])
+        return np.einsum("...kij,k->...ij", np.take(field, used, axis=-3),
+                         weights[used, 0, 0].astype(dtype))
+    weighted = np.where(weights != 0, field * weights.astype(dtype), 0)
+    return weighted.sum(axis=-3, dtype=dtype)
+
+
+def layer_mean(field: np.ndarray, pressure: Sequence[float], bottom: Optional[float] = None,
+               top: Optional[float] = None, surface_pressure=None) -> np.ndarray:
+    """layer_mean.
+    pressure weighted mean of field from bottom (or the ground) to top.
+
+    Args:
+        field (np.ndarray): (..., level, lat, lon)
+        pressure (Sequence[float]): levels of the level axis [Pa]
+        bottom (Optional[float]): bottom [Pa]
+        top (Optional[float]): top [Pa]
+        surface_pressure: (..., lat, lon) [Pa] or None.
+
+    Returns:
+        np.ndarray: (..., lat, lon)
+    """
+    mass = column_weights(pressure, bottom, top, surface_pressure).sum(axis=-3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return column_integral(field, pressure, bottom, top, surface_pressure) / mass
+
+
+def precipitable_water(pressure: Sequence[float], specific_humidity: np.ndarray,
+                       bottom: Optional[float] = None, top: Optional[float] = None,
+                       surface_pressure=None) -> np.ndarray:
+    """precipitable_water.
+    (1/g) * integral of q dp [kg/m^2] (= [mm]).
+    Specific humidity q (mass of vapor / mass of moist air) is integrated.
+    metpy.calc.precipitable_water integrates mixing ratio w = q / (1 - q)
+    instead, which is larger by 1 + w (up to 1.3 % for moist tropical columns).
+    Give mixing ratio as specific_humidity to get the MetPy value.
+
+    Args:
+        pressure (Sequence[float]): levels [Pa]
+        specific_humidity (np.ndarray): (..., level, lat, lon) [kg/kg]
+        bottom (Optional[float]): bottom [Pa]
+        top (Optional[float]): top [Pa]
+        surface_pressure: (..., lat, lon) [Pa] or None.
+
+    Returns:
+        np.ndarray: (..., lat, lon)
+    """
+    return column_integral(specific_humidity, pressure, bottom, top, surface_pressure)
+
+
+def integrated_vapor_transport(pressure: Sequence[float], specific_humidity: np.ndarray,
+                               u_wind: np.ndarray, v_wind: np.ndarray,
+                               bottom: Optional[float] = None, top: Optional[float] = None,
+                               surface_pressure=None) -> Tuple[np.ndarray, np.ndarray]:
+    """integrated_vapor_transport.
+    IVT = (1/g) * integral of q V dp [kg/m/s].
+    np.hypot(ivt_u, ivt_v) is the magnitude.
+
+    Args:
+        pressure (Sequence[float]): levels [Pa]
+        specific_humidity (np.ndarray): (..., level, lat, lon) [kg/kg]
+        u_wind (np.ndarray): (..., level, lat, lon) [m/s]
+        v_wind (np.ndarray): (..., level, lat, lon) [m/s]
+        bottom (Optional[float]): bottom [Pa]
+        top (Optional[float]): top [Pa]
+        surface_pressure: (..., lat, lon) [Pa] or None.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: ivt_u, ivt_v
+    """
+    specific_humidity = np.asarray(specific_humidity)
+    return (
+        column_integral(specific_humidity * u_wind, pressure, bottom, top, surface_pressure),
+        column_integral(specific_humidity * v_wind, pressure, bottom, top, surface_pressure),
+    )
@@ -0,0 +1,132 @@
+# coding: utf-8
+"""
+Name: diskcache.py
+
+Persistent cache of region cut fields read by readnc.CalcPhysics.
+Each (ncfile, variable, level, region, dtype) field is stored as raw .npy
+and .json metadata, and loaded by np.load(mmap_mode="r").
+Cache is invalid when size or mtime of the ncfile changed.
+It is disabled until cache directory is set.
+
+example:
+    from ncmagics import diskcache
+    diskcache.set_cache_dir("~/.cache/ncmagics")
+
+or set NCMAGICS_DISK_CACHE=<dir> environment variable.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from typing import Optional
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+
+# change it when the layout of cached fields changes.
+FORMAT_VERSION = 2
+
+
+class DiskCache:
+    """DiskCache.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """__init__.
+
+        Args:
+            cache_dir (Optional[str]): None means disabled.
+        """
+        self.cache_dir = None if cache_dir is None else os.path.expanduser(cache_dir)
+
+    def _path(self, key: tuple) -> str:
+        """_path.
+        file path without extension. size and mtime are not in the key,
+        so the invalid cache is overwritten.
+
+        Args:
+            key (tuple): key
+        """
+        name = hashlib.sha1(repr((FORMAT_VERSION,) + key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name)
+
+    def load(self, ncfile: str, key: tuple) -> Optional[np.ndarray]:
+        """load.
+
+        Args:
+            ncfile (str): source ncfile
+            key (tuple): (ncfile, variable, level, region, dtype)
+
+        Returns:
+            Optional[np.ndarray]: read-only memory-mapped array. None if not cached.
+        """
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path + ".json") as meta_file:
+                meta = json.load(meta_file)
+            stat = os.stat(ncfile)
+            if meta["size"] != stat.st_size or meta["mtime_ns"] != stat.st_mtime_ns:
+                return None
+            return np.load(path + ".npy", mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, ncfile: str, key: tuple, field: np.ndarray):
+        """save.
+        .npy is written before .json, so .json always points to complete .npy.
+
+        Args:
+            ncfile (str): source ncfile
+            key (tuple): (ncfile, variable, level, region, dtype)
+            field (np.ndarray): field
+        """
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        stat = os.stat(ncfile)
+        meta = {
+            "ncfile": ncfile,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "key": repr(key),
+            "shape": list(field.shape),
+            "dtype": str(field.dtype),
+        }
+        self._write(path + ".npy", lambda out: np.save(out, np.ascontiguousarray(field)))
+        self._write(path + ".json", lambda out: out.write(json.dumps(meta).encode()))
+
+    @staticmethod
+    def _write(path: str, write):
+        """_write.
+        write to temporary file and rename it (atomic).
+
+        Args:
+            path (str): path
+            write: function which writes to file object.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                write(out)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+CACHE = DiskCache(os.environ.get("NCMAGICS_DISK_CACHE"))
+
+
+def set_cache_dir(cache_dir: Optional[str]):
+    """set_cache_dir.
+    set cache directory of the shared disk cache. None means disabled.
+
+    Args:
+        cache_dir (Optional[str]): cache_dir
+    """
+    CACHE.cache_dir = None if cache_dir is None else os.path.expanduser(cache_dir)
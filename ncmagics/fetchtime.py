@@ -10,10 +10,22 @@ Author: Ryosuke Tomita
 Date: 2021/12/20
 """
 import netCDF4
+from ncmagics import ncpool
 
 
-def fetch_time(ncfile: str) -> str:
-    data_set = netCDF4.Dataset(ncfile, 'r')
+def valid_time(data_set: netCDF4.Dataset, time_index=0):
+    """valid_time.
+    decode "time" of open netcdf file.
+
+    Args:
+        data_set (netCDF4.Dataset): data_set
+        time_index: index or slice of time axis.
+    """
     time = data_set.variables["time"]
-    date_time = str(netCDF4.num2date(time[0], time.units)).replace(" ", "_")[:13]
+    return netCDF4.num2date(time[time_index], time.units)
+
+
+def fetch_time(ncfile: str) -> str:
+    with ncpool.open_dataset(ncfile) as (data_set, lock), lock:
+        date_time = str(valid_time(data_set)).replace(" ", "_")[:13]
     return date_time
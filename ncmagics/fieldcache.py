@@ -0,0 +1,112 @@
+# coding: utf-8
+"""
+Name: fieldcache.py
+
+In-memory LRU cache of fields read by readnc.CalcPhysics.
+key is (ncfile, file stamp, variable, level, region, dtype) and
+the total size of cached arrays is limited by max_bytes.
+Every array returned by put() and get() is a read-only view (also when
+the field is too large to be cached or the cache is disabled), so callers
+can't corrupt cached fields and the result doesn't depend on the size.
+The array given to put() is not frozen.
+
+example:
+    from ncmagics import fieldcache
+    fieldcache.set_max_bytes(1024 ** 3)  # 1 GiB
+    fieldcache.set_max_bytes(0)  # disable
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from collections import OrderedDict
+from typing import Hashable, Optional
+import os
+import threading
+import numpy as np
+
+
+class FieldCache:
+    """FieldCache.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        """__init__.
+
+        Args:
+            max_bytes: memory budget [byte]. 0 means no cache.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._fields: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """get.
+
+        Args:
+            key (Hashable): key
+
+        Returns:
+            Optional[np.ndarray]: None if key is not cached.
+        """
+        with self._lock:
+            field = self._fields.get(key)
+            if field is not None:
+                self._fields.move_to_end(key)
+            return field
+
+    def put(self, key: Hashable, field: np.ndarray) -> np.ndarray:
+        """put.
+        store read-only view of field and return it.
+        field larger than max_bytes is not stored (the view is returned).
+        field is not copied, so don't change it after put().
+
+        Args:
+            key (Hashable): key
+            field (np.ndarray): field
+
+        Returns:
+            np.ndarray: read-only view
+        """
+        field = field.view()
+        field.setflags(write=False)
+        if field.nbytes > self.max_bytes:
+            return field
+        with self._lock:
+            old_field = self._fields.pop(key, None)
+            if old_field is not None:
+                self.nbytes -= old_field.nbytes
+            self._fields[key] = field
+            self.nbytes += field.nbytes
+            self._evict()
+        return field
+
+    def _evict(self):
+        """_evict.
+        drop least recently used fields. Call with self._lock.
+        """
+        while self.nbytes > self.max_bytes and self._fields:
+            _, field = self._fields.popitem(last=False)
+            self.nbytes -= field.nbytes
+
+    def clear(self):
+        """clear.
+        """
+        with self._lock:
+            self._fields.clear()
+            self.nbytes = 0
+
+
+CACHE = FieldCache(max_bytes=int(os.environ.get("NCMAGICS_CACHE_BYTES", 256 * 1024 ** 2)))
+
+
+def set_max_bytes(max_bytes: int):
+    """set_max_bytes.
+    change memory budget of the shared cache.
+
+    Args:
+        max_bytes (int): max_bytes
+    """
+    with CACHE._lock:
+        CACHE.max_bytes = max_bytes
+        CACHE._evict()
@@ -0,0 +1,339 @@
+# coding: utf-8
+"""
+Name: grid.py
+
+lat lon grid and its geometry (2D coordinates, grid spacing,
+coriolis parameter, cell area, finite difference operator).
+Each geometry is computed once and shared in the process.
+Recently used grids are kept (max number is set_max_grids() or
+NCMAGICS_MAX_GRIDS).
+
+example:
+    from ncmagics.grid import Grid
+    grid = Grid.from_axes(lat, lon)
+    lon_2d, lat_2d = grid.mesh
+    vorticity = grid.operator.vorticity(u_wind, v_wind)  # (..., lat, lon)
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from collections import OrderedDict
+from typing import Tuple
+import dataclasses
+import hashlib
+import os
+import threading
+import numpy as np
+from ncmagics.arrayutil import cached, plain
+
+EARTH_RADIUS = 6371008.7714  # [m] (same as metpy.constants.earth_avg_radius)
+OMEGA = 7.292115e-5  # [rad/s] (same as metpy.constants.earth_avg_angular_vel)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    """_read_only.
+
+    Args:
+        array (np.ndarray): array
+    """
+    array.setflags(write=False)
+    return array
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class Grid:
+    """Grid.
+    Use Grid.from_axes() to share one instance per lat lon
+    (least recently used grids are dropped from the share).
+    lat, lon [degree] are read-only 1D array.
+    """
+    lat: np.ndarray
+    lon: np.ndarray
+    _cache: dict = dataclasses.field(default_factory=dict, repr=False)
+    _lock: threading.RLock = dataclasses.field(default_factory=threading.RLock, repr=False)
+
+    @classmethod
+    def from_axes(cls, lat, lon) -> "Grid":
+        """from_axes.
+        Grid of lat, lon. The same lat, lon returns the same instance.
+
+        Args:
+            lat: lat (np.ndarray or xr.DataArray)
+            lon: lon (np.ndarray or xr.DataArray)
+
+        Returns:
+            Grid:
+        """
+        lat = np.array(lat, dtype=np.float64)
+        lon = np.array(lon, dtype=np.float64)
+        key = (
+            hashlib.md5(lat.tobytes()).hexdigest(),
+            hashlib.md5(lon.tobytes()).hexdigest(),
+        )
+        with _GRIDS_LOCK:
+            grid = _GRIDS.get(key)
+            if grid is None:
+                grid = _GRIDS[key] = cls(_read_only(lat), _read_only(lon))
+            _GRIDS.move_to_end(key)
+            _evict_grids()
+        return grid
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """shape.
+        (lat, lon)
+        """
+        return (len(self.lat), len(self.lon))
+
+    @cached
+    def mesh(self) -> Tuple[np.ndarray, np.ndarray]:
+        """mesh.
+        np.meshgrid(lon, lat)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: lon_2d, lat_2d
+        """
+        lon_2d, lat_2d = np.meshgrid(self.lon, self.lat)
+        return _read_only(lon_2d), _read_only(lat_2d)
+
+    @property
+    def lon_2d(self) -> np.ndarray:
+        """lon_2d.
+        """
+        return self.mesh[0]
+
+    @property
+    def lat_2d(self) -> np.ndarray:
+        """lat_2d.
+        """
+        return self.mesh[1]
+
+    @cached
+    def dx(self) -> np.ndarray:
+        """dx.
+        distance between neighbor grid points along longitude [m].
+        shape is (lat, lon - 1).
+        """
+        d_lon = np.radians(np.diff(self.lon))
+        return _read_only(EARTH_RADIUS * np.cos(np.radians(self.lat))[:, np.newaxis] * d_lon)
+
+    @cached
+    def dy(self) -> np.ndarray:
+        """dy.
+        distance between neighbor grid points along latitude [m].
+        shape is (lat - 1, lon).
+        """
+        d_lat = EARTH_RADIUS * np.radians(np.diff(self.lat))
+        return _read_only(np.repeat(d_lat[:, np.newaxis], len(self.lon), axis=1))
+
+    @cached
+    def coriolis(self) -> np.ndarray:
+        """coriolis.
+        coriolis parameter f = 2 * omega * sin(lat) [1/s]. shape is (lat, lon).
+        """
+        return _read_only(2 * OMEGA * np.sin(np.radians(self.lat_2d)))
+
+    @cached
+    def cell_area(self) -> np.ndarray:
+        """cell_area.
+        area of the cell around each grid point [m^2]. shape is (lat, lon).
+        cell edges are the middle of neighbor grid points.
+        """
+        def _edges(axis: np.ndarray) -> np.ndarray:
+            middle = (axis[1:] + axis[:-1]) / 2
+            return np.concatenate([
+                [axis[0] - (middle[0] - axis[0])], middle, [axis[-1] + (axis[-1] - middle[-1])]
+            ])
+
+        lat_edges = np.clip(_edges(self.lat), -90, 90)
+        lon_edges = _edges(self.lon)
+        band = np.abs(np.diff(np.sin(np.radians(lat_edges))))
+        width = np.abs(np.radians(np.diff(lon_edges)))
+        return _read_only(EARTH_RADIUS ** 2 * band[:, np.newaxis] * width[np.newaxis, :])
+
+    @cached
+    def operator(self) -> "DiffOperator":
+        """operator.
+        finite difference operator on this grid.
+        """
+        return DiffOperator(self)
+
+
+class DiffOperator:
+    """DiffOperator.
+    finite difference on the sphere for (..., lat, lon) arrays.
+    Leading axes (level, time, ...) are calculated at once.
+    Second order 3 point stencil (one-sided at the edges, same as
+    metpy.calc.first_derivative). Longitude is periodic if the grid
+    covers the whole circle.
+    d/dx = 1 / (a cos(lat)) d/dlon, d/dy = 1 / a d/dlat [1/m].
+    Use Grid.operator to share one instance per grid.
+    """
+
+    def __init__(self, grid: Grid):
+        """__init__.
+
+        Args:
+            grid (Grid): grid
+        """
+        self.grid = grid
+        lat = np.radians(grid.lat)
+        lon = np.radians(grid.lon)
+        d_lon = np.diff(lon)
+        self.periodic = bool(
+            len(lon) > 2 and np.allclose(d_lon, d_lon[0])
+            and np.isclose(lon[-1] - lon[0] + d_lon[0], 2 * np.pi))
+        self._lat_coef = _stencil(lat)
+        self._lon_coef = _stencil(lon, self.periodic)
+
+        cos_lat = np.cos(lat)
+        with np.errstate(divide="ignore"):
+            inv_x = np.where(np.abs(cos_lat) < 1e-10, np.nan, 1 / (EARTH_RADIUS * cos_lat))
+        # map factors (lat, 1)
+        self.inv_x = _read_only(inv_x[:, np.newaxis])
+        self.tan_lat = _read_only(np.where(np.isnan(inv_x), np.nan, np.tan(lat))[:, np.newaxis] / EARTH_RADIUS)
+
+    def ddx(self, field: np.ndarray) -> np.ndarray:
+        """ddx.
+        zonal derivative [unit/m].
+
+        Args:
+            field (np.ndarray): (..., lat, lon)
+        """
+        return _derivative(plain(field), self._lon_coef, -1, self.periodic) * self.inv_x
+
+    def ddy(self, field: np.ndarray) -> np.ndarray:
+        """ddy.
+        meridional derivative [unit/m].
+
+        Args:
+            field (np.ndarray): (..., lat, lon)
+        """
+        return _derivative(plain(field), self._lat_coef, -2, False) / EARTH_RADIUS
+
+    def gradient(self, field: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """gradient.
+
+        Args:
+            field (np.ndarray): (..., lat, lon)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: d/dx, d/dy
+        """
+        return self.ddx(field), self.ddy(field)
+
+    def gradient_magnitude(self, field: np.ndarray) -> np.ndarray:
+        """gradient_magnitude.
+        |grad field| [unit/m].
+
+        Args:
+            field (np.ndarray): (..., lat, lon)
+        """
+        return np.hypot(self.ddx(field), self.ddy(field))
+
+    def vorticity(self, u_wind: np.ndarray, v_wind: np.ndarray) -> np.ndarray:
+        """vorticity.
+        relative vorticity dv/dx - du/dy + u tan(lat) / a [1/s].
+
+        Args:
+            u_wind (np.ndarray): u_wind [m/s]
+            v_wind (np.ndarray): v_wind [m/s]
+        """
+        u_wind = plain(u_wind)
+        return self.ddx(v_wind) - self.ddy(u_wind) + u_wind * self.tan_lat
+
+    def divergence(self, u_wind: np.ndarray, v_wind: np.ndarray) -> np.ndarray:
+        """divergence.
+        du/dx + dv/dy - v tan(lat) / a [1/s].
+
+        Args:
+            u_wind (np.ndarray): u_wind [m/s]
+            v_wind (np.ndarray): v_wind [m/s]
+        """
+        v_wind = plain(v_wind)
+        return self.ddx(u_wind) + self.ddy(v_wind) - v_wind * self.tan_lat
+
+
+def _stencil(axis: np.ndarray, periodic=False) -> np.ndarray:
+    """_stencil.
+    coefficients of f[i-1], f[i], f[i+1] for df/dx at each point of
+    (non-uniform) axis. shape is (3, n).
+    Edges use one-sided stencil of f[0], f[1], f[2] (f[-3], f[-2], f[-1])
+    unless periodic.
+
+    Args:
+        axis (np.ndarray): axis [radian]
+        periodic: periodic
+    """
+    step = np.diff(axis)
+    if periodic:
+        step = np.concatenate([step[-1:], step, step[:1]])
+        h_1, h_2 = step[:-1], step[1:]
+    else:
+        h_1 = np.concatenate([[np.nan], step])
+        h_2 = np.concatenate([step, [np.nan]])
+    coef = np.stack([
+        -h_2 / (h_1 * (h_1 + h_2)),
+        (h_2 - h_1) / (h_1 * h_2),
+        h_1 / (h_2 * (h_1 + h_2)),
+    ])
+    if not periodic:
+        h_1, h_2 = step[0], step[1]
+        coef[:, 0] = [-(2 * h_1 + h_2) / (h_1 * (h_1 + h_2)),
+                      (h_1 + h_2) / (h_1 * h_2),
+                      -h_1 / (h_2 * (h_1 + h_2))]
+        h_1, h_2 = step[-2], step[-1]
+        coef[:, -1] = [h_2 / (h_1 * (h_1 + h_2)),
+                       -(h_1 + h_2) / (h_1 * h_2),
+                       (h_1 + 2 * h_2) / (h_2 * (h_1 + h_2))]
+    return _read_only(coef)
+
+
+def _derivative(field: np.ndarray, coef: np.ndarray, axis: int, periodic: bool) -> np.ndarray:
+    """_derivative.
+
+    Args:
+        field (np.ndarray): field
+        coef (np.ndarray): _stencil() of the axis
+        axis (int): -1 (lon) or -2 (lat)
+        periodic (bool): periodic
+    """
+    field = np.moveaxis(field, axis, -1)
+    coef = coef.astype(np.result_type(field, np.float32), copy=False)
+    if periodic:
+        out = (coef[0] * np.roll(field, 1, axis=-1) + coef[1] * field
+               + coef[2] * np.roll(field, -1, axis=-1))
+    else:
+        out = np.empty(field.shape, dtype=np.result_type(field, coef))
+        out[..., 1:-1] = (coef[0, 1:-1] * field[..., :-2] + coef[1, 1:-1] * field[..., 1:-1]
+                          + coef[2, 1:-1] * field[..., 2:])
+        out[..., 0] = coef[0, 0] * field[..., 0] + coef[1, 0] * field[..., 1] + coef[2, 0] * field[..., 2]
+        out[..., -1] = (coef[0, -1] * field[..., -3] + coef[1, -1] * field[..., -2]
+                        + coef[2, -1] * field[..., -1])
+    return np.moveaxis(out, -1, axis)
+
+
+_GRIDS: "OrderedDict[Tuple[str, str], Grid]" = OrderedDict()
+_GRIDS_LOCK = threading.Lock()
+_MAX_GRIDS = int(os.environ.get("NCMAGICS_MAX_GRIDS", 8))
+
+
+def _evict_grids():
+    """_evict_grids.
+    drop least recently used grids. Call with _GRIDS_LOCK.
+    """
+    while len(_GRIDS) > _MAX_GRIDS:
+        _GRIDS.popitem(last=False)
+
+
+def set_max_grids(max_grids: int):
+    """set_max_grids.
+    change max number of shared grids.
+
+    Args:
+        max_grids (int): max_grids
+    """
+    global _MAX_GRIDS
+    with _GRIDS_LOCK:
+        _MAX_GRIDS = max_grids
+        _evict_grids()
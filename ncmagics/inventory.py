@@ -0,0 +1,340 @@
+# coding: utf-8
+"""
+Name: inventory.py
+
+SQLite index of netcdf files in a directory (and its subdirectories if recursive=True).
+Valid time, initial time, variables, levels, grid hash and
+size/mtime of each file are recorded once, and only new or
+changed files are opened when the index is updated.
+
+example:
+    from ncmagics import inventory
+    inv = inventory.Inventory("~/data/inventory.sqlite")
+    inv.update("~/data")
+    ncfiles = inv.query(valid_time=datetime(2021, 1, 10), variable="r", level=850,
+                        name_filter="troposphere-")
+
+or use inventory.list_files(root_dir, name_filter) (same files as os.listdir()). Its sqlite file is
+NCMAGICS_INVENTORY environment variable or <cache dir>/ncmagics/inventory.sqlite
+(<cache dir> is XDG_CACHE_HOME or ~/.cache), not in the data directory.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from datetime import datetime
+from typing import List, Optional
+import hashlib
+import logging
+import os
+import sqlite3
+import netCDF4
+import numpy as np
+from ncmagics import fetchtime, ncpool
+from ncmagics.readnc import get_axis_names
+
+LOGGER = logging.getLogger(__name__)
+
+
+# change it when the schema or the recorded values change.
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    init_time TEXT,
+    grid_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS times (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    time_index INTEGER NOT NULL,
+    valid_time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS variables (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS levels (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    level REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS times_valid_time ON times(valid_time);
+CREATE INDEX IF NOT EXISTS variables_name ON variables(name);
+CREATE INDEX IF NOT EXISTS levels_level ON levels(level);
+"""
+
+
+class Inventory:
+    """Inventory.
+    Times are stored as ISO 8601 text ("2021-01-10T00:00:00").
+    """
+
+    def __init__(self, db_path: str):
+        """__init__.
+
+        Args:
+            db_path (str): sqlite file. It is made if it doesn't exist.
+        """
+        self.db_path = os.path.expanduser(db_path)
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self._conn:
+                for table in ("times", "variables", "levels", "files"):
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def update(self, root_dir: str, suffix=".nc", recursive=False) -> int:
+        """update.
+        scan root_dir and index new or changed files.
+        Files removed from root_dir are removed from the index.
+        Files which can't be read (broken file, time without units, ...)
+        are logged and skipped.
+
+        Args:
+            root_dir (str): root_dir
+            suffix: only files which end with suffix are indexed.
+            recursive: scan subdirectories too.
+
+        Returns:
+            int: number of (re)indexed files.
+        """
+        root_dir = os.path.abspath(os.path.expanduser(root_dir))
+        indexed = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self._conn.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE path LIKE ? ESCAPE '\\'",
+                (_like_escape(os.path.join(root_dir, "")) + "%",))
+            if recursive or os.path.dirname(path) == root_dir
+        }
+        n_indexed = 0
+        with self._conn:
+            for path in _scan(root_dir, suffix, recursive):
+                stat = os.stat(path)
+                if indexed.pop(path, None) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                try:
+                    self._index_file(path, stat)
+                except (OSError, RuntimeError, AttributeError, KeyError, ValueError, IndexError) as error:
+                    LOGGER.warning("skip %s: %s", path, error)
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                    continue
+                n_indexed += 1
+            for path in indexed:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        return n_indexed
+
+    def _index_file(self, path: str, stat: os.stat_result):
+        """_index_file.
+        Call in transaction.
+
+        Args:
+            path (str): path
+            stat (os.stat_result): stat of path
+        """
+        with ncpool.open_dataset(path) as (dataset, lock), lock:
+            valid_times, init_time = _read_times(dataset)
+            axis_names = get_axis_names(dataset)
+            levels = []
+            if "Z" in axis_names:
+                levels = [float(level) for level in dataset.variables[axis_names["Z"]][:]]
+            grid_hash = None
+            if "Y" in axis_names and "X" in axis_names:
+                grid_hash = hashlib.md5(
+                    np.ascontiguousarray(dataset.variables[axis_names["Y"]][:], dtype=np.float64).tobytes()
+                    + np.ascontiguousarray(dataset.variables[axis_names["X"]][:], dtype=np.float64).tobytes()
+                ).hexdigest()
+            variables = [name for name in dataset.variables
+                         if name not in dataset.dimensions]
+
+        self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._conn.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, init_time, grid_hash))
+        self._conn.executemany(
+            "INSERT INTO times VALUES (?, ?, ?)",
+            [(path, i, valid_time) for i, valid_time in enumerate(valid_times)])
+        self._conn.executemany(
+            "INSERT INTO variables VALUES (?, ?)", [(path, name) for name in variables])
+        self._conn.executemany(
+            "INSERT INTO levels VALUES (?, ?)", [(path, level) for level in levels])
+
+    def query(self,
+              valid_time: Optional[datetime] = None,
+              variable: Optional[str] = None,
+              level: Optional[float] = None,
+              name_filter: Optional[str] = None,
+              root_dir: Optional[str] = None,
+              start: Optional[datetime] = None,
+              end: Optional[datetime] = None,
+              recursive=False) -> List[str]:
+        """query.
+        indexed files which match all given conditions,
+        sorted by (first valid time, path).
+
+        Args:
+            valid_time (Optional[datetime]): one of valid times of the file.
+            variable (Optional[str]): variable name ("t", "prmsl", ...)
+            level (Optional[float]): isobaric surface [hPa]
+            name_filter (Optional[str]): substring of the file name.
+            root_dir (Optional[str]): files in root_dir.
+            start (Optional[datetime]): one of valid times >= start.
+            end (Optional[datetime]): one of valid times <= end.
+            recursive: files in subdirectories of root_dir too.
+
+        Returns:
+            List[str]:
+        """
+        where, values = [], []
+        if valid_time is not None or start is not None or end is not None:
+            time_where = []
+            if valid_time is not None:
+                time_where.append("valid_time = ?")
+                values.append(_isoformat(valid_time))
+            if start is not None:
+                time_where.append("valid_time >= ?")
+                values.append(_isoformat(start))
+            if end is not None:
+                time_where.append("valid_time <= ?")
+                values.append(_isoformat(end))
+            where.append("path IN (SELECT path FROM times WHERE " + " AND ".join(time_where) + ")")
+        if variable is not None:
+            where.append("path IN (SELECT path FROM variables WHERE name = ?)")
+            values.append(variable)
+        if level is not None:
+            where.append("path IN (SELECT path FROM levels WHERE level = ?)")
+            values.append(float(level))
+        if root_dir is not None:
+            root_dir = os.path.abspath(os.path.expanduser(root_dir))
+            where.append("path LIKE ? ESCAPE '\\'")
+            values.append(_like_escape(os.path.join(root_dir, "")) + "%")
+        sql = ("SELECT path FROM files"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY (SELECT MIN(valid_time) FROM times WHERE times.path = files.path), path")
+        paths = [path for path, in self._conn.execute(sql, values)]
+        if name_filter is not None:
+            paths = [path for path in paths if name_filter in os.path.basename(path)]
+        if root_dir is not None and not recursive:
+            paths = [path for path in paths if os.path.dirname(path) == root_dir]
+        return paths
+
+    def valid_times(self, path: str) -> List[datetime]:
+        """valid_times.
+
+        Args:
+            path (str): indexed ncfile
+
+        Returns:
+            List[datetime]: valid times in time_index order.
+        """
+        return [
+            datetime.strptime(valid_time, "%Y-%m-%dT%H:%M:%S")
+            for valid_time, in self._conn.execute(
+                "SELECT valid_time FROM times WHERE path = ? ORDER BY time_index",
+                (os.path.abspath(path),))
+        ]
+
+    def close(self):
+        """close.
+        """
+        self._conn.close()
+
+
+def _read_times(dataset: netCDF4.Dataset):
+    """_read_times.
+
+    Args:
+        dataset (netCDF4.Dataset): dataset
+
+    Returns:
+        (valid times, initial time): ISO 8601 text.
+        initial time is the reference time of "time" units ("hours since <init>").
+    """
+    if "time" not in dataset.variables:
+        return [], None
+    time = dataset.variables["time"]
+    valid_times = np.atleast_1d(fetchtime.valid_time(dataset, slice(None)))
+    init_time = netCDF4.num2date(0, time.units)
+    return [_isoformat(valid_time) for valid_time in valid_times], _isoformat(init_time)
+
+
+def _isoformat(date_time) -> str:
+    """_isoformat.
+    datetime or cftime datetime to "YYYY-MM-DDTHH:MM:SS".
+
+    Args:
+        date_time: date_time
+    """
+    return "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(
+        date_time.year, date_time.month, date_time.day,
+        date_time.hour, date_time.minute, date_time.second)
+
+
+def _like_escape(text: str) -> str:
+    """_like_escape.
+    escape "%" and "_" for LIKE ... ESCAPE '\\'.
+
+    Args:
+        text (str): text
+    """
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _scan(root_dir: str, suffix: str, recursive: bool) -> List[str]:
+    """_scan.
+    files in root_dir which end with suffix.
+
+    Args:
+        root_dir (str): root_dir
+        suffix (str): suffix
+        recursive (bool): scan subdirectories too.
+    """
+    if recursive:
+        return [os.path.join(dirpath, filename)
+                for dirpath, _, filenames in os.walk(root_dir)
+                for filename in filenames if filename.endswith(suffix)]
+    return [entry.path for entry in os.scandir(root_dir)
+            if entry.is_file() and entry.name.endswith(suffix)]
+
+
+def default_db_path() -> str:
+    """default_db_path.
+    NCMAGICS_INVENTORY environment variable or
+    <XDG_CACHE_HOME or ~/.cache>/ncmagics/inventory.sqlite.
+    """
+    db_path = os.environ.get("NCMAGICS_INVENTORY")
+    if db_path is None:
+        cache_dir = os.environ.get("XDG_CACHE_HOME", os.path.join("~", ".cache"))
+        db_path = os.path.join(cache_dir, "ncmagics", "inventory.sqlite")
+    db_path = os.path.expanduser(db_path)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    return db_path
+
+
+def list_files(root_dir: str, name_filter: str, db_path: Optional[str] = None,
+               suffix=".nc") -> List[str]:
+    """list_files.
+    sorted([join(root_dir, name) for name in os.listdir(root_dir) if name_filter in join(root_dir, name)])
+    (the file selection of mk_ave), and update the index of files in root_dir
+    which end with suffix (not subdirectories), so query() can be used later.
+    Files which can't be indexed are still listed.
+
+    Args:
+        root_dir (str): root_dir
+        name_filter (str): substring of the path (e.g. "troposphere-")
+        db_path (Optional[str]): sqlite file. Default is default_db_path().
+        suffix: suffix of the indexed files.
+
+    Returns:
+        List[str]:
+    """
+    inv = Inventory(default_db_path() if db_path is None else db_path)
+    try:
+        inv.update(root_dir, suffix=suffix)
+    finally:
+        inv.close()
+    return sorted(path for path in (os.path.join(root_dir, name) for name in os.listdir(root_dir))
+                  if name_filter in path)
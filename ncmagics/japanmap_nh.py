@@ -18,6 +18,7 @@ import numpy as np
 import cartopy.crs as ccrs
 import cartopy.feature as cfea
 #from cartopy.mpl.ticker import LatitudeFormatter, LongitudeFormatter
+from ncmagics.grid import Grid
 
 
 class NhMap:
@@ -25,12 +26,15 @@ class NhMap:
     Make orthogonal map (north hemisphere).
     """
 
-    def __init__(self, color=False):
+    def __init__(self, color=False, grid: Grid = None):
         """__init__.
 
         Args:
             color:
+            grid (Grid): grid of the plotted fields (e.g. MeteoTools.get_grid()).
+                         None means it is made from x, y of the first plot.
         """
+        self.grid = grid
         self.fig = plt.figure(figsize=(36, 24), facecolor='w')
         self.ax = self.fig.add_subplot(1, 1, 1,
                 #projection=ccrs.PlateCarree(central_longitude=0.0),
@@ -72,6 +76,22 @@ class NhMap:
         self.plt_cnt = 0
         self.double_color_bar = False
 
+    def _mesh(self, x, y):
+        """_mesh.
+        2D x, y of the grid of this map. The grid is made again only if
+        x, y are not its lon, lat (Grid.from_axes() hashes x, y on every call).
+
+        Args:
+            x: lon
+            y: lat
+        """
+        grid = self.grid
+        if (grid is None or grid.shape != (len(y), len(x))
+                or grid.lon[0] != float(x[0]) or grid.lon[-1] != float(x[-1])
+                or grid.lat[0] != float(y[0]) or grid.lat[-1] != float(y[-1])):
+            grid = self.grid = Grid.from_axes(y, x)
+        return grid.mesh
+
     def plot_data(self, x, y, label: str, line=True):
         """plot_data.
         plot location data. plot type is dot.
@@ -139,7 +159,7 @@ class NhMap:
             y:
             z:
         """
-        X, Y = np.meshgrid(x, y)
+        X, Y = self._mesh(x, y)
         if contour_type == "pressure":
             contour = self.ax.contour(X, Y, z, colors="black",
                                       levels=list(range(900, 1040, 4)),
@@ -164,7 +184,7 @@ class NhMap:
             line_value (Union[int, float]): line_value
             color:
         """
-        X, Y = np.meshgrid(x, y)
+        X, Y = self._mesh(x, y)
         contour = self.ax.contour(X, Y, z,
                                   colors=color,
                                   levels=[line_value],
@@ -186,7 +206,7 @@ class NhMap:
                                  color_bar_label_max,
                                  5))
         plt.rcParams['font.size'] = 36
-        x_2d, y_2d = np.meshgrid(x, y)
+        x_2d, y_2d = self._mesh(x, y)
         hatch = self.ax.contourf(x_2d, y_2d, z,
                                  hatches=['-'*2, '/'*3, '\\'*3, '+'*2],
                                  cmap='gray_r',
@@ -261,7 +281,7 @@ class NhMap:
             shrink_ratio = 0.7
 
         plt.rcParams['font.size'] = 36
-        X, Y = np.meshgrid(x, y)
+        X, Y = self._mesh(x, y)
         if   color_map_type == "diff":
             color_map = "RdBu_r"
         elif color_map_type == "temperature":
@@ -339,7 +359,7 @@ class NhMap:
             vector_scale:
         """
 
-        x_2d, y_2d = np.meshgrid(x, y)
+        x_2d, y_2d = self._mesh(x, y)
         u_skipped = self._skip_value(u, len(x), len(y), vector_interval, y)
         v_skipped = self._skip_value(v, len(x), len(y), vector_interval, y)
         x_2d_skipped = self._skip_value(x_2d, len(x), len(y), vector_interval, y)
@@ -368,7 +388,7 @@ class NhMap:
             y:
             z:
         """
-        x_2d, y_2d = np.meshgrid(x, y)
+        x_2d, y_2d = self._mesh(x, y)
         self.ax.contourf(x_2d, y_2d, z,
                 hatches='.',
                 cmap='gray',
@@ -384,7 +404,7 @@ class NhMap:
             y:
             z:
         """
-        x_2d, y_2d = np.meshgrid(x, y)
+        x_2d, y_2d = self._mesh(x, y)
         self.ax.contourf(x_2d, y_2d, z, hatches='*',cmap='pink', alpha=0.8)
 
     def save_fig(self, outname: str, title=None):
@@ -9,49 +9,86 @@ Usage:
 Author: Ryosuke Tomita
 Date: 2021/12/15
 """
-import math
+from typing import Optional, Sequence, Tuple, Union
+import dataclasses
+import functools
+import threading
 import numpy as np
 import xarray as xr
 import metpy.constants
 import metpy.interpolate
 from metpy.units import units
 import metpy.calc as mpcalc
-from ncmagics import readnc
+from ncmagics import column, readnc, thermo
+from ncmagics import parcel as parcel_theory
+from ncmagics.arrayutil import cached, plain
+from ncmagics.grid import Grid
+from ncmagics.vinterp import IsentropicInterpolator
 
 
+@dataclasses.dataclass
 class MeteoTools(readnc.CalcPhysics):
     """MeteoTools.
+    Thermodynamic methods use ncmagics.thermo (plain ndarray, SI) kernels.
+    use_pint: use metpy.calc (pint units) and metpy.interpolate instead
+              (slow, for validation).
+    Both return plain ndarray in the same units.
     """
+    use_pint: bool = False
 
     def cal_potential_temperature(self, temperature_k: np.ndarray,
                                   isobaric_surface=None) -> np.ndarray:
         """cal_potential_temperature.
         theta = Temperature * (P0/P)^0.29
+        isobaric_surface is None: temperature_k is (level, lat, lon) or
+        (time, level, lat, lon) of all levels in the file, and theta is
+        returned in descending pressure order.
+        isobaric_surface is a list: levels of the level axis (-3) of temperature_k.
+        theta of all levels is one multiply by cached (P0/P)^kappa.
 
         Args:
             temperature_k (np.ndarray): temperature_k
-            isobaric_surface (int): isobaric_surface
+            isobaric_surface: isobaric_surface (int, list of levels or None)
 
         Returns:
             np.ndarray:
         """
         if isobaric_surface is None:
-            ptl_temp = []
-            isobaric_surface = sorted([
-                int(pressure)
-                for pressure in self.isobaric_surface_dict.keys()
-        ], reverse=True)
-            for pressure in isobaric_surface:
-                ptl_temp.append(
-                    mpcalc.potential_temperature(
-                        pressure * units.mbar, temperature_k[self.isobaric_surface_dict[str(int(pressure))]] * units.kelvin
-                    )
-                )
-        else:
-            ptl_temp = mpcalc.potential_temperature(isobaric_surface * units.mbar, temperature_k * units.kelvin)
-        return np.array(ptl_temp)
+            isobaric_surface = sorted(
+                [int(pressure) for pressure in self.isobaric_surface_dict.keys()], reverse=True)
+            order = [self.isobaric_surface_dict[str(pressure)] for pressure in isobaric_surface]
+            if order != list(range(len(order))):
+                temperature_k = np.take(temperature_k, order, axis=-3)
+        elif np.ndim(isobaric_surface) == 0:
+            return self._cal_potential_temperature(temperature_k, isobaric_surface)
+
+        if self.use_pint:
+            return self._cal_potential_temperature(
+                temperature_k, np.asarray(isobaric_surface)[:, np.newaxis, np.newaxis])
+        temperature_k = plain(temperature_k)
+        exner = _exner_factors(tuple(float(pressure) for pressure in isobaric_surface))
+        return np.multiply(
+            temperature_k, exner.astype(np.result_type(temperature_k, np.float32), copy=False))
+
+    def _cal_potential_temperature(self, temperature_k: np.ndarray, isobaric_surface) -> np.ndarray:
+        """_cal_potential_temperature.
+
+        Args:
+            temperature_k (np.ndarray): temperature_k
+            isobaric_surface: isobaric_surface [hPa]
 
-    def cal_diff_temp_dewpoint(self, temp_c: np.ndarray, rh: np.ndarray, isobaric_surface: int) -> np.ndarray:
+        Returns:
+            np.ndarray:
+        """
+        if self.use_pint:
+            return mpcalc.potential_temperature(
+                isobaric_surface * units.mbar, temperature_k * units.kelvin
+            ).m_as(units.kelvin)
+        return thermo.potential_temperature(
+            _to_pa(isobaric_surface), plain(temperature_k))
+
+    def cal_diff_temp_dewpoint(self, temp_c: np.ndarray = None, rh: np.ndarray = None,
+                               isobaric_surface: int = None, state: "ThermoState" = None) -> np.ndarray:
         """cal_diff_temp_dewpoint.
         calcurate dewpoint and find the area
         which is the dewpoint - temperature = 湿数 < 3
@@ -61,156 +98,219 @@ class MeteoTools(readnc.CalcPhysics):
             temp_c (np.ndarray): temp_c
             rh (np.ndarray): rh
             isobaric_surface (int): isobaric_surface
+            state (ThermoState): thermo_state() of the same data (temp_c, rh, isobaric_surface are not used).
         """
-        # calcurate dewpoint
-        mixing_ratio = mpcalc.mixing_ratio_from_relative_humidity(
-                isobaric_surface* units.hPa, temp_c * units.celsius, rh * units.percent
-        )
-        vapor_pressure = self._cal_vapor_pressure(mixing_ratio, isobaric_surface)
-        dewpoint = self._cal_dewpoint(vapor_pressure)
-        diff_temp_dewpoint = np.array(temp_c * units.celsius - dewpoint)
-        return np.where(diff_temp_dewpoint < 3.0, True, np.nan)
+        if state is None:
+            state = self.thermo_state(plain(temp_c) + 273.15, rh, isobaric_surface)
+        return np.where(state.dewpoint_depression < 3.0, True, np.nan)
 
     def gradient_size(self, params_xr: xr.DataArray, unit: str) -> np.ndarray:
         """gradient_size.
-        Using metpy.calc.gradient() calcurate gradient absorute size.
-        This function use central difference calculus.
+        calcurate gradient absorute size [unit/m] by Grid.operator
+        (central difference on the sphere).
 
         Args:
-            params_xr (xr.DataArray): params_xr
+            params_xr (xr.DataArray): (..., lat, lon) with lat, lon coords.
+                np.ndarray is on the grid of get_lat_lon().
             unit (str): unit
 
         Returns:
             np.ndarray:
         """
         if   unit == "K":
-            param_unit = units.kelvin
+            param_unit, delta_unit = units.kelvin, units.kelvin
         elif unit == "C":
-            param_unit = units.celsius
+            # degC / m is not a valid (offset) unit, gradient is delta_degC / m.
+            param_unit, delta_unit = units.celsius, units.delta_degC
         else:
             raise Exception("unit is not valid")
-        grad_x, grad_y = mpcalc.gradient(params_xr * param_unit)
-        return (grad_x ** 2 + grad_y ** 2) ** 0.5
-        #return grad_x, grad_y
+        if self.use_pint:
+            grad_x, grad_y = mpcalc.gradient(params_xr * param_unit)
+            return np.asarray(((grad_x ** 2 + grad_y ** 2) ** 0.5).data.m_as(delta_unit / units.meter))
+        if isinstance(params_xr, xr.DataArray):
+            grid = Grid.from_axes(params_xr[params_xr.dims[-2]], params_xr[params_xr.dims[-1]])
+        else:
+            grid = self.get_grid()
+        return grid.operator.gradient_magnitude(params_xr)
 
-    def snow_or_rain(self, temp_k: np.ndarray, rh: np.ndarray, isobaric_surface: int) -> np.ndarray:
+    def snow_or_rain(self, temp_k: np.ndarray = None, rh: np.ndarray = None,
+                     isobaric_surface: int = None, state: "ThermoState" = None) -> np.ndarray:
         """snow_or_rain.
+        ratio of snow (0: rain, 1: snow). Whole array is calculated at once,
+        so stacked (time, lat, lon) data can be given.
+
         Args:
-            temp_k (np.ndarray): temp_k
-            rh (np.ndarray): rh
+            temp_k (np.ndarray): temp_k (..., lat, lon)
+            rh (np.ndarray): rh (..., lat, lon)
             isobaric_surface (int): isobaric_surface
+            state (ThermoState): thermo_state() of the same data (temp_k, rh, isobaric_surface are not used).
 
         Returns:
-            np.ndarray:
+            np.ndarray: same shape as temp_k
         """
-        # calcurate dew point
-        mixing_ratio = self._cal_mixing_ratio(temp_k, rh, isobaric_surface)
-        vapor_pressure = np.array(
-                self._cal_vapor_pressure(mixing_ratio, isobaric_surface)
-        )
+        if state is None:
+            state = self.thermo_state(temp_k, rh, isobaric_surface)
 
         # calcurate wet buld temperature.
-        temp_c = temp_k - 273.15
-        tw = 0.584 * temp_c + 0.875 * vapor_pressure - 5.32
-        s = [
-            1 - 0.5 * np.e ** (-2.2 * (1.1 - tw[i][j]) ** 1.3)
-            if tw[i][j] < 1.1
-            else
-            0.5 * np.e ** (-2.2 * (tw[i][j] - 1.1) ** 1.3)
-            for i in range(len(tw))
-            for j in range(len(tw[0]))
-        ]
-        s = np.array(s).reshape(len(tw), len(tw[0]))
-        return s
-
-
-    def cal_bulb_temp(self, temp_k: np.ndarray, rh: np.ndarray,
-                      isobaric_surface: int) -> np.ndarray:
+        temp_c = state.temperature_k - 273.15
+        tw = 0.584 * temp_c + 0.875 * state.vapor_pressure - 5.32
+
+        # both branches are calculated on the whole array.
+        # clip keeps the base of ** 1.3 positive (no NaN warning).
+        below = np.clip(1.1 - tw, 0, None)
+        above = np.clip(tw - 1.1, 0, None)
+        return np.where(
+            tw < 1.1,
+            1 - 0.5 * np.exp(-2.2 * below ** 1.3),
+            0.5 * np.exp(-2.2 * above ** 1.3),
+        )
+
+    def cal_bulb_temp(self, temp_k: np.ndarray = None, rh: np.ndarray = None,
+                      isobaric_surface=None, state: "ThermoState" = None) -> np.ndarray:
         """cal_bulb_temp.
+        wet bulb temperature [degC] (thermo.wet_bulb_temperature).
+        Any grid shape can be given and isobaric_surface is broadcast.
 
         Args:
             temp_k (np.ndarray): temp_k
             rh (np.ndarray): rh
-            isobaric_surface (int): isobaric_surface
+            isobaric_surface: isobaric_surface [hPa] (int or array broadcastable to temp_k)
+            state (ThermoState): thermo_state() of the same data (temp_k, rh, isobaric_surface are not used).
 
         Returns:
             np.ndarray:
         """
-        # calcurate dew point
-        mixing_ratio = self._cal_mixing_ratio(temp_k, rh, isobaric_surface)
-        vapor_pressure = self._cal_vapor_pressure(mixing_ratio, isobaric_surface)
-        dew_point = self._cal_dewpoint(vapor_pressure)
+        if state is None:
+            state = self.thermo_state(temp_k, rh, isobaric_surface)
+        return state.wet_bulb_temperature - 273.15
+
+    def thermo_state(self, temperature_k: np.ndarray, rh: np.ndarray,
+                     isobaric_surface) -> "ThermoState":
+        """thermo_state.
+        derived quantities of (temperature, rh, isobaric_surface).
+        Pass it to cal_eqv_potential_temperature(), cal_diff_temp_dewpoint(),
+        cal_bulb_temp() and snow_or_rain() by state=,
+        so mixing ratio, vapor pressure and dewpoint are calculated once.
 
-        # calcurate wet buld temperature.
-        pressure = np.zeros((81, 141)) + isobaric_surface
+        Args:
+            temperature_k (np.ndarray): temperature_k
+            rh (np.ndarray): rh [%]
+            isobaric_surface: isobaric_surface [hPa]
 
-        tw = np.array(
-                mpcalc.wet_bulb_temperature(
-                    pressure * units.hPa, temp_k * units.kelvin, dew_point
-                )
-        ) - 273.15
-        return tw
+        Returns:
+            ThermoState:
+        """
+        return ThermoState(self, plain(temperature_k), rh, isobaric_surface)
 
 #----------equivalent potential temperature----------
     def _cal_mixing_ratio(self, temperature_k: np.ndarray, rh: np.ndarray,
                           isobaric_surface: int) -> np.ndarray:
         """cal_mixing_ratio.
-        mixing ratio(水蒸気の混合比)
+        mixing ratio(水蒸気の混合比) [kg/kg]
 
         Args:
             temperature_k (np.ndarray): temperature_k
-            rh (np.ndarray): rh
+            rh (np.ndarray): rh [%]
             isobaric_surface (int): isobaric_surface
 
         Returns:
             np.ndarray:
         """
-        mixing_ratio = mpcalc.mixing_ratio_from_relative_humidity(
-            isobaric_surface * units.hPa, temperature_k * units.kelvin, rh * units.percent
+        if self.use_pint:
+            return mpcalc.mixing_ratio_from_relative_humidity(
+                isobaric_surface * units.hPa, temperature_k * units.kelvin, rh * units.percent
+            ).m_as(units.dimensionless)
+        return thermo.mixing_ratio_from_relative_humidity(
+            _to_pa(isobaric_surface), plain(temperature_k), plain(rh) / 100
         )
-        return mixing_ratio
 
     def _cal_vapor_pressure(self, mixing_ratio: np.ndarray, isobaric_surface: int) -> np.ndarray:
         """cal_vapor_pressure.
         vapor pressure(水蒸気圧) [hPa]
 
         Args:
+            mixing_ratio (np.ndarray): mixing_ratio [kg/kg]
             isobaric_surface (int): isobaric_surface
 
         Returns:
             np.ndarray:
         """
-        vapor_pressure = mpcalc.vapor_pressure(
-            isobaric_surface * units.hPa, mixing_ratio
-        )
-        return vapor_pressure
-
-    def _cal_dewpoint(self, vapor_pressure):
+        if self.use_pint:
+            return mpcalc.vapor_pressure(
+                isobaric_surface * units.hPa, mixing_ratio * units.dimensionless
+            ).m_as(units.hPa)
+        # e is proportional to p, so hPa in, hPa out.
+        return thermo.vapor_pressure(isobaric_surface, mixing_ratio)
+
+    def _cal_dewpoint(self, vapor_pressure: np.ndarray) -> np.ndarray:
         """cal_dewpoint.
         calcurate dewpoint(露点温度) [K]
+
+        Args:
+            vapor_pressure (np.ndarray): vapor_pressure [hPa]
+        """
+        if self.use_pint:
+            return mpcalc.dewpoint(vapor_pressure * units.hPa).m_as(units.kelvin)
+        return thermo.dewpoint(vapor_pressure * 100)
+
+    def _cal_eqv_potential_temperature(self, temperature_k: np.ndarray, dewpoint: np.ndarray,
+                                       isobaric_surface) -> np.ndarray:
+        """_cal_eqv_potential_temperature.
+        [K]
+
+        Args:
+            temperature_k (np.ndarray): temperature_k
+            dewpoint (np.ndarray): dewpoint [K]
+            isobaric_surface: isobaric_surface [hPa]
+
+        Returns:
+            np.ndarray:
         """
-        dewpoint = mpcalc.dewpoint(vapor_pressure)
-        return dewpoint
+        if self.use_pint:
+            return mpcalc.equivalent_potential_temperature(
+                isobaric_surface * units.hPa, temperature_k * units.kelvin, dewpoint * units.kelvin
+            ).m_as(units.kelvin)
+        return thermo.equivalent_potential_temperature(
+            _to_pa(isobaric_surface), temperature_k, dewpoint)
+
+    def _cal_wet_bulb_temperature(self, temperature_k: np.ndarray, dewpoint: np.ndarray,
+                                  isobaric_surface) -> np.ndarray:
+        """_cal_wet_bulb_temperature.
+        [K]
+
+        Args:
+            temperature_k (np.ndarray): temperature_k
+            dewpoint (np.ndarray): dewpoint [K]
+            isobaric_surface: isobaric_surface [hPa]
 
-    def cal_eqv_potential_temperature(self, temperature_k: np.ndarray, rh: np.ndarray, isobaric_surface: int) -> np.ndarray:
+        Returns:
+            np.ndarray:
+        """
+        if self.use_pint:
+            pressure = np.broadcast_to(
+                isobaric_surface, np.broadcast(temperature_k, isobaric_surface).shape)
+            return mpcalc.wet_bulb_temperature(
+                pressure * units.hPa, temperature_k * units.kelvin, dewpoint * units.kelvin
+            ).m_as(units.kelvin)
+        return thermo.wet_bulb_temperature(_to_pa(isobaric_surface), temperature_k, dewpoint)
+
+    def cal_eqv_potential_temperature(self, temperature_k: np.ndarray = None, rh: np.ndarray = None,
+                                      isobaric_surface: int = None, state: "ThermoState" = None) -> np.ndarray:
         """cal_eqv_potential_temperature.
         calcurate equivalent_potential_temperature(相当温位) [K]
 
         Args:
             temperature_k (np.ndarray): temperature_k
+            rh (np.ndarray): rh
             isobaric_surface (int): isobaric_surface
+            state (ThermoState): thermo_state() of the same data (temperature_k, rh, isobaric_surface are not used).
 
         Returns:
             np.ndarray:
         """
-        mixing_ratio = self._cal_mixing_ratio(temperature_k, rh, isobaric_surface)
-        vapor_pressure = self._cal_vapor_pressure(mixing_ratio, isobaric_surface)
-        dewpoint = self._cal_dewpoint(vapor_pressure)
-
-        equivalent_potential_temperature = mpcalc.equivalent_potential_temperature(
-            isobaric_surface * units.hPa, temperature_k * units.kelvin, dewpoint
-        )
-        return equivalent_potential_temperature
+        if state is None:
+            state = self.thermo_state(temperature_k, rh, isobaric_surface)
+        return state.eqv_potential_temperature
 
 
 #----------potential vorticity on the isentropic----------
@@ -228,9 +328,26 @@ class MeteoTools(readnc.CalcPhysics):
         """
         return array_3d[::-1]
 
+    def isentropic_interpolator(self, ptl_temp: np.ndarray, isentropic,
+                                reverse=True) -> IsentropicInterpolator:
+        """isentropic_interpolator.
+        bracketing levels and weights of isentropic surfaces are found once,
+        and the returned interpolator can be applied to any number of fields.
+
+        Args:
+            ptl_temp (np.ndarray): ptl_temp
+            isentropic: isentropic (int or list of isentropic)
+            reverse: ptl_temp is in descending pressure order (cal_potential_temperature()).
+
+        Returns:
+            IsentropicInterpolator: interpolator(phys_val) -> (isentropic, lat, lon) or (lat, lon)
+        """
+        return IsentropicInterpolator(ptl_temp, isentropic, bottom_first=reverse)
+
     def isentropic_surface_value(self, ptl_temp: np.ndarray, phys_val: np.ndarray,
                                  isentropic: int, reverse=True) -> np.ndarray:
         """isentropic_surface_value.
+        Use isentropic_interpolator() to interpolate several fields.
 
         Args:
             ptl_temp (np.ndarray): ptl_temp
@@ -241,10 +358,12 @@ class MeteoTools(readnc.CalcPhysics):
         Returns:
             np.ndarray:
         """
-        if reverse:
-            ptl_temp = self._reverse_z_index(ptl_temp)
-            phys_val = self._reverse_z_index(phys_val)
-        return (metpy.interpolate.interpolate_to_isosurface(ptl_temp, phys_val, isentropic))
+        if self.use_pint:
+            if reverse:
+                ptl_temp = self._reverse_z_index(ptl_temp)
+                phys_val = self._reverse_z_index(phys_val)
+            return (metpy.interpolate.interpolate_to_isosurface(ptl_temp, phys_val, isentropic))
+        return self.isentropic_interpolator(ptl_temp, isentropic, reverse)(phys_val)
 
     def gph_to_pressure(self, gph: np.ndarray) -> np.ndarray:
         """gph_to_pressure.
@@ -264,31 +383,421 @@ class MeteoTools(readnc.CalcPhysics):
         PV = (f + zeta) / m
         m = - (round_p / round_thita) / g
         Unit is PVU (10**-6 K m**2 s**-1 kg**-1)
+        (lat, lon) or (isentropic, lat, lon) can be given.
+        zeta is calculated by Grid.operator.
 
         Args:
             ise_u_wind (np.ndarray): ise_u_wind
             ise_v_wind (np.ndarray): ise_v_wind
-            d_thita_dp (np.ndarray): d_thita_dp
+            d_thita_dp (np.ndarray): d_thita_dp [hPa/K] (pint Quantity or ndarray)
             lat (np.ndarray): lat
             lon (np.ndarray): lon
 
         Returns:
             np.ndarray:
         """
-        lon_2d, lat_2d = np.meshgrid(lon.values, lat.values)
-        dx = 55.8 * math.cos(math.radians(45))
-        m = -1 * d_thita_dp / metpy.constants.earth_gravity
-        f = mpcalc.coriolis_parameter(lat_2d * units.degree)
+        if hasattr(d_thita_dp, "units"):
+            d_thita_dp = d_thita_dp.m_as(units.hPa / units.kelvin)
+        m = -1 * plain(d_thita_dp) / metpy.constants.earth_gravity.m_as(units("m/s**2"))
+        grid = Grid.from_axes(lat, lon)
 
         # vorticity
-        ise_u_wind = xr.DataArray(ise_u_wind,
-                dims=("latitude", "longitude"),
-                coords={"latitude": lat, "longitude": lon}
-        )
-        ise_v_wind = xr.DataArray(ise_v_wind,
-                dims=("latitude", "longitude"),
-                coords={"latitude": lat, "longitude": lon}
-        )
-        vorticity = mpcalc.vorticity(ise_u_wind * units('m/s'), ise_v_wind * units('m/s'))
-        ptl_vorticity = (f + vorticity) / (m)
+        if self.use_pint:
+            dims = ("isentropic", "latitude", "longitude")[-np.ndim(ise_u_wind):]
+            ise_u_wind = xr.DataArray(ise_u_wind, dims=dims, coords={"latitude": lat, "longitude": lon})
+            ise_v_wind = xr.DataArray(ise_v_wind, dims=dims, coords={"latitude": lat, "longitude": lon})
+            vorticity = mpcalc.vorticity(
+                ise_u_wind * units('m/s'), ise_v_wind * units('m/s')).data.m_as(1 / units.second)
+        else:
+            vorticity = grid.operator.vorticity(ise_u_wind, ise_v_wind)
+        ptl_vorticity = (grid.coriolis + vorticity) / (m)
+        # [K m/hPa/s**3] -> PVU
         return ptl_vorticity * 10000
+
+    def ptl_vorticity_volume(self, isentropic: Sequence[float], d_theta=5,
+                             ncfile=None, time_index=0) -> xr.DataArray:
+        """ptl_vorticity_volume.
+        isentropic potential vorticity on several isentropic surfaces [PVU].
+        t, u, v, gh are read once, and theta cube, interpolation weights and
+        pressure on isentropic surfaces are shared by all surfaces.
+        d_thita_dp is (p(theta + d_theta) - p(theta - d_theta)) / (2 * d_theta)
+        (same as ptl_vrt.py).
+
+        Args:
+            isentropic (Sequence[float]): isentropic surfaces [K] (e.g. range(290, 355, 5))
+            d_theta: half width of d_thita_dp stencil [K]
+            ncfile: ncfile used only in this call.
+            time_index: see get_parameter().
+
+        Returns:
+            xr.DataArray: (isentropic, lat, lon)
+        """
+        levels = sorted([int(pressure) for pressure in self.isobaric_surface_dict.keys()], reverse=True)
+        params = self.get_parameters(["t", "u", "v", "gh"], levels=levels,
+                                     ncfile=ncfile, time_index=time_index)
+        ptl_temp = self.cal_potential_temperature(params["t"], levels)
+
+        # surfaces and their stencil surfaces (shared by neighbor surfaces).
+        isentropic = [float(theta) for theta in isentropic]
+        targets = sorted(
+            {theta + offset for theta in isentropic for offset in (-d_theta, 0, d_theta)})
+        position = {theta: i for i, theta in enumerate(targets)}
+        center = [position[theta] for theta in isentropic]
+        lower = [position[theta - d_theta] for theta in isentropic]
+        upper = [position[theta + d_theta] for theta in isentropic]
+
+        interpolator = self.isentropic_interpolator(ptl_temp, targets)
+        ise_u_wind = interpolator(params["u"])[center]
+        ise_v_wind = interpolator(params["v"])[center]
+        ise_pressure = self.gph_to_pressure(interpolator(params["gh"]))
+        d_thita_dp = (ise_pressure[upper] - ise_pressure[lower]) / (2 * d_theta * units.kelvin)
+
+        lat, lon = self.get_lat_lon()
+        ptl_vorticity = self.cal_ptl_vorticity(ise_u_wind, ise_v_wind, d_thita_dp, lat, lon)
+        return xr.DataArray(ptl_vorticity,
+                dims=("isentropic", "latitude", "longitude"),
+                coords={"isentropic": isentropic, "latitude": lat, "longitude": lon}
+        )
+
+
+#----------kinematics----------
+    def kinematics(self, u_wind: np.ndarray, v_wind: np.ndarray,
+                   ptl_temp: np.ndarray = None, grid: Grid = None) -> "Kinematics":
+        """kinematics.
+        vorticity, divergence, deformation, advection and frontogenesis
+        derived from one derivative pass of u, v (and ptl_temp).
+        Arrays are (..., lat, lon), e.g. (level, lat, lon) or (time, level, lat, lon).
+
+        Args:
+            u_wind (np.ndarray): u_wind [m/s]
+            v_wind (np.ndarray): v_wind [m/s]
+            ptl_temp (np.ndarray): potential temperature [K] (for advection and frontogenesis)
+            grid (Grid): None means get_grid().
+
+        Returns:
+            Kinematics:
+        """
+        if grid is None:
+            grid = self.get_grid()
+        return Kinematics(grid, plain(u_wind), plain(v_wind),
+                          None if ptl_temp is None else plain(ptl_temp))
+
+    def kinematics_levels(self, levels=(850, 700, 500), ncfile=None,
+                          time_index=0) -> "Kinematics":
+        """kinematics_levels.
+        read u, v, t of levels once and return kinematics() of (level, lat, lon).
+
+        Args:
+            levels: isobaric surfaces [hPa]
+            ncfile: ncfile used only in this call.
+            time_index: see get_parameter().
+
+        Returns:
+            Kinematics:
+        """
+        levels = list(levels)
+        params = self.get_parameters(["u", "v", "t"], levels=levels,
+                                     ncfile=ncfile, time_index=time_index)
+        ptl_temp = self.cal_potential_temperature(params["t"], levels)
+        return self.kinematics(params["u"], params["v"], ptl_temp)
+
+#----------column integral----------
+    def _column_levels(self, isobaric_surface) -> np.ndarray:
+        """_column_levels.
+        isobaric surfaces of the level axis [hPa].
+
+        Args:
+            isobaric_surface: list of levels. None means all levels in the file order
+                              (same as get_parameters(levels=None)).
+        """
+        if isobaric_surface is None:
+            isobaric_surface = [int(pressure) for pressure in self.isobaric_surface_dict.keys()]
+        return np.asarray(isobaric_surface, dtype=np.float64)
+
+    def _specific_humidity(self, temperature_k: np.ndarray, rh: np.ndarray,
+                           levels: np.ndarray, state: "ThermoState") -> np.ndarray:
+        """_specific_humidity.
+        [kg/kg] of (..., level, lat, lon)
+
+        Args:
+            temperature_k (np.ndarray): temperature_k
+            rh (np.ndarray): rh [%]
+            levels (np.ndarray): levels [hPa]
+            state (ThermoState): thermo_state(temperature_k, rh, levels[:, np.newaxis, np.newaxis]) or None.
+        """
+        if state is None:
+            state = self.thermo_state(temperature_k, rh, levels[:, np.newaxis, np.newaxis])
+        return thermo.specific_humidity(state.mixing_ratio)
+
+    def cal_precipitable_water(self, temperature_k: np.ndarray = None, rh: np.ndarray = None,
+                               isobaric_surface=None, bottom=1000, top=300,
+                               surface_pressure=None, state: "ThermoState" = None) -> np.ndarray:
+        """cal_precipitable_water.
+        precipitable water(可降水量) [mm] from bottom (or the ground) to top.
+        Specific humidity is integrated (column.precipitable_water()).
+        Arrays are (level, lat, lon) or (time, level, lat, lon).
+
+        Args:
+            temperature_k (np.ndarray): temperature_k
+            rh (np.ndarray): rh [%]
+            isobaric_surface: levels of the level axis [hPa]. None means all levels in the file order.
+            bottom: bottom [hPa]
+            top: top [hPa]
+            surface_pressure: surface pressure [hPa] (lat, lon) or (time, lat, lon).
+                              Levels below the ground are masked.
+            state (ThermoState): thermo_state() of the same data (temperature_k, rh are not used).
+
+        Returns:
+            np.ndarray: (lat, lon) or (time, lat, lon)
+        """
+        levels = self._column_levels(isobaric_surface)
+        specific_humidity = self._specific_humidity(temperature_k, rh, levels, state)
+        return column.precipitable_water(
+            _to_pa(levels), specific_humidity, _to_pa(bottom), _to_pa(top),
+            None if surface_pressure is None else _to_pa(plain(surface_pressure)))
+
+    def cal_ivt(self, temperature_k: np.ndarray = None, rh: np.ndarray = None,
+                u_wind: np.ndarray = None, v_wind: np.ndarray = None, isobaric_surface=None,
+                bottom=1000, top=300, surface_pressure=None,
+                state: "ThermoState" = None) -> Tuple[np.ndarray, np.ndarray]:
+        """cal_ivt.
+        integrated vapor transport(水蒸気フラックス鉛直積算量) [kg/m/s]
+        from bottom (or the ground) to top.
+        np.hypot(ivt_u, ivt_v) is the magnitude.
+
+        Args:
+            temperature_k (np.ndarray): temperature_k
+            rh (np.ndarray): rh [%]
+            u_wind (np.ndarray): u_wind [m/s]
+            v_wind (np.ndarray): v_wind [m/s]
+            isobaric_surface: see cal_precipitable_water().
+            bottom: bottom [hPa]
+            top: top [hPa]
+            surface_pressure: see cal_precipitable_water().
+            state (ThermoState): see cal_precipitable_water().
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: ivt_u, ivt_v
+        """
+        levels = self._column_levels(isobaric_surface)
+        specific_humidity = self._specific_humidity(temperature_k, rh, levels, state)
+        return column.integrated_vapor_transport(
+            _to_pa(levels), specific_humidity, plain(u_wind), plain(v_wind),
+            _to_pa(bottom), _to_pa(top),
+            None if surface_pressure is None else _to_pa(plain(surface_pressure)))
+
+#----------parcel----------
+    def cal_cape_cin(self, temperature_k: np.ndarray = None, rh: np.ndarray = None,
+                     isobaric_surface=None, parcel="surface", surface_pressure=None,
+                     state: "ThermoState" = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """cal_cape_cin.
+        CAPE and CIN [J/kg] and LCL [hPa] of every grid point by ncmagics.parcel
+        (same semantics as metpy.calc.surface_based_cape_cin and most_unstable_cape_cin).
+        Arrays are (level, lat, lon) or (time, level, lat, lon).
+
+        Args:
+            temperature_k (np.ndarray): temperature_k
+            rh (np.ndarray): rh [%]
+            isobaric_surface: see cal_precipitable_water().
+            parcel: "surface" or "most_unstable" (in 300 hPa above the ground).
+            surface_pressure: see cal_precipitable_water().
+            state (ThermoState): see cal_precipitable_water().
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: cape, cin, lcl_pressure
+        """
+        levels = self._column_levels(isobaric_surface)
+        if state is None:
+            state = self.thermo_state(temperature_k, rh, levels[:, np.newaxis, np.newaxis])
+        cape, cin, lcl_pressure = parcel_theory.cape_cin(
+            _to_pa(levels), state.temperature_k, state.dewpoint, parcel=parcel,
+            surface_pressure=None if surface_pressure is None else _to_pa(plain(surface_pressure)),
+            virtual_temperature=False)
+        return cape, cin, lcl_pressure / 100
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class ThermoState:
+    """ThermoState.
+    derived quantities of one (temperature, rh, isobaric_surface).
+    Each quantity is calculated at first access and memoized.
+    Use MeteoTools.thermo_state() to make it.
+    """
+    tools: MeteoTools
+    temperature_k: np.ndarray
+    rh: np.ndarray
+    isobaric_surface: Union[int, np.ndarray]
+    _cache: dict = dataclasses.field(default_factory=dict, repr=False)
+    _lock: threading.RLock = dataclasses.field(default_factory=threading.RLock, repr=False)
+
+    @cached
+    def mixing_ratio(self) -> np.ndarray:
+        """mixing_ratio.
+        [kg/kg]
+        """
+        return self.tools._cal_mixing_ratio(self.temperature_k, self.rh, self.isobaric_surface)
+
+    @cached
+    def vapor_pressure(self) -> np.ndarray:
+        """vapor_pressure.
+        [hPa]
+        """
+        return self.tools._cal_vapor_pressure(self.mixing_ratio, self.isobaric_surface)
+
+    @cached
+    def dewpoint(self) -> np.ndarray:
+        """dewpoint.
+        [K]
+        """
+        return self.tools._cal_dewpoint(self.vapor_pressure)
+
+    @cached
+    def dewpoint_depression(self) -> np.ndarray:
+        """dewpoint_depression.
+        temperature - dewpoint (湿数) [K]
+        """
+        return self.temperature_k - self.dewpoint
+
+    @cached
+    def eqv_potential_temperature(self) -> np.ndarray:
+        """eqv_potential_temperature.
+        [K]
+        """
+        return self.tools._cal_eqv_potential_temperature(
+            self.temperature_k, self.dewpoint, self.isobaric_surface)
+
+    @cached
+    def wet_bulb_temperature(self) -> np.ndarray:
+        """wet_bulb_temperature.
+        [K]
+        """
+        return self.tools._cal_wet_bulb_temperature(
+            self.temperature_k, self.dewpoint, self.isobaric_surface)
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class Kinematics:
+    """Kinematics.
+    kinematic diagnostics of (..., lat, lon) wind (and potential temperature).
+    Four wind derivatives (with map factor terms on the sphere) and two
+    potential temperature derivatives are calculated once by Grid.operator,
+    and every diagnostic is derived from them. Units are SI.
+    Use MeteoTools.kinematics() to make it.
+    """
+    grid: Grid
+    u_wind: np.ndarray
+    v_wind: np.ndarray
+    ptl_temp: Optional[np.ndarray] = None
+    _cache: dict = dataclasses.field(default_factory=dict, repr=False)
+    _lock: threading.RLock = dataclasses.field(default_factory=threading.RLock, repr=False)
+
+    @cached
+    def wind_derivatives(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """wind_derivatives.
+        du/dx, du/dy, dv/dx, dv/dy [1/s]
+        """
+        operator = self.grid.operator
+        du_dx, du_dy = operator.gradient(self.u_wind)
+        dv_dx, dv_dy = operator.gradient(self.v_wind)
+        # map factor terms of the sphere.
+        du_dx -= self.v_wind * operator.tan_lat
+        dv_dx += self.u_wind * operator.tan_lat
+        return du_dx, du_dy, dv_dx, dv_dy
+
+    @cached
+    def ptl_temp_gradient(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ptl_temp_gradient.
+        dtheta/dx, dtheta/dy [K/m]
+        """
+        if self.ptl_temp is None:
+            raise ValueError("ptl_temp is not given.")
+        return self.grid.operator.gradient(self.ptl_temp)
+
+    @cached
+    def vorticity(self) -> np.ndarray:
+        """vorticity.
+        relative vorticity [1/s]
+        """
+        _, du_dy, dv_dx, _ = self.wind_derivatives
+        return dv_dx - du_dy
+
+    @cached
+    def divergence(self) -> np.ndarray:
+        """divergence.
+        [1/s]
+        """
+        du_dx, _, _, dv_dy = self.wind_derivatives
+        return du_dx + dv_dy
+
+    @cached
+    def stretching_deformation(self) -> np.ndarray:
+        """stretching_deformation.
+        du/dx - dv/dy [1/s]
+        """
+        du_dx, _, _, dv_dy = self.wind_derivatives
+        return du_dx - dv_dy
+
+    @cached
+    def shearing_deformation(self) -> np.ndarray:
+        """shearing_deformation.
+        dv/dx + du/dy [1/s]
+        """
+        _, du_dy, dv_dx, _ = self.wind_derivatives
+        return dv_dx + du_dy
+
+    @cached
+    def total_deformation(self) -> np.ndarray:
+        """total_deformation.
+        [1/s]
+        """
+        return np.hypot(self.stretching_deformation, self.shearing_deformation)
+
+    @cached
+    def ptl_temp_advection(self) -> np.ndarray:
+        """ptl_temp_advection.
+        -(u dtheta/dx + v dtheta/dy) [K/s]
+        """
+        dtheta_dx, dtheta_dy = self.ptl_temp_gradient
+        return -(self.u_wind * dtheta_dx + self.v_wind * dtheta_dy)
+
+    @cached
+    def frontogenesis(self) -> np.ndarray:
+        """frontogenesis.
+        2D Petterssen frontogenesis
+        F = 1/2 |grad theta| (D cos(2 beta) - div) [K/m/s]
+        (same as metpy.calc.frontogenesis).
+        """
+        dtheta_dx, dtheta_dy = self.ptl_temp_gradient
+        gradient_size = np.hypot(dtheta_dx, dtheta_dy)
+        # beta: angle between the dilatation axis and isentropes.
+        psi = 0.5 * np.arctan2(self.shearing_deformation, self.stretching_deformation)
+        sin_beta = np.divide(dtheta_dx * np.cos(psi) + dtheta_dy * np.sin(psi), gradient_size,
+                             out=np.zeros_like(gradient_size), where=gradient_size != 0)
+        return 0.5 * gradient_size * (self.total_deformation * (1 - 2 * sin_beta ** 2)
+                                      - self.divergence)
+
+
+@functools.lru_cache(maxsize=None)
+def _exner_factors(levels: Tuple[float, ...]) -> np.ndarray:
+    """_exner_factors.
+    (P0/P)^kappa of each level, shape is (level, 1, 1). Cached per level set.
+
+    Args:
+        levels (Tuple[float, ...]): isobaric surfaces [hPa]
+    """
+    pressure = np.array(levels, dtype=np.float64) * 100
+    factors = ((thermo.P0 / pressure) ** thermo.KAPPA)[:, np.newaxis, np.newaxis]
+    factors.setflags(write=False)
+    return factors
+
+
+def _to_pa(isobaric_surface):
+    """_to_pa.
+    hPa to Pa. Python float for scalar, so float32 fields stay float32.
+
+    Args:
+        isobaric_surface: isobaric_surface [hPa] (number or array)
+    """
+    if np.ndim(isobaric_surface) == 0:
+        return float(isobaric_surface) * 100
+    return np.asarray(isobaric_surface, dtype=np.float64) * 100
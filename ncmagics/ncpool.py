@@ -0,0 +1,162 @@
+# coding: utf-8
+"""
+Name: ncpool.py
+
+LRU pool of open netcdf file handles keyed by path.
+Switching between files doesn't reopen (and parse HDF5 metadata of) the file.
+netCDF-C / HDF5 is not thread safe in the whole process (not only per file),
+so every netCDF4 call (open, close, read, set_auto_maskandscale, ...)
+must be done with NETCDF_LOCK. open_dataset() yields it.
+
+example:
+    from ncmagics import ncpool
+    ncpool.set_max_open(32)
+    with ncpool.open_dataset(ncfile) as (dataset, lock):
+        with lock:
+            data = dataset.variables["t"][0]
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from collections import OrderedDict
+from typing import Iterator, Tuple
+import contextlib
+import dataclasses
+import os
+import threading
+from netCDF4 import Dataset
+
+# process-wide lock of netCDF-C / HDF5. It is also the lock of the pool.
+NETCDF_LOCK = threading.RLock()
+
+
+@dataclasses.dataclass
+class _Handle:
+    """_Handle.
+    open netcdf file and the state of the file when it was opened.
+    """
+    dataset: Dataset
+    stamp: Tuple[int, int, int]
+    in_use: int = 0
+
+
+def file_stamp(ncfile: str) -> Tuple[int, int, int]:
+    """file_stamp.
+    (inode, size, mtime). If it changes, the file is reopened.
+
+    Args:
+        ncfile (str): ncfile
+    """
+    stat = os.stat(ncfile)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class NcPool:
+    """NcPool.
+    Least recently used handles are closed when more than max_open files are open.
+    Handles in use are not closed.
+    Files are opened and closed with NETCDF_LOCK, so they don't run
+    at the same time as reads of other handles.
+    """
+
+    def __init__(self, max_open=16):
+        """__init__.
+
+        Args:
+            max_open: max number of open netcdf files.
+        """
+        self.max_open = max_open
+        self._handles: "OrderedDict[str, _Handle]" = OrderedDict()
+        self._lock = NETCDF_LOCK
+
+    @contextlib.contextmanager
+    def open_dataset(self, ncfile: str) -> Iterator[Tuple[Dataset, threading.RLock]]:
+        """open_dataset.
+        yield netcdf file handle and NETCDF_LOCK.
+        netCDF-C is not thread safe, so hold the lock while calling netCDF4.
+
+        Args:
+            ncfile (str): ncfile
+        """
+        key = os.path.abspath(ncfile)
+        stamp = file_stamp(key)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and handle.stamp != stamp:
+                # file was rewritten. handle in use is closed by its last user.
+                if handle.in_use == 0:
+                    handle.dataset.close()
+                handle = None
+            if handle is None:
+                handle = _Handle(Dataset(key, "r"), stamp)
+                self._handles[key] = handle
+            self._handles.move_to_end(key)
+            handle.in_use += 1
+            self._evict()
+        try:
+            yield handle.dataset, NETCDF_LOCK
+        finally:
+            with self._lock:
+                handle.in_use -= 1
+                if self._handles.get(key) is not handle and handle.in_use == 0:
+                    handle.dataset.close()
+                self._evict()
+
+    def _evict(self):
+        """_evict.
+        close least recently used handles which are not in use.
+        Call with self._lock.
+        """
+        for key in list(self._handles):
+            if len(self._handles) <= self.max_open:
+                break
+            handle = self._handles[key]
+            if handle.in_use == 0:
+                handle.dataset.close()
+                del self._handles[key]
+
+    def discard(self, ncfile: str):
+        """discard.
+        close handle of ncfile (e.g. before overwriting the file).
+
+        Args:
+            ncfile (str): ncfile
+        """
+        with self._lock:
+            handle = self._handles.pop(os.path.abspath(ncfile), None)
+            if handle is not None and handle.in_use == 0:
+                handle.dataset.close()
+
+    def close_all(self):
+        """close_all.
+        """
+        with self._lock:
+            for key in list(self._handles):
+                handle = self._handles.pop(key)
+                if handle.in_use == 0:
+                    handle.dataset.close()
+
+
+POOL = NcPool(max_open=int(os.environ.get("NCMAGICS_MAX_OPEN", 16)))
+
+
+def open_dataset(ncfile: str):
+    """open_dataset.
+    NcPool.open_dataset() of the shared pool.
+
+    Args:
+        ncfile (str): ncfile
+    """
+    return POOL.open_dataset(ncfile)
+
+
+def set_max_open(max_open: int):
+    """set_max_open.
+    change max number of open netcdf files of the shared pool.
+
+    Args:
+        max_open (int): max_open
+    """
+    with POOL._lock:
+        POOL.max_open = max_open
+        POOL._evict()
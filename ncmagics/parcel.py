@@ -0,0 +1,337 @@
+# coding: utf-8
+"""
+Name: parcel.py
+
+Parcel theory (LCL, CAPE, CIN) of every column of (..., level, lat, lon)
+arrays at once. The moist adiabat is read from a lookup table which is
+made once per process by integrating the pseudo-adiabatic lapse rate of
+metpy.calc.moist_lapse, so no Python loop over grid points is needed.
+Units are SI: pressure [Pa], temperature [K], CAPE and CIN [J/kg].
+Semantics are the same as metpy.calc.cape_cin (LFC: "bottom", EL: "top").
+
+example:
+    from ncmagics import parcel
+    pressure = [100000, 92500, 85000, 70000, 50000, 30000]
+    cape, cin, lcl_pressure = parcel.cape_cin(pressure, temp_k, dewpoint_k)  # (lat, lon)
+    cape, cin, _ = parcel.cape_cin(pressure, temp_k, dewpoint_k, parcel="most_unstable")
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from typing import Sequence, Tuple
+import functools
+import numpy as np
+from ncmagics import thermo
+
+LV = 2500840.  # [J/kg] (same as metpy.constants.Lv)
+
+
+def lcl(pressure, temperature, dewpoint_, iterations=5) -> Tuple[np.ndarray, np.ndarray]:
+    """lcl.
+    lifting condensation level. Bolton (1980) closed form is the first guess,
+    and the fixed point iteration of metpy.calc.lcl is done iterations times.
+
+    Args:
+        pressure: pressure of the parcel [Pa]
+        temperature: temperature of the parcel [K]
+        dewpoint_: dewpoint of the parcel [K]
+        iterations: iterations
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: pressure [Pa], temperature [K] of the LCL.
+    """
+    pressure = np.asarray(pressure, dtype=np.float64)
+    temperature = np.asarray(temperature, dtype=np.float64)
+    dewpoint_ = np.minimum(dewpoint_, temperature)
+    mixing_ratio = thermo.saturation_mixing_ratio(pressure, dewpoint_)
+    temp_lcl = 56 + 1 / (1 / (dewpoint_ - 56) + np.log(temperature / dewpoint_) / 800)
+    pressure_lcl = pressure * (temp_lcl / temperature) ** (1 / thermo.KAPPA)
+    for _ in range(iterations):
+        temp_lcl = thermo.dewpoint(thermo.vapor_pressure(pressure_lcl, mixing_ratio))
+        pressure_lcl = pressure * (temp_lcl / temperature) ** (1 / thermo.KAPPA)
+    pressure_lcl = np.minimum(pressure_lcl, pressure)
+    return pressure_lcl, temperature * (pressure_lcl / pressure) ** thermo.KAPPA
+
+
+class MoistAdiabat:
+    """MoistAdiabat.
+    lookup table of pseudo-adiabats. Each adiabat is named by its wet bulb
+    potential temperature (temperature at 1000 hPa).
+    Both tables are regular in (ln p, theta_w) and (ln p, T), and
+    bilinear interpolation is used. Use moist_adiabat() to share one instance.
+    """
+    # ln p step (100 rows per halving of pressure), rows from about 1100 hPa to 50 hPa.
+    LN_P_STEP = -np.log(2) / 100
+    ROWS = (-14, 434)
+    THETA_W = (200., 330., 0.25)
+    TEMPERATURE = (150., 330., 0.25)
+
+    def __init__(self, substeps=2):
+        """__init__.
+        integrate dT/dln p by RK4 from 1000 hPa.
+
+        Args:
+            substeps: RK4 steps per row.
+        """
+        self.ln_p0 = np.log(100000.) + self.ROWS[0] * self.LN_P_STEP
+        theta_w = np.arange(*self.THETA_W)
+        n_rows = self.ROWS[1] - self.ROWS[0]
+        start = -self.ROWS[0]
+
+        table = np.empty((n_rows, len(theta_w)))
+        table[start] = theta_w
+        for direction in (1, -1):
+            step = direction * self.LN_P_STEP / substeps
+            row, temperature = start, theta_w.copy()
+            while 0 <= row + direction < n_rows:
+                ln_p = self.ln_p0 + row * self.LN_P_STEP
+                for _ in range(substeps):
+                    temperature = _rk4(ln_p, temperature, step)
+                    ln_p += step
+                row += direction
+                table[row] = temperature
+        self.table = table
+
+        # inverse table: theta_w of (ln p, T). T is monotonic in theta_w on each row.
+        temperature = np.arange(*self.TEMPERATURE)
+        self.inverse_table = np.stack([np.interp(temperature, row, theta_w) for row in table])
+
+    def temperature(self, pressure, theta_w) -> np.ndarray:
+        """temperature.
+
+        Args:
+            pressure: pressure [Pa]
+            theta_w: wet bulb potential temperature [K] of the adiabat
+
+        Returns:
+            np.ndarray: temperature [K] on the adiabat.
+        """
+        return _bilinear(self.table, self._row(pressure),
+                         (np.asarray(theta_w) - self.THETA_W[0]) / self.THETA_W[2])
+
+    def theta_w(self, pressure, temperature) -> np.ndarray:
+        """theta_w.
+
+        Args:
+            pressure: pressure [Pa]
+            temperature: saturated temperature [K]
+
+        Returns:
+            np.ndarray: wet bulb potential temperature [K] of the adiabat through (pressure, temperature).
+        """
+        return _bilinear(self.inverse_table, self._row(pressure),
+                         (np.asarray(temperature) - self.TEMPERATURE[0]) / self.TEMPERATURE[2])
+
+    def _row(self, pressure) -> np.ndarray:
+        """_row.
+        fractional row index of pressure.
+
+        Args:
+            pressure: pressure [Pa]
+        """
+        return (np.log(pressure) - self.ln_p0) / self.LN_P_STEP
+
+
+def _moist_lapse_rate(ln_p: float, temperature: np.ndarray) -> np.ndarray:
+    """_moist_lapse_rate.
+    dT/dln p of pseudo-adiabat (same formula as metpy.calc.moist_lapse).
+
+    Args:
+        ln_p (float): ln of pressure [Pa]
+        temperature (np.ndarray): temperature [K]
+    """
+    mixing_ratio = thermo.saturation_mixing_ratio(np.exp(ln_p), temperature)
+    return ((thermo.RD * temperature + LV * mixing_ratio)
+            / (thermo.CP_D + LV ** 2 * mixing_ratio * thermo.EPSILON / (thermo.RD * temperature ** 2)))
+
+
+def _rk4(ln_p: float, temperature: np.ndarray, step: float) -> np.ndarray:
+    """_rk4.
+
+    Args:
+        ln_p (float): ln_p
+        temperature (np.ndarray): temperature
+        step (float): step of ln p
+    """
+    k_1 = _moist_lapse_rate(ln_p, temperature)
+    k_2 = _moist_lapse_rate(ln_p + step / 2, temperature + step / 2 * k_1)
+    k_3 = _moist_lapse_rate(ln_p + step / 2, temperature + step / 2 * k_2)
+    k_4 = _moist_lapse_rate(ln_p + step, temperature + step * k_3)
+    return temperature + step / 6 * (k_1 + 2 * k_2 + 2 * k_3 + k_4)
+
+
+def _bilinear(table: np.ndarray, row: np.ndarray, column: np.ndarray) -> np.ndarray:
+    """_bilinear.
+    values of table at fractional index. Out of the table is clipped to its edge.
+
+    Args:
+        table (np.ndarray): table
+        row (np.ndarray): fractional row index
+        column (np.ndarray): fractional column index
+    """
+    row = np.clip(row, 0, table.shape[0] - 1)
+    column = np.clip(column, 0, table.shape[1] - 1)
+    row_0 = np.minimum(row.astype(np.intp), table.shape[0] - 2)
+    column_0 = np.minimum(column.astype(np.intp), table.shape[1] - 2)
+    row_w = row - row_0
+    column_w = column - column_0
+    return ((1 - row_w) * ((1 - column_w) * table[row_0, column_0] + column_w * table[row_0, column_0 + 1])
+            + row_w * ((1 - column_w) * table[row_0 + 1, column_0]
+                       + column_w * table[row_0 + 1, column_0 + 1]))
+
+
+@functools.lru_cache(maxsize=None)
+def moist_adiabat() -> MoistAdiabat:
+    """moist_adiabat.
+    shared MoistAdiabat (made at the first call).
+    """
+    return MoistAdiabat()
+
+
+def _virtual_temperature(temperature, mixing_ratio) -> np.ndarray:
+    """_virtual_temperature.
+
+    Args:
+        temperature: temperature [K]
+        mixing_ratio: mixing ratio [kg/kg]
+    """
+    return temperature * (mixing_ratio + thermo.EPSILON) / (thermo.EPSILON * (1 + mixing_ratio))
+
+
+def cape_cin(pressure: Sequence[float], temperature: np.ndarray, dewpoint_: np.ndarray,
+             parcel="surface", surface_pressure=None, depth=30000.,
+             virtual_temperature=False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """cape_cin.
+    CAPE and CIN of the parcel lifted from the surface or the most unstable level.
+    The profile is piecewise linear in ln p between the levels and the LCL.
+    CAPE is the area between LFC and EL, CIN is the area below LFC (<= 0).
+    Both are 0 if there is no LFC.
+
+    Args:
+        pressure (Sequence[float]): levels of the level axis [Pa] (any order)
+        temperature (np.ndarray): (..., level, lat, lon) [K]
+        dewpoint_ (np.ndarray): (..., level, lat, lon) [K]
+        parcel: "surface" (the lowest level above the ground) or
+                "most_unstable" (max equivalent potential temperature in depth above
+                surface_pressure, or the highest pressure level if it is None).
+        surface_pressure: (..., lat, lon) [Pa] or None. Levels below the ground are not used.
+        depth: depth of the search of the most unstable parcel [Pa]
+        virtual_temperature: use virtual temperature (metpy >= 1.4) or
+                             temperature (metpy 1.1).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: cape, cin [J/kg], LCL pressure [Pa] of (..., lat, lon)
+    """
+    pressure = np.asarray(pressure, dtype=np.float64)
+    order = np.argsort(-pressure)
+    temperature = np.take(temperature, order, axis=-3).astype(np.float64)
+    dewpoint_ = np.take(dewpoint_, order, axis=-3).astype(np.float64)
+    pressure = pressure[order]
+
+    # (level, column)
+    shape = temperature.shape[:-3] + temperature.shape[-2:]
+    n_level = len(pressure)
+    temperature = np.moveaxis(temperature, -3, 0).reshape(n_level, -1)
+    dewpoint_ = np.moveaxis(dewpoint_, -3, 0).reshape(n_level, -1)
+    column = np.arange(temperature.shape[1])
+    level_pressure = np.repeat(pressure[:, np.newaxis], len(column), axis=1)
+
+    if surface_pressure is None:
+        above_ground = np.ones(temperature.shape, dtype=bool)
+        ground = np.full(len(column), pressure[0])
+    else:
+        ground = np.broadcast_to(surface_pressure, shape).reshape(-1)
+        above_ground = level_pressure <= ground
+    lowest = np.argmax(above_ground, axis=0)
+    if parcel == "surface":
+        start = lowest
+    elif parcel == "most_unstable":
+        theta_e = thermo.equivalent_potential_temperature(level_pressure, temperature, dewpoint_)
+        # depth is measured from the ground (surface_pressure), as metpy.
+        in_layer = above_ground & (level_pressure >= ground - depth)
+        start = np.argmax(np.where(in_layer & ~np.isnan(theta_e), theta_e, -np.inf), axis=0)
+    else:
+        raise ValueError(f'parcel must be "surface" or "most_unstable" (got {parcel!r}).')
+
+    start_pressure = pressure[start]
+    start_temperature = temperature[start, column]
+    start_dewpoint = dewpoint_[start, column]
+    lcl_pressure, lcl_temperature = lcl(start_pressure, start_temperature, start_dewpoint)
+    profile_lcl_pressure = np.maximum(lcl_pressure, pressure[-1])
+
+    # parcel temperature of the levels and the LCL.
+    point_pressure = np.concatenate([level_pressure, profile_lcl_pressure[np.newaxis]])
+    dry = start_temperature * (point_pressure / start_pressure) ** thermo.KAPPA
+    adiabat = moist_adiabat()
+    moist = adiabat.temperature(
+        point_pressure, adiabat.theta_w(profile_lcl_pressure, dry[-1]))
+    parcel_temperature = np.where(point_pressure >= profile_lcl_pressure, dry, moist)
+
+    # environment of the LCL (linear in ln p).
+    upper = np.clip(np.sum(pressure[:, np.newaxis] > profile_lcl_pressure, axis=0), 1, n_level - 1)
+    weight = (np.log(profile_lcl_pressure / pressure[upper - 1])
+              / np.log(pressure[upper] / pressure[upper - 1]))
+    environment = np.concatenate([
+        temperature,
+        [(1 - weight) * temperature[upper - 1, column] + weight * temperature[upper, column]],
+    ])
+    if virtual_temperature:
+        environment_dewpoint = np.concatenate([
+            dewpoint_,
+            [(1 - weight) * dewpoint_[upper - 1, column] + weight * dewpoint_[upper, column]],
+        ])
+        environment = _virtual_temperature(
+            environment, thermo.saturation_mixing_ratio(point_pressure, environment_dewpoint))
+        parcel_temperature = _virtual_temperature(parcel_temperature, np.where(
+            point_pressure > lcl_pressure,
+            thermo.saturation_mixing_ratio(start_pressure, start_dewpoint),
+            thermo.saturation_mixing_ratio(point_pressure, parcel_temperature)))
+    buoyancy = parcel_temperature - environment
+
+    # points below the parcel are moved to the parcel (zero length, zero buoyancy).
+    below = point_pressure > start_pressure
+    point_pressure = np.where(below, start_pressure, point_pressure)
+    buoyancy = np.where(below, 0., buoyancy)
+    point_order = np.argsort(-point_pressure, axis=0, kind="stable")
+    ln_p = np.log(np.take_along_axis(point_pressure, point_order, axis=0))
+    buoyancy = np.take_along_axis(buoyancy, point_order, axis=0)
+    lcl_index = np.argmax(point_order == n_level, axis=0)
+
+    # area (integral of buoyancy d(-ln p)) below each point.
+    length = ln_p[:-1] - ln_p[1:]
+    area = np.concatenate([np.zeros((1, len(column))),
+                           np.cumsum((buoyancy[:-1] + buoyancy[1:]) / 2 * length, axis=0)])
+    b_lower, b_upper = buoyancy[:-1], buoyancy[1:]
+    above_lcl = np.arange(n_level)[:, np.newaxis] >= lcl_index
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossing = b_lower / (b_lower - b_upper)
+
+    def _crossing_area(segment: np.ndarray):
+        """area and ln p below the zero crossing in segment."""
+        fraction = crossing[segment, column]
+        return (area[segment, column] + length[segment, column] * fraction * b_lower[segment, column] / 2,
+                ln_p[segment, column] - length[segment, column] * fraction)
+
+    # LFC: the lowest crossing to positive above the LCL, or the LCL.
+    rising = (b_lower <= 0) & (b_upper > 0) & above_lcl
+    has_lfc = rising.any(axis=0)
+    lfc_area, lfc_ln_p = _crossing_area(np.argmax(rising, axis=0))
+    positive_above_lcl = ((buoyancy > 0) & (np.arange(n_level + 1)[:, np.newaxis] >= lcl_index)).any(axis=0)
+    lfc_is_lcl = ~has_lfc & positive_above_lcl
+    lfc_area = np.where(lfc_is_lcl, area[lcl_index, column], lfc_area)
+    lfc_ln_p = np.where(lfc_is_lcl, ln_p[lcl_index, column], lfc_ln_p)
+    has_lfc |= lfc_is_lcl
+
+    # EL: the highest crossing to negative above the LCL, or the top.
+    falling = (b_lower > 0) & (b_upper <= 0) & above_lcl
+    el_area, el_ln_p = _crossing_area(n_level - 1 - np.argmax(falling[::-1], axis=0))
+    el_is_top = (buoyancy[-1] > 0) | ~falling.any(axis=0)
+    el_area = np.where(el_is_top, area[-1], el_area)
+    el_ln_p = np.where(el_is_top, ln_p[-1], el_ln_p)
+
+    cape = np.where(has_lfc & (el_ln_p <= lfc_ln_p), thermo.RD * (el_area - lfc_area), 0.)
+    cin = np.where(has_lfc, np.minimum(thermo.RD * lfc_area, 0.), 0.)
+    invalid = np.isnan(buoyancy).any(axis=0) | ~above_ground.any(axis=0)
+    cape[invalid] = np.nan
+    cin[invalid] = np.nan
+    return cape.reshape(shape), cin.reshape(shape), lcl_pressure.reshape(shape)
@@ -2,141 +2,497 @@
 """
 Name: readnc.py
 
-read netcdf file and cut near japan area.
+read netcdf file and cut region (default: near japan area).
+Every field is normalized to ascending latitude and 0-360 longitude,
+so files which store latitude in the opposite order (e.g. apcp and
+troposphere) share lat, lon.
 
 example:
     from ncmagics import readnc
+    cal_phys = readnc.CalcPhysics(ncfile)  # near japan
+    cal_phys_nh = readnc.CalcPhysics(ncfile, region="nh")
+    for valid_time, params in cal_phys.iter_times(["t", "r"], levels=[850]):
+        ...
 
 Authore: Ryosuke Tomita
 Date: 2021/12/06
 """
-from typing import Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import contextlib
 import dataclasses
 import numpy as np
+import netCDF4
 from netCDF4 import Dataset
 import xarray as xr
+from ncmagics import diskcache, fetchtime, fieldcache, ncpool
+from ncmagics.grid import Grid
+from ncmagics.region import AreaIndex, Region, get_region
+from ncmagics.vinterp import LogPressureInterpolator, log_pressure_interpolator
 
 
 @dataclasses.dataclass
 class CalcPhysics:
     """CalcPhysics.
+    region: preset name ("japan", "nh", "global"), Region or
+    (lat_min, lat_max, lon_min, lon_max).
+    masked, dtype: default of get_parameter(masked=, dtype=).
+    Read methods don't change the instance, so one instance can be shared
+    by several threads. netCDF-C is not thread safe, so reads of all files
+    are serialized by ncpool.NETCDF_LOCK (cached fields are returned
+    without the lock).
+    Fields are returned as read-only arrays (they may be shared by
+    fieldcache). Copy them by np.array() before changing them in place.
     """
     ncfile: str
+    region: Union[str, Region, tuple] = "japan"
+    masked: bool = True
+    dtype: Optional[Union[str, type, np.dtype]] = None
 
     def __post_init__(self):
         """__post_init__.
         """
-        self.dataset = Dataset(self.ncfile)
-
-        # set variable name.
-        self.variables_name_level = None
-        for dim in self.dataset.dimensions:
-            if   self.dataset[dim].axis == "Y":
-                self.variables_name_lat = dim
-            elif self.dataset[dim].axis == "X":
-                self.variables_name_lon = dim
-            elif self.dataset[dim].axis == "Z":
-                self.variables_name_level = dim
-            else:
-                continue
-
-        # check data is 3D or 2D
-        try:
-            isobaric_surface = np.array(self.dataset.variables[self.variables_name_level])
-            isobaric_surface_key = [str(int(level)) for level in isobaric_surface]
-            isobaric_value = list(range(len(isobaric_surface)))
-            self.isobaric_surface_dict = dict(zip(isobaric_surface_key, isobaric_value))
-            if "lev" in self.variables_name_level:
-                self.data_dims = "3D"
-            else:
-                self.data_dims = "2D"
-        except KeyError:
-            self.data_dims = "2D"
-
-        self.jp_mask: np.ma.core.MaskedArray
-        self.len_jp_lat: int
-        self.len_jp_lon: int
+        self.region = get_region(self.region)
+        self._area_index_dict: Dict[str, AreaIndex] = {}
 
-    def _cut_near_japan_area(self, lat: np.ndarray, lon: np.ndarray):
-        """_cut_near_japan_area.
-
-        Args:
-            lat (np.ndarray): lat
-            lon (np.ndarray): lon
-        """
-        lon_2d, lat_2d = np.meshgrid(lon, lat)
-        self.jp_mask = ((lon_2d >= 110) & (lon_2d <= 180) & (lat_2d >= 20) & (lat_2d <= 60))
+        with self._open() as (dataset, lock), lock:
+            # set variable name.
+            axis_names = get_axis_names(dataset)
+            self.variables_name_lat = axis_names["Y"]
+            self.variables_name_lon = axis_names["X"]
+            self.variables_name_level = axis_names.get("Z")
 
-        lat_gt20_lt60 = ((lat >= 20) & (lat <= 60))
-        lon_gt110_lt180 = ((lon >= 110) & (lon <= 180))
-        jp_lat = lat[lat_gt20_lt60]
-        jp_lon = lon[lon_gt110_lt180]
-        self.len_jp_lat = len(jp_lat)
-        self.len_jp_lon = len(jp_lon)
-        return jp_lat, jp_lon
+            # check data is 3D or 2D
+            try:
+                isobaric_surface = np.asarray(dataset.variables[self.variables_name_level][:])
+                isobaric_surface_key = [str(int(level)) for level in isobaric_surface]
+                isobaric_value = list(range(len(isobaric_surface)))
+                self.isobaric_surface_dict = dict(zip(isobaric_surface_key, isobaric_value))
+                if "lev" in self.variables_name_level:
+                    self.data_dims = "3D"
+                else:
+                    self.data_dims = "2D"
+            except KeyError:
+                self.data_dims = "2D"
 
     def get_lat_lon(self) -> Tuple[np.ndarray, np.ndarray]:
         """get_lat_lon.
+        lat (ascending) and lon (0-360) of the region.
+
         Args:
 
         Returns:
             Tuple[np.ndarray, np.ndarray]:
         """
-        lat = self.dataset.variables[self.variables_name_lat][:]
-        lon = self.dataset.variables[self.variables_name_lon][:]
+        with self._open() as (dataset, lock), lock:
+            area_index = self._area_index(dataset)
+            lat = dataset.variables[self.variables_name_lat][:]
+            lon = dataset.variables[self.variables_name_lon][:]
 
-        jp_lat, jp_lon = self._cut_near_japan_area(lat, lon)
-        return np.array(jp_lat), np.array(jp_lon)
+        return np.array(area_index.lat(lat)), np.array(area_index.lon(lon))
+
+    def get_grid(self) -> Grid:
+        """get_grid.
+        Grid (lat, lon, 2D coordinates, dx, dy, coriolis parameter, cell area)
+        of the region. It is shared by every instance with the same lat lon.
+
+        Returns:
+            Grid:
+        """
+        return Grid.from_axes(*self.get_lat_lon())
 
     def get_lat_lon_xr(self) -> Tuple[xr.DataArray, xr.DataArray]:
         """get_lat_lon_xr.
+        xarray is backed by the same netcdf file handle as get_parameter().
 
         Args:
 
         Returns:
             Tuple[xr.DataArray, xr.DataArray]:
         """
-        self.dataset_xr = xr.open_dataset(self.ncfile)
-        lat = self.dataset_xr[self.variables_name_lat]
-        lon = self.dataset_xr[self.variables_name_lon]
+        with self._open() as (dataset, lock), lock:
+            area_index = self._area_index(dataset)
+            dataset_xr = _open_dataset_xr(dataset)
+            lat = dataset_xr[self.variables_name_lat].load()
+            lon = dataset_xr[self.variables_name_lon].load()
 
-        jp_lat, jp_lon = self._cut_near_japan_area(lat, lon)
-        return jp_lat, jp_lon
+        area_lat = area_index.lat(lat.values)
+        area_lon = area_index.lon(lon.values)
+        return (
+            xr.DataArray(area_lat, dims=lat.dims, coords={lat.name: area_lat}, attrs=lat.attrs),
+            xr.DataArray(area_lon, dims=lon.dims, coords={lon.name: area_lon}, attrs=lon.attrs),
+        )
 
-    def get_parameter(self, params:str, ncfile=None, isobaric_surface=None) -> np.ndarray:
-        """get_parameter.
-        read netcdf file to get physical parameter.
-        Warning: ncfile can be updated but lat, lon data cannot updated. 
-        If you use netcdf file which is different lat lon data,
-        remake Class instance.
+    def get_parameter_xr(self, params: str, ncfile=None, isobaric_surface=None,
+                         masked=None, dtype=None, time_index=0) -> xr.DataArray:
+        """get_parameter_xr.
+        get_parameter() with lat, lon (and level) coordinates.
 
+        Args:
+            params (str): params
             ncfile:
             isobaric_surface:
+            masked:
+            dtype:
+            time_index:
+
+        Returns:
+            xr.DataArray:
+        """
+        data = self.get_parameter(params, ncfile=ncfile, isobaric_surface=isobaric_surface,
+                                  masked=masked, dtype=dtype, time_index=time_index)
+        lat, lon = self.get_lat_lon_xr()
+        dims = [self.variables_name_lat, self.variables_name_lon]
+        coords = {self.variables_name_lat: lat, self.variables_name_lon: lon}
+        if data.ndim == 3:
+            dims.insert(0, self.variables_name_level)
+            with self._open() as (dataset, lock), lock:
+                coords[self.variables_name_level] = np.array(
+                    dataset.variables[self.variables_name_level][:]
+                )
+        return xr.DataArray(data, dims=dims, coords=coords, name=params)
+
+    def get_valid_time(self, ncfile=None, time_index=0):
+        """get_valid_time.
+        decoded "time" of ncfile.
+
+        Args:
+            ncfile: None means self.ncfile.
+            time_index:
+        """
+        with self._open(ncfile) as (dataset, lock), lock:
+            return fetchtime.valid_time(dataset, time_index)
+
+    def get_valid_times(self, ncfile=None) -> list:
+        """get_valid_times.
+        all decoded "time" of multi-time ncfile.
+
+        Args:
+            ncfile: None means self.ncfile.
+        """
+        with self._open(ncfile) as (dataset, lock), lock:
+            return list(fetchtime.valid_time(dataset, slice(None)))
+
+    def _open(self, ncfile=None) -> contextlib.AbstractContextManager:
+        """_open.
+        netcdf file handle and ncpool.NETCDF_LOCK from the shared handle pool.
+        Hold the lock while calling netCDF4.
+
+        Args:
+            ncfile: None means self.ncfile.
+        """
+        return ncpool.open_dataset(self.ncfile if ncfile is None else ncfile)
+
+    def _area_index(self, dataset: Dataset) -> AreaIndex:
+        """_area_index.
+        index of the region in the dataset.
+        lat, lon names and orientation are detected per file, so ncfile
+        of another file family (e.g. apcp) can be read by the same instance.
+
+        Args:
+            dataset (Dataset): dataset
+
+        Returns:
+            AreaIndex:
+        """
+        ncfile = dataset.filepath()
+        area_index = self._area_index_dict.get(ncfile)
+        if area_index is None:
+            axis_names = get_axis_names(dataset)
+            area_index = self.region.index_slices(
+                dataset.variables[axis_names["Y"]][:],
+                dataset.variables[axis_names["X"]][:],
+            )
+            self._area_index_dict[ncfile] = area_index
+        return area_index
+
+    def _read(self, dataset: Dataset, lock, params: str, level_index,
+              masked: bool, dtype: Optional[np.dtype], time_index: int) -> np.ndarray:
+        """_read.
+        read the region (hyperslab) of params.
+        dimensionality is decided by the variable, not by the instance.
+        The field is memoized in fieldcache.CACHE (and diskcache.CACHE
+        if it is enabled) and returned as read-only array.
+
+        Args:
+            dataset (Dataset): dataset
+            lock: ncpool.NETCDF_LOCK
+            params (str): params
+            level_index: index or slice of level axis.
+            masked (bool): False means auto mask of netCDF4 is off and fill value is NaN.
+            dtype (Optional[np.dtype]): dtype
+            time_index (int): index of time axis.
 
         Returns:
             np.ndarray:
         """
+        with lock:
+            ncfile = dataset.filepath()
+        if isinstance(level_index, slice):
+            level_key = (level_index.start, level_index.stop, level_index.step)
+        else:
+            level_key = level_index
+        dtype_key = None if dtype is None else (masked, dtype.str)
+        disk_key = (ncfile, params, time_index, level_key, self.region, dtype_key)
+        cache_key = (ncpool.file_stamp(ncfile),) + disk_key
+        data = fieldcache.CACHE.get(cache_key)
+        if data is not None:
+            return data
+        data = diskcache.CACHE.load(ncfile, disk_key)
+        if data is not None:
+            return fieldcache.CACHE.put(cache_key, data)
 
-        # update ncfile.
-        if ncfile is not None and self.ncfile != ncfile:
-            self.ncfile = ncfile
-            self.dataset.close()
-            self.dataset = Dataset(self.ncfile)
+        with lock:
+            area_index = self._area_index(dataset)
+            variable = dataset.variables[params]
+            if variable.ndim == 4:
+                index_prefix = (time_index, level_index)
+            else:
+                index_prefix = (time_index,)
+            if masked:
+                data = np.array(area_index.read(variable, index_prefix), dtype=dtype)
+            else:
+                variable.set_auto_maskandscale(False)
+                try:
+                    data = area_index.read(variable, index_prefix)
+                finally:
+                    variable.set_auto_maskandscale(True)
+                attrs = {attr: variable.getncattr(attr) for attr in variable.ncattrs()}
+        if not masked:
+            data = _decode_raw(data, attrs, dtype)
+        diskcache.CACHE.save(ncfile, disk_key, data)
+        return fieldcache.CACHE.put(cache_key, data)
 
-        # select isobaric surface
+    def _read_options(self, masked: Optional[bool], dtype) -> Tuple[bool, Optional[np.dtype]]:
+        """_read_options.
+        fill masked, dtype by the instance default.
+        masked=False returns float32 by default.
+
+        Args:
+            masked (Optional[bool]): masked
+            dtype: dtype
+        """
+        masked = self.masked if masked is None else masked
+        dtype = self.dtype if dtype is None else dtype
+        if dtype is None and not masked:
+            dtype = np.float32
+        dtype = None if dtype is None else np.dtype(dtype)
+        if not masked and dtype.kind != "f":
+            raise ValueError("masked=False needs float dtype to set NaN.")
+        return masked, dtype
+
+    def get_parameter(self, params:str, ncfile=None, isobaric_surface=None,
+                      masked=None, dtype=None, time_index=0) -> np.ndarray:
+        """get_parameter.
+        read netcdf file to get physical parameter.
+        ncfile is used only in this call. It can be another file family
+        (e.g. apcp) if its lat lon grid is the same as self.ncfile.
+
+            ncfile:
+            isobaric_surface: level which is not in the file is interpolated
+                              in ln(p) (see get_parameters()).
+            masked: False means fill value is decoded to NaN without
+                    netCDF4 masked array (contiguous float32 by default).
+            dtype: dtype of returned array.
+            time_index: index of time axis (multi-time ncfile).
+
+        Returns:
+            np.ndarray: read-only (np.array(data) for a writable copy).
+        """
+        if isobaric_surface is not None and not self._has_level(isobaric_surface):
+            return self.get_parameters([params], levels=[isobaric_surface], ncfile=ncfile,
+                                       masked=masked, dtype=dtype, time_index=time_index)[params][0]
+        masked, dtype = self._read_options(masked, dtype)
         if isobaric_surface is not None:
-            data_raw = self.dataset.variables[params][0][self.isobaric_surface_dict[str(isobaric_surface)]]
-            self.data_dims = "2D"
+            level_index = self.isobaric_surface_dict[str(int(isobaric_surface))]
         else:
-            data_raw = self.dataset.variables[params][0]
-
-        # erase not near japan area data.
-        if  self.data_dims == "3D":
-            data = []
-            for data_2d in data_raw:
-                data.append(
-                        data_2d[np.where(self.jp_mask)].reshape(self.len_jp_lat, self.len_jp_lon)
-                )
-        elif self.data_dims == "2D":
-            data = data_raw[np.where(self.jp_mask)].reshape(self.len_jp_lat, self.len_jp_lon)
-        return np.array(data)
+            level_index = slice(None)
+
+        with self._open(ncfile) as (dataset, lock):
+            return self._read(dataset, lock, params, level_index, masked, dtype, time_index)
+
+    def _has_level(self, level) -> bool:
+        """_has_level.
+        level is one of isobaric surfaces in the file.
+
+        Args:
+            level: isobaric surface [hPa]
+        """
+        return float(level) == int(level) and str(int(level)) in self.isobaric_surface_dict
+
+    def _level_interpolator(self, levels: Sequence[float]) -> LogPressureInterpolator:
+        """_level_interpolator.
+        interpolator from the file levels which bracket levels.
+        It is shared by files which have the same levels.
+
+        Args:
+            levels (Sequence[float]): isobaric surfaces [hPa]
+        """
+        file_levels = tuple(float(level) for level in self.isobaric_surface_dict)
+        target_levels = tuple(float(level) for level in levels)
+        used_levels = log_pressure_interpolator(file_levels, target_levels).used_levels
+        return log_pressure_interpolator(used_levels, target_levels)
+
+    def _level_index(self, levels: Sequence[int]) -> Tuple[slice, List[int]]:
+        """_level_index.
+        coalesce isobaric surfaces to one strided slice on the level axis.
+
+        Args:
+            levels (Sequence[int]): levels
+
+        Returns:
+            Tuple[slice, List[int]]: level slice and position of each level in the read data.
+        """
+        index = [self.isobaric_surface_dict[str(int(level))] for level in levels]
+        index_sorted = sorted(set(index))
+        step = index_sorted[1] - index_sorted[0] if len(index_sorted) > 1 else 1
+        if any(j - i != step for i, j in zip(index_sorted[:-1], index_sorted[1:])):
+            step = 1
+        level_slice = slice(index_sorted[0], index_sorted[-1] + 1, step)
+        position = [(i - index_sorted[0]) // step for i in index]
+        return level_slice, position
+
+    def get_parameters(self, params: Sequence[str], levels=None, ncfile=None,
+                       masked=None, dtype=None, time_index=0) -> Dict[str, np.ndarray]:
+        """get_parameters.
+        read several physical parameters in one ordered pass over netcdf file.
+        Each 3D parameter is read by one strided slice of the levels.
+
+        Args:
+            params (Sequence[str]): params
+            levels: isobaric surfaces. None means all levels.
+                    Levels which are not in the file are interpolated linearly
+                    in ln(p) from the bracketing levels (masked values are NaN).
+            ncfile: ncfile used only in this call.
+            masked: see get_parameter().
+            dtype: see get_parameter().
+            time_index: see get_parameter().
+
+        Returns:
+            Dict[str, np.ndarray]: read-only (level, lat, lon) array (2D parameter: (lat, lon)).
+        """
+        if levels is not None and not all(self._has_level(level) for level in levels):
+            interpolator = self._level_interpolator(levels)
+            data_dict = self.get_parameters(
+                params, levels=[int(level) for level in interpolator.source_levels],
+                ncfile=ncfile, masked=masked, dtype=dtype, time_index=time_index)
+            return {param: _read_only(interpolator(data)) if data.ndim == 3 else data
+                    for param, data in data_dict.items()}
+
+        masked, dtype = self._read_options(masked, dtype)
+        if levels is not None:
+            level_slice, position = self._level_index(levels)
+        else:
+            level_slice, position = slice(None), None
+
+        with self._open(ncfile) as (dataset, lock):
+            # read in the order of netcdf variables.
+            with lock:
+                variables_order = list(dataset.variables)
+            params_order = sorted(set(params), key=variables_order.index)
+
+            def _read_param(param: str) -> np.ndarray:
+                data_param = self._read(dataset, lock, param, level_slice, masked, dtype,
+                                        time_index)
+                if data_param.ndim == 3 and position is not None \
+                        and position != list(range(len(data_param))):
+                    data_param = _read_only(data_param[position])
+                return data_param
+
+            data = [_read_param(param) for param in params_order]
+
+        data_dict = dict(zip(params_order, data))
+        return {param: data_dict[param] for param in params}
+
+    def iter_times(self, params: Sequence[str], levels=None, ncfile=None,
+                   **kwargs) -> Iterator[Tuple[object, Dict[str, np.ndarray]]]:
+        """iter_times.
+        stream multi-time ncfile (e.g. surface.nc, troposphere.nc which have
+        several forecast times) without splitting it by cdo.
+
+        Args:
+            params (Sequence[str]): params
+            levels: isobaric surfaces. None means all levels.
+            ncfile: None means self.ncfile.
+            kwargs: masked, dtype of get_parameters().
+
+        Returns:
+            Iterator[Tuple[object, Dict[str, np.ndarray]]]: (valid time, get_parameters() of the time)
+        """
+        for time_index, valid_time in enumerate(self.get_valid_times(ncfile)):
+            yield valid_time, self.get_parameters(params, levels=levels, ncfile=ncfile,
+                                                  time_index=time_index, **kwargs)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    """_read_only.
+    returned fields are read-only whether they are cached or not.
+
+    Args:
+        array (np.ndarray): array
+    """
+    array.setflags(write=False)
+    return array
+
+
+def get_axis_names(dataset: Dataset) -> Dict[str, str]:
+    """get_axis_names.
+    dimension name of each axis ("X", "Y", "Z").
+    Dimensions without coordinate variable or axis attribute are skipped.
+
+    Args:
+        dataset (Dataset): dataset
+
+    Returns:
+        Dict[str, str]:
+    """
+    axis_names = {}
+    for dim in dataset.dimensions:
+        if dim in dataset.variables:
+            axis = getattr(dataset.variables[dim], "axis", None)
+            if axis in ("X", "Y", "Z"):
+                axis_names[axis] = dim
+    return axis_names
+
+
+def _decode_raw(raw: np.ndarray, attrs: dict, dtype: np.dtype) -> np.ndarray:
+    """_decode_raw.
+    unpack raw netcdf data (scale_factor, add_offset) to dtype
+    and set NaN to fill value and missing value.
+
+    Args:
+        raw (np.ndarray): data read with set_auto_maskandscale(False)
+        attrs (dict): attributes of the variable
+        dtype (np.dtype): float dtype
+
+    Returns:
+        np.ndarray: contiguous array
+    """
+    fill_values = [attrs.get("_FillValue"), attrs.get("missing_value")]
+    if fill_values[0] is None and raw.dtype.itemsize > 1:
+        fill_values[0] = netCDF4.default_fillvals.get(raw.dtype.str[1:])
+    invalid = np.zeros(raw.shape, dtype=bool)
+    for fill_value in fill_values:
+        if fill_value is not None:
+            invalid |= np.isin(raw, np.atleast_1d(fill_value))
+
+    data = np.array(raw, dtype=dtype, order="C")
+    if "scale_factor" in attrs:
+        data *= dtype.type(attrs["scale_factor"])
+    if "add_offset" in attrs:
+        data += dtype.type(attrs["add_offset"])
+    data[invalid] = np.nan
+    return data
+
+
+def _open_dataset_xr(dataset: Dataset) -> xr.Dataset:
+    """_open_dataset_xr.
+    wrap netCDF4.Dataset to xarray without opening the file again.
+    Don't close it, the handle is owned by ncpool.
+
+    Args:
+        dataset (Dataset): dataset
+
+    Returns:
+        xr.Dataset:
+    """
+    return xr.open_dataset(xr.backends.NetCDF4DataStore(dataset))
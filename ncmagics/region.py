@@ -0,0 +1,217 @@
+# coding: utf-8
+"""
+Name: region.py
+
+lat lon bounding box used to cut netcdf data.
+Every field is normalized to one orientation:
+latitude is ascending (south to north) and longitude is 0-360 ascending.
+Index slices of recently used (region, grid) pairs are kept
+(max number is set_max_slices() or NCMAGICS_MAX_SLICES).
+
+example:
+    from ncmagics import region
+    jp_region = region.get_region("japan")
+    area_index = jp_region.index_slices(lat, lon)
+    data = area_index.read(variable, (0,))
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Tuple, Union
+import dataclasses
+import hashlib
+import os
+import threading
+import numpy as np
+
+
+class AreaIndex(NamedTuple):
+    """AreaIndex.
+    index of the region on the raw lat lon axis of a netcdf file.
+    lat_slice: slice of raw lat axis.
+    lat_reverse: raw lat axis is descending (north to south).
+    lon_slices: slices of raw lon axis. Concatenation of them is 0-360 ascending.
+                (more than one slice only if the region crosses the end of
+                 -180-180 longitude.)
+    """
+    lat_slice: slice
+    lat_reverse: bool
+    lon_slices: Tuple[slice, ...]
+
+    def read(self, variable, index_prefix: tuple):
+        """read.
+        read the region of netcdf variable in the normalized orientation.
+        latitude is reversed by view, not by copy.
+
+        Args:
+            variable: netCDF4.Variable
+            index_prefix (tuple): index of the axes before lat (time, level).
+        """
+        data = [variable[index_prefix + (self.lat_slice, lon_slice)]
+                for lon_slice in self.lon_slices]
+        if len(data) == 1:
+            data = data[0]
+        elif np.ma.isMaskedArray(data[0]):
+            data = np.ma.concatenate(data, axis=-1)
+        else:
+            data = np.concatenate(data, axis=-1)
+        return self.orient(data)
+
+    def orient(self, data):
+        """orient.
+        (..., lat, lon) array of the raw region to the normalized orientation (view).
+
+        Args:
+            data: array cut by this index.
+        """
+        return data[..., ::-1, :] if self.lat_reverse else data
+
+    def lat(self, lat: np.ndarray) -> np.ndarray:
+        """lat.
+        normalized latitude of the region.
+
+        Args:
+            lat (np.ndarray): raw lat axis
+        """
+        lat = np.asarray(lat)[self.lat_slice]
+        return lat[::-1] if self.lat_reverse else lat
+
+    def lon(self, lon: np.ndarray) -> np.ndarray:
+        """lon.
+        normalized (0-360) longitude of the region.
+
+        Args:
+            lon (np.ndarray): raw lon axis
+        """
+        lon = np.asarray(lon)
+        return np.mod(np.concatenate([lon[lon_slice] for lon_slice in self.lon_slices]), 360)
+
+
+@dataclasses.dataclass(frozen=True)
+class Region:
+    """Region.
+    bounding box [lat_min, lat_max] x [lon_min, lon_max] (degree).
+    """
+    lat_min: float
+    lat_max: float
+    lon_min: float
+    lon_max: float
+
+    def index_slices(self, lat: np.ndarray, lon: np.ndarray) -> AreaIndex:
+        """index_slices.
+        convert bounding box to index slices of the raw lat, lon axis.
+        lat can be ascending or descending, lon can be 0-360 or -180-180.
+        The result is cached per grid (least recently used are dropped).
+
+        Args:
+            lat (np.ndarray): lat
+            lon (np.ndarray): lon
+
+        Returns:
+            AreaIndex:
+        """
+        lat = np.asarray(lat)
+        lon = np.asarray(lon)
+        key = (self, _axis_hash(lat), _axis_hash(lon))
+        with _SLICE_CACHE_LOCK:
+            area_index = _SLICE_CACHE.get(key)
+            if area_index is not None:
+                _SLICE_CACHE.move_to_end(key)
+                return area_index
+
+        lat_slice = _mask_to_slice((lat >= self.lat_min) & (lat <= self.lat_max))
+
+        # raw index in the order of 0-360 ascending longitude.
+        lon_360 = np.mod(lon, 360)
+        lon_order = np.argsort(lon_360, kind="stable")
+        lon_in = (lon_360[lon_order] >= self.lon_min) & (lon_360[lon_order] <= self.lon_max)
+        lon_index = lon_order[_mask_to_slice(lon_in)]
+        lon_slices = tuple(
+            slice(int(run[0]), int(run[-1]) + 1)
+            for run in np.split(lon_index, np.flatnonzero(np.diff(lon_index) != 1) + 1)
+        )
+        area_index = AreaIndex(lat_slice, bool(lat[0] > lat[-1]), lon_slices)
+        with _SLICE_CACHE_LOCK:
+            _SLICE_CACHE[key] = area_index
+            _evict_slices()
+        return area_index
+
+
+PRESETS: Dict[str, Region] = {
+    "japan": Region(lat_min=20, lat_max=60, lon_min=110, lon_max=180),
+    "nh": Region(lat_min=0, lat_max=90, lon_min=0, lon_max=360),
+    "global": Region(lat_min=-90, lat_max=90, lon_min=0, lon_max=360),
+}
+
+_SLICE_CACHE: "OrderedDict[tuple, AreaIndex]" = OrderedDict()
+_SLICE_CACHE_LOCK = threading.Lock()
+_MAX_SLICES = int(os.environ.get("NCMAGICS_MAX_SLICES", 64))
+
+
+def _evict_slices():
+    """_evict_slices.
+    drop least recently used index slices. Call with _SLICE_CACHE_LOCK.
+    """
+    while len(_SLICE_CACHE) > _MAX_SLICES:
+        _SLICE_CACHE.popitem(last=False)
+
+
+def set_max_slices(max_slices: int):
+    """set_max_slices.
+    change max number of cached index slices.
+
+    Args:
+        max_slices (int): max_slices
+    """
+    global _MAX_SLICES
+    with _SLICE_CACHE_LOCK:
+        _MAX_SLICES = max_slices
+        _evict_slices()
+
+
+def get_region(region: Union[str, Region, tuple]) -> Region:
+    """get_region.
+
+    Args:
+        region (Union[str, Region, tuple]): preset name ("japan", "nh", "global"),
+            Region or (lat_min, lat_max, lon_min, lon_max).
+
+    Returns:
+        Region:
+    """
+    if isinstance(region, Region):
+        return region
+    if isinstance(region, str):
+        try:
+            return PRESETS[region]
+        except KeyError:
+            raise ValueError(f"region preset is not valid: {region}") from None
+    return Region(*region)
+
+
+def _axis_hash(axis: np.ndarray) -> str:
+    """_axis_hash.
+
+    Args:
+        axis (np.ndarray): axis
+    """
+    return hashlib.md5(np.ascontiguousarray(axis, dtype=np.float64).tobytes()).hexdigest()
+
+
+def _mask_to_slice(mask: np.ndarray) -> slice:
+    """_mask_to_slice.
+    convert 1D bool mask on the monotonic lat or lon axis to index slice.
+
+    Args:
+        mask (np.ndarray): mask
+
+    Returns:
+        slice:
+    """
+    index = np.flatnonzero(mask)
+    if len(index) == 0:
+        raise ValueError("no grid point in the region.")
+    if index[-1] - index[0] + 1 != len(index):
+        raise ValueError("lat or lon axis is not monotonic.")
+    return slice(int(index[0]), int(index[-1]) + 1)
@@ -0,0 +1,259 @@
+# coding: utf-8
+"""
+Name: thermo.py
+
+Vectorized thermodynamic kernels on plain numpy arrays (no pint units).
+Every function broadcasts its arguments, so any grid shape
+((lat, lon), (time, lat, lon), (level, lat, lon), ...) can be given.
+Units are SI: pressure [Pa], temperature [K], mixing ratio [kg/kg],
+relative humidity [0-1].
+The result is written to out= (preallocated array of the broadcast shape)
+if it is given. Formulas are the same as MetPy 1.1 (Bolton 1980).
+Masked arrays are not supported (fill masked values with NaN).
+
+example:
+    from ncmagics import thermo
+    theta = thermo.potential_temperature(85000, temp_k)
+    tw = thermo.wet_bulb_temperature(85000, temp_k, dewpoint_k, out=temp_k)
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import numpy as np
+
+RD = 287.04749097718457  # [J/kg/K] (same as metpy.constants.Rd)
+CP_D = 1004.6662184201462  # [J/kg/K] (same as metpy.constants.Cp_d)
+KAPPA = RD / CP_D
+EPSILON = 0.6219569100577033  # Mw / Md (same as metpy.constants.epsilon)
+P0 = 100000.  # [Pa] reference pressure of potential temperature
+SAT_PRESSURE_0C = 611.2  # [Pa]
+ZERO_DEGC = 273.15  # [K]
+
+
+def _buffer(out, *arrays) -> np.ndarray:
+    """_buffer.
+    out or new array of the broadcast shape of arrays.
+    float32 input gives float32 result.
+
+    Args:
+        out: out
+        arrays: input arrays or scalars
+    """
+    if out is not None:
+        return out
+    return np.empty(np.broadcast(*arrays).shape, dtype=np.result_type(np.float32, *arrays))
+
+
+def potential_temperature(pressure, temperature, out=None) -> np.ndarray:
+    """potential_temperature.
+    theta = T * (P0/p)^kappa [K]
+
+    Args:
+        pressure: pressure [Pa]
+        temperature: temperature [K]
+        out: out
+    """
+    out = _buffer(out, pressure, temperature)
+    exner = np.power(P0 / np.asarray(pressure, dtype=out.dtype), KAPPA)
+    return np.multiply(temperature, exner, out=out)
+
+
+def saturation_vapor_pressure(temperature, out=None) -> np.ndarray:
+    """saturation_vapor_pressure.
+    Bolton (1980) over liquid water [Pa].
+
+    Args:
+        temperature: temperature [K]
+        out: out
+    """
+    out = _buffer(out, temperature)
+    np.subtract(temperature, ZERO_DEGC, out=out)
+    denominator = out + 243.5
+    np.multiply(out, 17.67, out=out)
+    np.divide(out, denominator, out=out)
+    np.exp(out, out=out)
+    return np.multiply(out, SAT_PRESSURE_0C, out=out)
+
+
+def mixing_ratio(partial_pressure, total_pressure, out=None) -> np.ndarray:
+    """mixing_ratio.
+    w = epsilon * e / (p - e) [kg/kg]
+
+    Args:
+        partial_pressure: vapor pressure [Pa]
+        total_pressure: pressure [Pa]
+        out: out
+    """
+    out = _buffer(out, partial_pressure, total_pressure)
+    denominator = np.subtract(total_pressure, partial_pressure)
+    np.multiply(partial_pressure, EPSILON, out=out)
+    return np.divide(out, denominator, out=out)
+
+
+def saturation_mixing_ratio(pressure, temperature, out=None) -> np.ndarray:
+    """saturation_mixing_ratio.
+    [kg/kg]
+
+    Args:
+        pressure: pressure [Pa]
+        temperature: temperature [K]
+        out: out
+    """
+    out = _buffer(out, pressure, temperature)
+    saturation_vapor_pressure(temperature, out=out)
+    return mixing_ratio(out, pressure, out=out)
+
+
+def mixing_ratio_from_relative_humidity(pressure, temperature, relative_humidity,
+                                        out=None) -> np.ndarray:
+    """mixing_ratio_from_relative_humidity.
+    w = epsilon * w_s * rh / (epsilon + w_s * (1 - rh)) [kg/kg]
+
+    Args:
+        pressure: pressure [Pa]
+        temperature: temperature [K]
+        relative_humidity: relative humidity [0-1]
+        out: out
+    """
+    out = _buffer(out, pressure, temperature, relative_humidity)
+    saturation_mixing_ratio(pressure, temperature, out=out)
+    denominator = out * np.subtract(1, relative_humidity)
+    denominator += EPSILON
+    np.multiply(out, relative_humidity, out=out)
+    np.multiply(out, EPSILON, out=out)
+    return np.divide(out, denominator, out=out)
+
+
+def specific_humidity(mixing_ratio_, out=None) -> np.ndarray:
+    """specific_humidity.
+    q = w / (1 + w) [kg/kg]
+
+    Args:
+        mixing_ratio_: mixing ratio [kg/kg]
+        out: out
+    """
+    out = _buffer(out, mixing_ratio_)
+    denominator = np.add(mixing_ratio_, 1)
+    return np.divide(mixing_ratio_, denominator, out=out)
+
+
+def vapor_pressure(pressure, mixing_ratio_, out=None) -> np.ndarray:
+    """vapor_pressure.
+    e = p * w / (epsilon + w) (same unit as pressure)
+
+    Args:
+        pressure: pressure
+        mixing_ratio_: mixing ratio [kg/kg]
+        out: out
+    """
+    out = _buffer(out, pressure, mixing_ratio_)
+    denominator = np.add(mixing_ratio_, EPSILON)
+    np.multiply(pressure, mixing_ratio_, out=out)
+    return np.divide(out, denominator, out=out)
+
+
+def dewpoint(vapor_pressure_, out=None) -> np.ndarray:
+    """dewpoint.
+    inverse of saturation_vapor_pressure() [K].
+
+    Args:
+        vapor_pressure_: vapor pressure [Pa]
+        out: out
+    """
+    out = _buffer(out, vapor_pressure_)
+    np.divide(vapor_pressure_, SAT_PRESSURE_0C, out=out)
+    np.log(out, out=out)
+    denominator = np.subtract(17.67, out)
+    np.multiply(out, 243.5, out=out)
+    np.divide(out, denominator, out=out)
+    return np.add(out, ZERO_DEGC, out=out)
+
+
+def equivalent_potential_temperature(pressure, temperature, dewpoint_, out=None) -> np.ndarray:
+    """equivalent_potential_temperature.
+    Bolton (1980) eq. 39 (same formula as metpy.calc.equivalent_potential_temperature) [K].
+
+    Args:
+        pressure: pressure [Pa]
+        temperature: temperature [K]
+        dewpoint_: dewpoint [K]
+        out: out
+    """
+    out = _buffer(out, pressure, temperature, dewpoint_)
+    e = saturation_vapor_pressure(dewpoint_)
+    r = mixing_ratio(e, pressure)
+    temp_lcl = 56 + 1 / (1 / (dewpoint_ - 56) + np.log(temperature / dewpoint_) / 800)
+    theta_l = (temperature * (P0 / (pressure - e)) ** KAPPA
+               * (temperature / temp_lcl) ** (0.28 * r))
+    return np.multiply(theta_l, np.exp(r * (1 + 0.448 * r) * (3036 / temp_lcl - 1.78)), out=out)
+
+
+def saturation_equivalent_potential_temperature(pressure, temperature, out=None) -> np.ndarray:
+    """saturation_equivalent_potential_temperature.
+    equivalent potential temperature of saturated air (dewpoint = temperature) [K].
+
+    Args:
+        pressure: pressure [Pa]
+        temperature: temperature [K]
+        out: out
+    """
+    out = _buffer(out, pressure, temperature)
+    return np.exp(_log_theta_es(pressure, temperature)[0], out=out)
+
+
+def _log_theta_es(pressure, temperature):
+    """_log_theta_es.
+    log of saturation equivalent potential temperature and
+    its derivative by temperature.
+
+    Args:
+        pressure: pressure [Pa]
+        temperature: temperature [K]
+
+    Returns:
+        (log theta_es, d(log theta_es)/dT)
+    """
+    temp_c = temperature - ZERO_DEGC
+    e_s = saturation_vapor_pressure(temperature)
+    de_s = e_s * 17.67 * 243.5 / (temp_c + 243.5) ** 2
+    dry_pressure = pressure - e_s
+    r_s = EPSILON * e_s / dry_pressure
+    dr_s = EPSILON * pressure * de_s / dry_pressure ** 2
+    latent = 3036 / temperature - 1.78
+
+    log_theta = (np.log(temperature) + KAPPA * np.log(P0 / dry_pressure)
+                 + r_s * (1 + 0.448 * r_s) * latent)
+    d_log_theta = (1 / temperature + KAPPA * de_s / dry_pressure
+                   + (1 + 0.896 * r_s) * dr_s * latent
+                   - r_s * (1 + 0.448 * r_s) * 3036 / temperature ** 2)
+    return log_theta, d_log_theta
+
+
+def wet_bulb_temperature(pressure, temperature, dewpoint_, iterations=4, out=None) -> np.ndarray:
+    """wet_bulb_temperature.
+    pseudo wet bulb temperature [K]. Solve
+    theta_es(p, Tw) = theta_e(p, T, Td)
+    by fixed number of Newton iterations on the whole array
+    (no loop over grid points).
+    metpy.calc.wet_bulb_temperature follows its numerically integrated moist
+    adiabat from the LCL instead, so the difference grows with the dewpoint
+    depression: < 0.05 K (T - Td <= 2 K), < 0.15 K (<= 10 K), < 0.3 K (<= 30 K)
+    (tests/test_thermo.py).
+
+    Args:
+        pressure: pressure [Pa]
+        temperature: temperature [K]
+        dewpoint_: dewpoint [K]
+        iterations: number of Newton iterations.
+        out: out
+    """
+    out = _buffer(out, pressure, temperature, dewpoint_)
+    log_theta_e = np.log(equivalent_potential_temperature(pressure, temperature, dewpoint_))
+    # one-third rule as the first guess.
+    np.subtract(temperature, (temperature - dewpoint_) / 3, out=out)
+    for _ in range(iterations):
+        log_theta, d_log_theta = _log_theta_es(pressure, out)
+        log_theta -= log_theta_e
+        log_theta /= d_log_theta
+        np.subtract(out, log_theta, out=out)
+    return out
@@ -0,0 +1,182 @@
+# coding: utf-8
+"""
+Name: vinterp.py
+
+vertical interpolation of (level, lat, lon) fields.
+Bracketing level indices and linear weights are found once and
+applied to any number of fields.
+
+example:
+    from ncmagics.vinterp import IsentropicInterpolator
+    ptl_temp = meteo_tool.cal_potential_temperature(temp_k)
+    interpolator = IsentropicInterpolator(ptl_temp, [305, 310, 315])
+    ise_u_wind = interpolator(u_wind)  # (3, lat, lon)
+
+    from ncmagics.vinterp import log_pressure_interpolator
+    interpolator = log_pressure_interpolator((1000, 850, 700), (925, 600))
+    temp_k_925_600 = interpolator(temp_k)  # (2, lat, lon)
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from typing import Sequence, Tuple, Union
+import functools
+import numpy as np
+from ncmagics.arrayutil import plain
+
+
+class IsentropicInterpolator:
+    """IsentropicInterpolator.
+    linear interpolation to isentropic surfaces (same result as
+    MeteoTools.isentropic_surface_value() by metpy.interpolate.interpolate_to_isosurface()).
+    The highest level where theta crosses the target is used.
+    If theta of the whole column is >= target, the value of the lowest level is used,
+    and if theta of the whole column is <= target, the value of the highest level is used.
+    """
+
+    def __init__(self, ptl_temp: np.ndarray, isentropic: Union[float, Sequence[float]],
+                 bottom_first=True):
+        """__init__.
+
+        Args:
+            ptl_temp (np.ndarray): potential temperature (level, ...) e.g. (level, lat, lon)
+            isentropic (Union[float, Sequence[float]]): target potential temperature [K].
+            bottom_first: level 0 is the lowest level (highest pressure).
+                (cal_potential_temperature() returns such order.)
+        """
+        ptl_temp = plain(ptl_temp)
+        if not bottom_first:
+            ptl_temp = ptl_temp[::-1]
+        self.bottom_first = bottom_first
+        self.scalar = np.ndim(isentropic) == 0
+        self.isentropic = np.atleast_1d(np.asarray(isentropic, dtype=np.float64))
+        self.shape = ptl_temp.shape[1:]
+
+        n_level = ptl_temp.shape[0]
+        theta = ptl_temp.reshape(n_level, -1)
+        target = self.isentropic[:, np.newaxis, np.newaxis]
+
+        # (target, level - 1, point): theta <= target changes between level k and k+1.
+        is_below = theta[np.newaxis] <= target
+        switch = is_below[:, 1:] != is_below[:, :-1]
+        has_switch = switch.any(axis=1)
+        # first switch searched from the top.
+        lower = (n_level - 2) - switch[:, ::-1].argmax(axis=1)
+        lower[~has_switch] = 0
+
+        point = np.arange(theta.shape[1])
+        theta_lower = theta[lower, point]
+        theta_upper = theta[lower + 1, point]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = (target[:, :, 0] - theta_lower) / (theta_upper - theta_lower)
+
+        # no crossing.
+        weight[~has_switch] = np.nan
+        all_above = (theta.min(axis=0) >= target[:, :, 0])
+        lower[all_above] = 0
+        weight[all_above] = 0.
+        all_below = (theta.max(axis=0) <= target[:, :, 0])
+        lower[all_below] = n_level - 2
+        weight[all_below] = 1.
+
+        n_point = theta.shape[1]
+        self.n_level = n_level
+        self.flat_lower = lower * n_point + point
+        self.flat_upper = self.flat_lower + n_point
+        self.weight = weight
+
+    def __call__(self, phys_val: np.ndarray) -> np.ndarray:
+        """__call__.
+        interpolate phys_val (same shape and level order as ptl_temp).
+
+        Args:
+            phys_val (np.ndarray): phys_val
+
+        Returns:
+            np.ndarray: (isentropic, ...) or (...) if isentropic is a scalar.
+        """
+        phys_val = plain(phys_val)
+        if not self.bottom_first:
+            phys_val = phys_val[::-1]
+        flat = phys_val.reshape(-1)
+        value = (1 - self.weight) * flat[self.flat_lower] + self.weight * flat[self.flat_upper]
+        value = value.reshape((len(self.isentropic),) + self.shape)
+        return value[0] if self.scalar else value
+
+
+class LogPressureInterpolator:
+    """LogPressureInterpolator.
+    linear interpolation in ln(p) from source levels to target levels.
+    Target levels which are in source levels are copied (no rounding).
+    Use log_pressure_interpolator() to share one instance per (source, target).
+    """
+
+    def __init__(self, source_levels: Sequence[float], target_levels: Sequence[float]):
+        """__init__.
+
+        Args:
+            source_levels (Sequence[float]): levels of the level axis of fields (any order).
+            target_levels (Sequence[float]): levels to interpolate to (same unit as source_levels).
+                                             They must be in the range of source_levels.
+        """
+        source = np.asarray(source_levels, dtype=np.float64)
+        target = np.asarray(target_levels, dtype=np.float64)
+        outside = (target < source.min()) | (target > source.max())
+        if outside.any():
+            raise ValueError(
+                f"levels {target[outside].tolist()} are outside of {source.min()}-{source.max()}.")
+
+        order = np.argsort(source)
+        ln_source = np.log(source[order])
+        ln_target = np.log(target)
+        lower = np.searchsorted(ln_source, ln_target, side="right") - 1
+        upper = np.minimum(lower + 1, len(source) - 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = (ln_target - ln_source[lower]) / (ln_source[upper] - ln_source[lower])
+        weight[upper == lower] = 0.
+
+        self.source_levels = tuple(source.tolist())
+        self.target_levels = tuple(target.tolist())
+        self.lower = order[lower]
+        self.upper = order[upper]
+        self.weight = weight[:, np.newaxis, np.newaxis]
+
+    @property
+    def used_levels(self) -> Tuple[float, ...]:
+        """used_levels.
+        source levels needed for the interpolation (in source order).
+        """
+        interpolated = self.weight[:, 0, 0] != 0
+        used = sorted(set(self.lower.tolist()) | set(self.upper[interpolated].tolist()))
+        return tuple(self.source_levels[index] for index in used)
+
+    def __call__(self, phys_val: np.ndarray) -> np.ndarray:
+        """__call__.
+
+        Args:
+            phys_val (np.ndarray): (..., level, lat, lon) of source levels.
+
+        Returns:
+            np.ndarray: (..., target, lat, lon)
+        """
+        phys_val = plain(phys_val)
+        weight = self.weight.astype(np.result_type(phys_val, np.float32), copy=False)
+        lower = np.take(phys_val, self.lower, axis=-3)
+        upper = np.take(phys_val, self.upper, axis=-3)
+        return np.where(weight == 0, lower, lower + weight * (upper - lower))
+
+
+@functools.lru_cache(maxsize=None)
+def log_pressure_interpolator(source_levels: Tuple[float, ...],
+                              target_levels: Tuple[float, ...]) -> LogPressureInterpolator:
+    """log_pressure_interpolator.
+    LogPressureInterpolator shared by files which have the same levels.
+
+    Args:
+        source_levels (Tuple[float, ...]): source_levels
+        target_levels (Tuple[float, ...]): target_levels
+
+    Returns:
+        LogPressureInterpolator:
+    """
+    return LogPressureInterpolator(source_levels, target_levels)
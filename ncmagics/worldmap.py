@@ -18,6 +18,7 @@ import numpy as np
 import cartopy.crs as ccrs
 import cartopy.feature as cfea
 from cartopy.mpl.ticker import LatitudeFormatter, LongitudeFormatter
+from ncmagics.grid import Grid
 
 
 class WorldMap:
@@ -25,12 +26,15 @@ class WorldMap:
     Make map near japan.
     """
 
-    def __init__(self, color=False):
+    def __init__(self, color=False, grid: Grid = None):
         """__init__.
 
         Args:
             color:
+            grid (Grid): grid of the plotted fields (e.g. MeteoTools.get_grid()).
+                         None means it is made from x, y of the first plot.
         """
+        self.grid = grid
         self.fig = plt.figure(figsize=(36, 24), facecolor='w')
         self.ax = self.fig.add_subplot(1, 1, 1,
                                        projection=ccrs.PlateCarree(central_longitude=0.0))
@@ -81,6 +85,22 @@ class WorldMap:
 
         self.plt_cnt = 0
 
+    def _mesh(self, x, y):
+        """_mesh.
+        2D x, y of the grid of this map. The grid is made again only if
+        x, y are not its lon, lat (Grid.from_axes() hashes x, y on every call).
+
+        Args:
+            x: lon
+            y: lat
+        """
+        grid = self.grid
+        if (grid is None or grid.shape != (len(y), len(x))
+                or grid.lon[0] != float(x[0]) or grid.lon[-1] != float(x[-1])
+                or grid.lat[0] != float(y[0]) or grid.lat[-1] != float(y[-1])):
+            grid = self.grid = Grid.from_axes(y, x)
+        return grid.mesh
+
     def plot_data(self, x, y, label: str, line=True):
         """plot_data.
         plot location data. plot type is dot.
@@ -148,7 +168,7 @@ class WorldMap:
             y:
             z:
         """
-        X, Y = np.meshgrid(x, y)
+        X, Y = self._mesh(x, y)
         if contour_type == "pressure":
             contour = self.ax.contour(X, Y, z, colors="black",
                                       levels=list(range(900, 1040, 4)),
@@ -169,7 +189,7 @@ class WorldMap:
             line_value (Union[int, float]): line_value
             color:
         """
-        X, Y = np.meshgrid(x, y)
+        X, Y = self._mesh(x, y)
         contour = self.ax.contour(X, Y, z,
                                   colors=color,
                                   levels=[line_value],
@@ -225,7 +245,7 @@ class WorldMap:
 
         # initial setting of shade
         plt.rcParams['font.size'] = 36
-        X, Y = np.meshgrid(x, y)
+        X, Y = self._mesh(x, y)
         if   color_map_type == "diff":
             color_map = "RdBu_r"
         elif color_map_type == "temperature":
@@ -281,7 +301,7 @@ class WorldMap:
 
         u_skipped = self._skip_value(u, len(x), len(y), vector_interval)
         v_skipped = self._skip_value(v, len(x), len(y), vector_interval)
-        x_2d, y_2d = np.meshgrid(x, y)
+        x_2d, y_2d = self._mesh(x, y)
         x_2d_skipped = self._skip_value(x_2d, len(x), len(y), vector_interval)
         y_2d_skipped = self._skip_value(y_2d, len(x), len(y), vector_interval)
         if mode == "wind":
@@ -300,7 +320,7 @@ class WorldMap:
             y:
             z:
         """
-        x_2d, y_2d = np.meshgrid(x, y)
+        x_2d, y_2d = self._mesh(x, y)
         self.ax.contourf(x_2d, y_2d, z, hatches='.',cmap='gray', alpha=0.3)
 
     def hatch_plot_2(self, x, y, z):
@@ -311,7 +331,7 @@ class WorldMap:
             y:
             z:
         """
-        x_2d, y_2d = np.meshgrid(x, y)
+        x_2d, y_2d = self._mesh(x, y)
         self.ax.contourf(x_2d, y_2d, z, hatches='*',cmap='pink', alpha=0.8)
 
     def save_fig(self, outname: str, title=None):
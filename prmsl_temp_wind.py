@@ -63,7 +63,7 @@ def main():
     rh = cal_phys.get_parameter("r2")
 
     # plot
-    jp_map = japanmap.JpMap()
+    jp_map = japanmap.JpMap(grid=cal_phys.get_grid())
     jp_map.contour_plot(lon, lat, prmsl, contour_type="pressure")
     #jp_map.shade_plot(lon, lat, surface_temp_c,
     #    label="2m temperature ($^\circ$C)",
@@ -13,6 +13,7 @@ import argparse
 import numpy as np
 from metpy.units import units
 from ncmagics import fetchtime, japanmap_nh, meteotool_nh
+from ncmagics.vinterp import IsentropicInterpolator
 
 
 def parse_args() -> dict:
@@ -31,11 +32,12 @@ def parse_args() -> dict:
     return args
 
 
-def cal_d_thita_dp(meteo_tool: meteotool_nh.MeteoTools, ptl_temp: np.ndarray, height_gpm: np.ndarray, isentropic: int) -> np.ndarray:
-
-    ise_height_gpm_lower = meteo_tool.isentropic_surface_value(ptl_temp, height_gpm, isentropic-5)
+def cal_d_thita_dp(meteo_tool: meteotool_nh.MeteoTools, interpolator: IsentropicInterpolator, height_gpm: np.ndarray) -> np.ndarray:
+    """cal_d_thita_dp.
+    interpolator is made for [isentropic-5, isentropic, isentropic+5].
+    """
+    ise_height_gpm_lower, _, ise_height_gpm_upper = interpolator(height_gpm)
     ise_pressure_lower = meteo_tool.gph_to_pressure(ise_height_gpm_lower)
-    ise_height_gpm_upper = meteo_tool.isentropic_surface_value(ptl_temp, height_gpm, isentropic+5)
     ise_pressure_upper = meteo_tool.gph_to_pressure(ise_height_gpm_upper)
     return (ise_pressure_upper - ise_pressure_lower) / (10 * units.kelvin)
 
@@ -81,17 +83,18 @@ def main():
 
     # convert to isentropic value.
     ptl_temp = meteo_tool.cal_potential_temperature(temp_k)
-    ise_u_wind = meteo_tool.isentropic_surface_value(ptl_temp, u_wind, isentropic)
-    ise_v_wind = meteo_tool.isentropic_surface_value(ptl_temp, v_wind, isentropic)
+    interpolator = meteo_tool.isentropic_interpolator(
+            ptl_temp, [isentropic - 5, isentropic, isentropic + 5])
+    ise_u_wind = interpolator(u_wind)[1]
+    ise_v_wind = interpolator(v_wind)[1]
 
     # calcurate potential vorticity.
-    d_thita_dp = cal_d_thita_dp(meteo_tool, ptl_temp,
-                                height_gpm, isentropic)
+    d_thita_dp = cal_d_thita_dp(meteo_tool, interpolator, height_gpm)
     ise_ptl_vorticity = meteo_tool.cal_ptl_vorticity(
             ise_u_wind, ise_v_wind, d_thita_dp, lat, lon)
 
     # plot data
-    nh_map = japanmap_nh.NhMap()
+    nh_map = japanmap_nh.NhMap(grid=meteo_tool.get_grid())
     #nh_map.contour_plot(lon, lat, surface_pressure, contour_type="pressure")
     nh_map.shade_plot(lon, lat, ise_ptl_vorticity,
             label="potential vorticity (PVU)",
@@ -0,0 +1,57 @@
+# coding: utf-8
+"""
+Name: bench_parcel.py
+
+time of ncmagics.parcel.cape_cin on a (level, lat, lon) grid and of
+metpy.calc cape_cin per column. (not collected by pytest)
+
+example:
+    PYTHONPATH=. python tests/bench_parcel.py
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import time
+import warnings
+import numpy as np
+import metpy.calc as mpcalc
+from metpy.units import units
+from ncmagics import parcel
+from test_parcel import LEVELS, _columns
+
+SHAPE = (81, 141)
+METPY_COLUMNS = 40
+
+
+def bench_cape_cin():
+    n_column = SHAPE[0] * SHAPE[1]
+    temperature, dewpoint = _columns(n_column)
+    temperature = temperature.reshape((len(LEVELS),) + SHAPE)
+    dewpoint = dewpoint.reshape((len(LEVELS),) + SHAPE)
+
+    start = time.perf_counter()
+    parcel.moist_adiabat()
+    table = time.perf_counter() - start
+    for parcel_type, metpy_cape_cin in (("surface", mpcalc.surface_based_cape_cin),
+                                        ("most_unstable", mpcalc.most_unstable_cape_cin)):
+        start = time.perf_counter()
+        parcel.cape_cin(LEVELS * 100, temperature, dewpoint, parcel=parcel_type,
+                        virtual_temperature=True)
+        ours = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for index in range(METPY_COLUMNS):
+                column = np.unravel_index(index, SHAPE)
+                metpy_cape_cin(LEVELS * units.hPa,
+                               temperature[(slice(None),) + column] * units.K,
+                               dewpoint[(slice(None),) + column] * units.K)
+        theirs = (time.perf_counter() - start) * n_column / METPY_COLUMNS
+        print(f"cape_cin {parcel_type} {(len(LEVELS),) + SHAPE}: parcel {ours:.2f} s "
+              f"(+ table {table:.2f} s once), metpy {theirs:.0f} s "
+              f"(extrapolated from {METPY_COLUMNS} columns), x{theirs / ours:.0f}")
+
+
+if __name__ == "__main__":
+    bench_cape_cin()
@@ -0,0 +1,68 @@
+# coding: utf-8
+"""
+Name: bench_thermo.py
+
+time of ncmagics.thermo kernels and metpy.calc on a (level, lat, lon) grid.
+(not collected by pytest)
+
+example:
+    PYTHONPATH=. python tests/bench_thermo.py
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import time
+import warnings
+import numpy as np
+import metpy.calc as mpcalc
+from metpy.units import units
+from ncmagics import thermo
+
+SHAPE = (10, 81, 141)
+METPY_POINTS = 500  # metpy.calc.wet_bulb_temperature loops over points.
+
+
+def _grid():
+    """_grid.
+    random (pressure, temperature, dewpoint) of SHAPE.
+    """
+    rng = np.random.default_rng(0)
+    pressure = np.linspace(100000, 30000, SHAPE[0])[:, np.newaxis, np.newaxis]
+    pressure = np.broadcast_to(pressure, SHAPE).copy()
+    temperature = rng.uniform(243.15, 308.15, SHAPE)
+    dewpoint = temperature - rng.uniform(0, 20, SHAPE)
+    return pressure, temperature, dewpoint
+
+
+def _timeit(func, repeat=3) -> float:
+    """_timeit.
+    best time of repeat calls [s].
+    """
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_wet_bulb_temperature():
+    pressure, temperature, dewpoint = _grid()
+    points = temperature.size
+    ours = _timeit(lambda: thermo.wet_bulb_temperature(pressure, temperature, dewpoint))
+
+    sub = slice(0, METPY_POINTS)
+    p_m = pressure.ravel()[sub] * units.Pa
+    t_m = temperature.ravel()[sub] * units.K
+    td_m = dewpoint.ravel()[sub] * units.K
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        theirs = _timeit(lambda: mpcalc.wet_bulb_temperature(p_m, t_m, td_m), repeat=1)
+    theirs *= points / METPY_POINTS
+    print(f"wet_bulb_temperature {SHAPE}: thermo {ours:.3f} s, "
+          f"metpy {theirs:.1f} s (extrapolated from {METPY_POINTS} points), "
+          f"x{theirs / ours:.0f}")
+
+
+if __name__ == "__main__":
+    bench_wet_bulb_temperature()
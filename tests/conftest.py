@@ -0,0 +1,71 @@
+# coding: utf-8
+"""
+Name: conftest.py
+
+shared fixtures of the tests.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import os
+import sys
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+LEVELS = (1000, 925, 850, 700, 500, 300)
+
+
+def write_ncfile(path: str, seed=0, levels=LEVELS, n_time=1, lat=None, lon=None,
+                 temperature=None, fields=None):
+    """write_ncfile.
+    small troposphere-like ncfile (time, lev, lat, lon) which covers japan region.
+
+    Args:
+        path (str): path
+        seed: seed of the random field
+        levels: isobaric surfaces [hPa]
+        n_time: number of times
+        lat: lat axis. None means 60 to 20 (descending).
+        lon: lon axis. None means 110 to 180.
+        temperature: (lev, lat, lon) "t" of the first time. None means random field.
+        fields: {name: (lev, lat, lon)} other variables (e.g. "u", "v", "gh") of every time.
+    """
+    rng = np.random.default_rng(seed)
+    lat = np.arange(60, 19.9, -1.25) if lat is None else np.asarray(lat)
+    lon = np.arange(110, 180.1, 1.25) if lon is None else np.asarray(lon)
+    with Dataset(path, "w") as dataset:
+        dataset.createDimension("time", None)
+        dataset.createDimension("lev", len(levels))
+        dataset.createDimension("lat", len(lat))
+        dataset.createDimension("lon", len(lon))
+        for name, axis, values in (("lev", "Z", levels), ("lat", "Y", lat), ("lon", "X", lon)):
+            variable = dataset.createVariable(name, "f8", (name,))
+            variable.axis = axis
+            variable[:] = values
+        time = dataset.createVariable("time", "f8", ("time",))
+        time.units = "hours since 2021-01-10 00:00:00"
+        time.axis = "T"
+        time[:] = np.arange(n_time) * 6
+        pressure = np.array(levels, dtype=np.float64)[:, np.newaxis, np.newaxis]
+        if temperature is None:
+            temperature = (288 * (pressure / 1000) ** 0.19
+                           + rng.normal(0, 1, (len(levels), len(lat), len(lon))))
+        variable = dataset.createVariable("t", "f4", ("time", "lev", "lat", "lon"), zlib=True)
+        for time_index in range(n_time):
+            variable[time_index] = temperature + time_index
+        for name, values in (fields or {}).items():
+            variable = dataset.createVariable(name, "f4", ("time", "lev", "lat", "lon"), zlib=True)
+            for time_index in range(n_time):
+                variable[time_index] = values
+    return path
+
+
+@pytest.fixture
+def ncfiles(tmp_path):
+    """ncfiles.
+    12 small ncfiles of different fields.
+    """
+    return [write_ncfile(str(tmp_path / f"troposphere-{i:02d}.nc"), seed=i) for i in range(12)]
@@ -0,0 +1,58 @@
+# coding: utf-8
+"""
+Name: test_column.py
+
+vertical integration against metpy.calc.precipitable_water.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import warnings
+import numpy as np
+import pytest
+import metpy.calc as mpcalc
+from metpy.units import units
+from ncmagics import column, thermo
+
+PRESSURE = np.array([1000, 925, 850, 700, 500, 300], dtype=np.float64) * 100
+
+
+def _column(surface_temperature: float, relative_humidity: float):
+    """_column.
+    mixing ratio [kg/kg] and dewpoint [K] of troposphere-like column.
+    """
+    temperature = surface_temperature * (PRESSURE / 100000) ** 0.19
+    mixing_ratio = thermo.mixing_ratio_from_relative_humidity(
+        PRESSURE, temperature, relative_humidity)
+    dewpoint = thermo.dewpoint(thermo.vapor_pressure(PRESSURE, mixing_ratio))
+    return mixing_ratio, dewpoint
+
+
+def _metpy_precipitable_water(dewpoint: np.ndarray) -> float:
+    """_metpy_precipitable_water.
+    [mm] and mixing ratio which metpy integrates.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        mixing_ratio = mpcalc.saturation_mixing_ratio(
+            PRESSURE * units.Pa, dewpoint * units.K).m_as(units.dimensionless)
+        return (mpcalc.precipitable_water(PRESSURE * units.Pa, dewpoint * units.K).m_as(units.mm),
+                mixing_ratio)
+
+
+@pytest.mark.parametrize("surface_temperature, relative_humidity",
+                         [(300, 0.9), (288, 0.7), (270, 0.5)])
+def test_precipitable_water(surface_temperature, relative_humidity):
+    """the same as metpy for mixing ratio, within 1.5 % for specific humidity."""
+    mixing_ratio, dewpoint = _column(surface_temperature, relative_humidity)
+    expected, metpy_mixing_ratio = _metpy_precipitable_water(dewpoint)
+
+    from_mixing_ratio = column.precipitable_water(
+        PRESSURE, metpy_mixing_ratio[:, np.newaxis, np.newaxis])
+    np.testing.assert_allclose(from_mixing_ratio, expected, rtol=1e-4)
+
+    # specific humidity is smaller than mixing ratio by 1 + w
+    # (1.2 % for the moist column; MetPy >= 1.4 also uses Ambaum saturation vapor pressure).
+    result = column.precipitable_water(
+        PRESSURE, thermo.specific_humidity(mixing_ratio)[:, np.newaxis, np.newaxis])
+    np.testing.assert_allclose(result, expected, rtol=0.015)
@@ -0,0 +1,66 @@
+# coding: utf-8
+"""
+Name: test_fieldcache.py
+
+memory budget and read-only fields of fieldcache.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import numpy as np
+import pytest
+from ncmagics import fieldcache, readnc
+
+
+def _field(value: float) -> np.ndarray:
+    """_field.
+    1000 bytes field.
+    """
+    return np.full(125, value)
+
+
+def test_byte_budget_eviction():
+    """least recently used fields are dropped to keep max_bytes."""
+    cache = fieldcache.FieldCache(max_bytes=2500)
+    for key in "abc":
+        cache.put(key, _field(ord(key)))
+    assert cache.nbytes == 2000
+    assert cache.get("a") is None
+    assert cache.get("b") is not None  # b is the most recently used.
+    cache.put("d", _field(0))
+    assert cache.get("c") is None
+    assert cache.get("b") is not None and cache.get("d") is not None
+    assert cache.nbytes == 2000
+
+    cache.put("b", _field(1))  # replace
+    assert cache.nbytes == 2000
+    np.testing.assert_array_equal(cache.get("b"), 1)
+
+
+@pytest.mark.parametrize("max_bytes", [0, 500, 2500])
+def test_read_only(max_bytes):
+    """returned fields are read-only, the given array is not frozen."""
+    cache = fieldcache.FieldCache(max_bytes=max_bytes)
+    field = _field(1)
+    result = cache.put("a", field)
+    assert not result.flags.writeable
+    assert field.flags.writeable
+    field[0] = 2  # the caller's array can be changed.
+    cached = cache.get("a")
+    assert cached is None or not cached.flags.writeable
+
+
+@pytest.mark.parametrize("max_bytes", [0, 256 * 1024 ** 2])
+def test_get_parameter_read_only(ncfiles, max_bytes):
+    """get_parameter() and get_parameters() return read-only fields with and without cache."""
+    default = fieldcache.CACHE.max_bytes
+    fieldcache.set_max_bytes(max_bytes)
+    try:
+        cal_phys = readnc.CalcPhysics(ncfiles[0], masked=False)
+        fields = [cal_phys.get_parameter("t"), cal_phys.get_parameter("t", isobaric_surface=850),
+                  cal_phys.get_parameter("t", isobaric_surface=600),
+                  *cal_phys.get_parameters(["t"], levels=[500, 850])["t"]]
+        assert not any(field.flags.writeable for field in fields)
+    finally:
+        fieldcache.set_max_bytes(default)
+        fieldcache.CACHE.clear()
@@ -0,0 +1,39 @@
+# coding: utf-8
+"""
+Name: test_grid.py
+
+sharing of Grid instances.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import numpy as np
+import pytest
+from ncmagics import grid as grid_module
+from ncmagics.grid import Grid
+
+
+@pytest.fixture
+def max_grids():
+    """max_grids.
+    restore max number of shared grids.
+    """
+    default = grid_module._MAX_GRIDS
+    yield grid_module.set_max_grids
+    grid_module.set_max_grids(default)
+
+
+def test_same_axes_share_instance():
+    """the same lat lon returns the same Grid."""
+    lat, lon = np.arange(20., 61.), np.arange(110., 181.)
+    assert Grid.from_axes(lat, lon) is Grid.from_axes(lat.copy(), lon.tolist())
+
+
+def test_shared_grids_are_bounded(max_grids):
+    """least recently used grids are dropped."""
+    max_grids(2)
+    lon = np.arange(110., 181.)
+    grids = [Grid.from_axes(np.arange(20., 40. + i), lon) for i in range(5)]
+    assert len(grid_module._GRIDS) == 2
+    assert Grid.from_axes(np.arange(20., 44.), lon) is grids[4]
+    assert Grid.from_axes(np.arange(20., 40.), lon) is not grids[0]
@@ -0,0 +1,98 @@
+# coding: utf-8
+"""
+Name: test_inventory.py
+
+SQLite inventory of ncfiles.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import logging
+import os
+from netCDF4 import Dataset
+from conftest import write_ncfile
+from ncmagics import inventory
+
+
+def _data_dir(tmp_path):
+    """_data_dir.
+    data directory with 3 ncfiles and a subdirectory of old output.
+    """
+    root_dir = tmp_path / "data"
+    (root_dir / "old").mkdir(parents=True)
+    for name in ("troposphere-2021-01-10_12.nc", "troposphere-2021-01-10_00.nc",
+                 "surface-2021-01-10_00.nc"):
+        write_ncfile(str(root_dir / name))
+    write_ncfile(str(root_dir / "old" / "troposphere-2021-01-09_00.nc"))
+    return str(root_dir)
+
+
+def test_list_files_is_flat_and_sorted_by_name(tmp_path, monkeypatch):
+    """subdirectories are not listed, and files are sorted by name."""
+    monkeypatch.setenv("NCMAGICS_INVENTORY", str(tmp_path / "cache" / "inventory.sqlite"))
+    root_dir = _data_dir(tmp_path)
+    assert inventory.list_files(root_dir, "troposphere-") == [
+        os.path.join(root_dir, "troposphere-2021-01-10_00.nc"),
+        os.path.join(root_dir, "troposphere-2021-01-10_12.nc"),
+    ]
+    assert os.path.exists(tmp_path / "cache" / "inventory.sqlite")
+
+
+def test_default_db_is_not_in_data_dir(tmp_path, monkeypatch):
+    """the default sqlite file is in the cache directory."""
+    monkeypatch.delenv("NCMAGICS_INVENTORY", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    root_dir = _data_dir(tmp_path)
+    inventory.list_files(root_dir, "surface-")
+    assert sorted(os.listdir(root_dir)) == sorted([
+        "old", "surface-2021-01-10_00.nc",
+        "troposphere-2021-01-10_00.nc", "troposphere-2021-01-10_12.nc",
+    ])
+    assert os.path.exists(tmp_path / "cache" / "ncmagics" / "inventory.sqlite")
+
+
+def test_recursive_update(tmp_path):
+    """recursive=True indexes subdirectories."""
+    root_dir = _data_dir(tmp_path)
+    inv = inventory.Inventory(str(tmp_path / "inventory.sqlite"))
+    assert inv.update(root_dir, recursive=True) == 4
+    assert len(inv.query(root_dir=root_dir, name_filter="troposphere-", recursive=True)) == 3
+    assert len(inv.query(root_dir=root_dir, name_filter="troposphere-")) == 2
+    assert inv.update(root_dir, recursive=True) == 0
+    inv.close()
+
+
+def test_unreadable_files_are_skipped(tmp_path, caplog):
+    """broken file and time without units don't stop update()."""
+    root_dir = _data_dir(tmp_path)
+    with open(os.path.join(root_dir, "broken.nc"), "wb") as broken:
+        broken.write(b"not a netcdf file")
+    with Dataset(os.path.join(root_dir, "troposphere-2021-01-10_00.nc"), "a") as dataset:
+        dataset.variables["time"].delncattr("units")
+    inv = inventory.Inventory(str(tmp_path / "inventory.sqlite"))
+    with caplog.at_level(logging.WARNING, logger="ncmagics.inventory"):
+        assert inv.update(root_dir) == 2
+    assert len(caplog.records) == 2
+    assert [os.path.basename(path) for path in inv.query(root_dir=root_dir)] == [
+        "surface-2021-01-10_00.nc", "troposphere-2021-01-10_12.nc"]
+    inv.close()
+
+
+def test_list_files_is_the_same_as_listdir(tmp_path, monkeypatch):
+    """list_files() selects the same files as sorted(os.listdir()) + filter of mk_ave."""
+    monkeypatch.setenv("NCMAGICS_INVENTORY", str(tmp_path / "cache" / "inventory.sqlite"))
+    root_dir = _data_dir(tmp_path)
+    with open(os.path.join(root_dir, "troposphere-broken.nc"), "wb") as broken:
+        broken.write(b"not a netcdf file")
+    with open(os.path.join(root_dir, "troposphere-2021-01-10_00.grib"), "wb") as other:
+        other.write(b"GRIB")
+    with Dataset(os.path.join(root_dir, "troposphere-2021-01-10_12.nc"), "a") as dataset:
+        dataset.variables["time"].delncattr("units")
+
+    for name_filter in ("troposphere-", "surface", "data", "old", ".nc"):
+        expected = sorted([
+            ncfile
+            for ncfile in map(lambda ncfile: os.path.join(root_dir, ncfile), os.listdir(root_dir))
+            if name_filter in ncfile
+        ])
+        assert inventory.list_files(root_dir, name_filter) == expected
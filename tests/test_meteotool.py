@@ -0,0 +1,290 @@
+# coding: utf-8
+"""
+Name: test_meteotool.py
+
+MeteoTools with thermo kernels and with metpy.calc (use_pint).
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import warnings
+import metpy.calc as mpcalc
+import numpy as np
+import pytest
+import xarray as xr
+from metpy.units import units
+from ncmagics.grid import Grid
+from ncmagics.meteotool import MeteoTools
+from conftest import LEVELS, write_ncfile
+
+
+@pytest.fixture(scope="module")
+def tools(tmp_path_factory):
+    """tools.
+    MeteoTools of thermo kernels and of metpy.calc (use_pint).
+    """
+    ncfile = write_ncfile(str(tmp_path_factory.mktemp("meteotool") / "troposphere.nc"))
+    return MeteoTools(ncfile), MeteoTools(ncfile, use_pint=True)
+
+
+def _temperature_field() -> xr.DataArray:
+    """_temperature_field.
+    smooth (lat, lon) temperature [degC].
+    """
+    lat = np.arange(50, 19.9, -1.25)
+    lon = np.arange(120, 150.1, 1.25)
+    values = 15 + 10 * np.cos(np.deg2rad(2 * lat))[:, np.newaxis] * np.sin(np.deg2rad(3 * lon))
+    return xr.DataArray(values, dims=("lat", "lon"), coords={"lat": lat, "lon": lon})
+
+
+@pytest.mark.parametrize("unit", ["K", "C"])
+def test_gradient_size(tools, unit):
+    """gradient size [unit/m] of both paths agree, and C is the same as K."""
+    thermo_tools, pint_tools = tools
+    field = _temperature_field()
+    result = thermo_tools.gradient_size(field, unit)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = pint_tools.gradient_size(field, unit)
+        kelvin = pint_tools.gradient_size(field + 273.15, "K")
+    np.testing.assert_allclose(expected, kelvin, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=0.01 * np.nanmax(expected))
+
+
+KINEMATICS_LEVELS = (850, 700, 500)
+
+
+def _wind_fields():
+    """_wind_fields.
+    smooth u, v [m/s] and potential temperature [K] of (level, lat, lon).
+    lat is ascending (same as CalcPhysics).
+    """
+    lat = np.arange(20, 50.1, 1.25)
+    lon = np.arange(120, 160.1, 1.25)
+    lon_2d, lat_2d = np.meshgrid(np.radians(lon), np.radians(lat))
+    scale = np.array([1, 1.5, 2])[:, np.newaxis, np.newaxis]
+    u_wind = scale * (10 + 20 * np.cos(2 * lat_2d) * np.sin(3 * lon_2d))
+    v_wind = scale * 5 * np.sin(4 * lat_2d) * np.cos(2 * lon_2d)
+    ptl_temp = 290 + scale * 10 * np.cos(3 * lat_2d + lon_2d)
+    return lat, lon, u_wind, v_wind, ptl_temp
+
+
+def _metpy_kinematics(lat, lon, u_wind, v_wind, ptl_temp) -> dict:
+    """_metpy_kinematics.
+    metpy.calc diagnostics of (level, lat, lon) with the same names as Kinematics.
+    """
+    def _data_array(values, unit):
+        return xr.DataArray(
+            values, dims=("isobaric", "latitude", "longitude"),
+            coords={"isobaric": np.arange(len(values)), "latitude": lat, "longitude": lon}
+        ) * units(unit)
+
+    u_wind = _data_array(u_wind, "m/s")
+    v_wind = _data_array(v_wind, "m/s")
+    ptl_temp = _data_array(ptl_temp, "K")
+    diagnostics = {
+        "vorticity": mpcalc.vorticity(u_wind, v_wind),
+        "divergence": mpcalc.divergence(u_wind, v_wind),
+        "stretching_deformation": mpcalc.stretching_deformation(u_wind, v_wind),
+        "shearing_deformation": mpcalc.shearing_deformation(u_wind, v_wind),
+        "total_deformation": mpcalc.total_deformation(u_wind, v_wind),
+        "ptl_temp_advection": mpcalc.advection(ptl_temp, u_wind, v_wind),
+        "frontogenesis": mpcalc.frontogenesis(ptl_temp, u_wind, v_wind),
+    }
+    return {name: value.metpy.dequantify().values for name, value in diagnostics.items()}
+
+
+@pytest.fixture(scope="module")
+def metpy_kinematics():
+    """metpy_kinematics.
+    """
+    return _metpy_kinematics(*_wind_fields())
+
+
+@pytest.mark.parametrize("name", [
+    "vorticity", "divergence", "stretching_deformation", "shearing_deformation",
+    "total_deformation", "ptl_temp_advection", "frontogenesis",
+])
+def test_kinematics(tools, metpy_kinematics, name):
+    """Kinematics of (level, lat, lon) agrees with metpy.calc, and each level is the same as (lat, lon)."""
+    thermo_tools, _ = tools
+    lat, lon, u_wind, v_wind, ptl_temp = _wind_fields()
+    grid = Grid.from_axes(lat, lon)
+    result = getattr(thermo_tools.kinematics(u_wind, v_wind, ptl_temp, grid=grid), name)
+    expected = metpy_kinematics[name]
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=0, atol=0.01 * np.abs(expected).max())
+    for level in range(len(KINEMATICS_LEVELS)):
+        single = thermo_tools.kinematics(u_wind[level], v_wind[level], ptl_temp[level], grid=grid)
+        np.testing.assert_allclose(getattr(single, name), result[level], rtol=1e-12, atol=0)
+
+
+def test_kinematics_levels(tmp_path, metpy_kinematics):
+    """kinematics_levels() reads u, v, t of the levels and agrees with metpy.calc."""
+    lat, lon, u_wind, v_wind, ptl_temp = _wind_fields()
+    exner = (1000 / np.array(KINEMATICS_LEVELS, dtype=np.float64)) ** 0.2857
+    temperature = ptl_temp / exner[:, np.newaxis, np.newaxis]
+    ncfile = write_ncfile(str(tmp_path / "troposphere.nc"), levels=KINEMATICS_LEVELS,
+                          lat=lat, lon=lon, temperature=temperature,
+                          fields={"u": u_wind, "v": v_wind})
+    tools = MeteoTools(ncfile)
+    params = tools.get_parameters(["u", "v", "t"], levels=list(KINEMATICS_LEVELS))
+    expected = _metpy_kinematics(
+        lat, lon, params["u"], params["v"],
+        tools.cal_potential_temperature(params["t"], list(KINEMATICS_LEVELS)))
+    kinematics = tools.kinematics_levels(KINEMATICS_LEVELS)
+    for name in ("vorticity", "divergence", "total_deformation", "ptl_temp_advection", "frontogenesis"):
+        result = getattr(kinematics, name)
+        assert result.shape == (len(KINEMATICS_LEVELS), len(lat), len(lon))
+        np.testing.assert_allclose(result, expected[name], rtol=0,
+                                   atol=0.01 * np.abs(expected[name]).max())
+        # float32 file is close to the float64 fields.
+        np.testing.assert_allclose(result, metpy_kinematics[name], rtol=0,
+                                   atol=0.02 * np.abs(expected[name]).max())
+
+
+GRIDS = {
+    # lon covers the whole circle (periodic). Near the pole metpy differences
+    # the map factor, which is far from the analytic tan(lat) / a.
+    "global": (np.arange(-60, 60.1, 2.5), np.arange(0, 360, 2.5)),
+    # lat spacing grows from 1 to 2.4 degree.
+    "non-uniform lat": (np.degrees(np.arcsin(np.linspace(0.3, 0.8, 25))), np.arange(120, 160.1, 1.25)),
+}
+
+
+def _metpy_operator(lat, lon, u_wind, v_wind) -> dict:
+    """_metpy_operator.
+    metpy.calc vorticity, divergence and gradient of u_wind on (lat, lon).
+    """
+    def _data_array(values):
+        return xr.DataArray(values, dims=("latitude", "longitude"),
+                            coords={"latitude": lat, "longitude": lon}) * units("m/s")
+
+    u_wind, v_wind = _data_array(u_wind), _data_array(v_wind)
+    ddx, ddy = mpcalc.geospatial_gradient(u_wind)
+    return {
+        "vorticity": mpcalc.vorticity(u_wind, v_wind).metpy.dequantify().values,
+        "divergence": mpcalc.divergence(u_wind, v_wind).metpy.dequantify().values,
+        "ddx": np.asarray(ddx.m_as("1/s")),
+        "ddy": np.asarray(ddy.m_as("1/s")),
+    }
+
+
+def _operator_case(name):
+    """_operator_case.
+    lat, lon, u, v [m/s] and metpy.calc results. On the global grid, metpy
+    results of the seam columns come from lon rolled by 180 degree
+    (metpy is not periodic and uses one-sided stencil at lon edges).
+    """
+    lat, lon = GRIDS[name]
+    lon_2d, lat_2d = np.meshgrid(np.radians(lon), np.radians(lat))
+    u_wind = 10 + 20 * np.cos(lat_2d) ** 2 * np.sin(2 * lon_2d)
+    v_wind = 8 * np.sin(2 * lat_2d) * np.cos(3 * lon_2d)
+    expected = _metpy_operator(lat, lon, u_wind, v_wind)
+    if name == "global":
+        half = len(lon) // 2
+        rolled = _metpy_operator(lat, np.concatenate([lon[half:], lon[:half] + 360]),
+                                 np.roll(u_wind, -half, axis=-1), np.roll(v_wind, -half, axis=-1))
+        for key, value in expected.items():
+            value[:, [0, -1]] = np.roll(rolled[key], half, axis=-1)[:, [0, -1]]
+    return lat, lon, u_wind, v_wind, expected
+
+
+@pytest.mark.parametrize("name", GRIDS.keys())
+def test_diff_operator(name):
+    """DiffOperator agrees with metpy.calc (periodic lon and non-uniform lat).
+    metpy uses plain one-sided stencil of the map factor at lat edges,
+    so lat edges are checked with the analytic vorticity of u = U cos(lat).
+    """
+    lat, lon, u_wind, v_wind, expected = _operator_case(name)
+    operator = Grid.from_axes(lat, lon).operator
+    assert operator.periodic == (name == "global")
+    result = {
+        "vorticity": operator.vorticity(u_wind, v_wind),
+        "divergence": operator.divergence(u_wind, v_wind),
+        "ddx": operator.ddx(u_wind),
+        "ddy": operator.ddy(u_wind),
+    }
+    for key, value in result.items():
+        np.testing.assert_allclose(value[1:-1], expected[key][1:-1], rtol=0,
+                                   atol=0.01 * np.abs(expected[key]).max(), err_msg=key)
+    if operator.periodic:
+        # no seam: rolling the field along lon rolls the result.
+        half = len(lon) // 2
+        rolled = np.roll(operator.vorticity(np.roll(u_wind, half, axis=-1), np.roll(v_wind, half, axis=-1)),
+                         -half, axis=-1)
+        np.testing.assert_allclose(rolled, result["vorticity"], rtol=1e-10, atol=1e-20)
+
+    # zeta = 2 U sin(lat) / a, v = 0.
+    lon_2d, lat_2d = np.meshgrid(np.radians(lon), np.radians(lat))
+    vorticity = operator.vorticity(10 * np.cos(lat_2d), np.zeros_like(lat_2d))
+    analytic = 20 * np.sin(lat_2d) / 6371008.7714
+    np.testing.assert_allclose(vorticity, analytic, rtol=0, atol=0.005 * np.abs(analytic).max())
+
+
+@pytest.mark.parametrize("name", GRIDS.keys())
+def test_cal_ptl_vorticity(tools, name):
+    """cal_ptl_vorticity() of Grid.operator agrees with metpy.calc.vorticity (use_pint) path."""
+    thermo_tools, pint_tools = tools
+    lat, lon, u_wind, v_wind, _ = _operator_case(name)
+    # (isentropic, lat, lon)
+    ise_u_wind = np.stack([u_wind, 1.5 * u_wind])
+    ise_v_wind = np.stack([v_wind, 1.5 * v_wind])
+    d_thita_dp = np.full(ise_u_wind.shape, -5.0) * units.hPa / units.kelvin
+    result = thermo_tools.cal_ptl_vorticity(ise_u_wind, ise_v_wind, d_thita_dp, lat, lon)
+    expected = pint_tools.cal_ptl_vorticity(ise_u_wind, ise_v_wind, d_thita_dp, lat, lon)
+    assert result.shape == ise_u_wind.shape
+    np.testing.assert_allclose(result[:, 1:-1], expected[:, 1:-1], rtol=0,
+                               atol=0.01 * np.abs(expected).max())
+    for isentropic in range(2):
+        np.testing.assert_allclose(
+            thermo_tools.cal_ptl_vorticity(ise_u_wind[isentropic], ise_v_wind[isentropic],
+                                           d_thita_dp[isentropic], lat, lon),
+            result[isentropic], rtol=1e-12)
+
+
+def _ptl_vrt_loop(tools: MeteoTools, isentropic) -> np.ndarray:
+    """_ptl_vrt_loop.
+    isentropic potential vorticity of each surface by the steps of ptl_vrt.main()
+    (isentropic_interpolator -> gph_to_pressure -> cal_ptl_vorticity).
+    """
+    lat, lon = tools.get_lat_lon_xr()
+    temp_k = tools.get_parameter("t")
+    u_wind = tools.get_parameter("u")
+    v_wind = tools.get_parameter("v")
+    height_gpm = tools.get_parameter("gh")
+    ptl_temp = tools.cal_potential_temperature(temp_k)
+    surfaces = []
+    for theta in isentropic:
+        interpolator = tools.isentropic_interpolator(ptl_temp, [theta - 5, theta, theta + 5])
+        ise_u_wind = interpolator(u_wind)[1]
+        ise_v_wind = interpolator(v_wind)[1]
+        ise_height_gpm_lower, _, ise_height_gpm_upper = interpolator(height_gpm)
+        d_thita_dp = ((tools.gph_to_pressure(ise_height_gpm_upper) - tools.gph_to_pressure(ise_height_gpm_lower))
+                      / (10 * units.kelvin))
+        surfaces.append(tools.cal_ptl_vorticity(ise_u_wind, ise_v_wind, d_thita_dp, lat, lon))
+    return np.stack(surfaces)
+
+
+def test_ptl_vorticity_volume(tmp_path):
+    """ptl_vorticity_volume() is the same as the per surface loop of ptl_vrt.py (and NaN)."""
+    rng = np.random.default_rng(2)
+    shape = (len(LEVELS), 33, 57)
+    pressure = np.array(LEVELS, dtype=np.float64)[:, np.newaxis, np.newaxis]
+    temperature = 288 * (pressure / 1000) ** 0.19 + rng.normal(0, 1, shape)
+    height = 44330.8 * (1 - (pressure / 1013.25) ** 0.1903) + rng.normal(0, 5, shape)
+    temperature[0, 3, 4] = np.nan
+    height[2, 10, 20] = np.nan
+    ncfile = write_ncfile(str(tmp_path / "troposphere.nc"), temperature=temperature, fields={
+        "u": 10 + rng.normal(0, 5, shape), "v": rng.normal(0, 5, shape), "gh": height})
+    tools = MeteoTools(ncfile)
+    # 330 K is above some columns (both stencil surfaces are the top, d_thita_dp is 0).
+    isentropic = [290, 300, 305, 310, 330]
+    with np.errstate(divide="ignore"):
+        expected = _ptl_vrt_loop(tools, isentropic)
+        result = tools.ptl_vorticity_volume(isentropic)
+    assert result.dims == ("isentropic", "latitude", "longitude")
+    np.testing.assert_array_equal(result["isentropic"], isentropic)
+    assert np.isnan(expected).any()
+    np.testing.assert_array_equal(np.isnan(result.values), np.isnan(expected))
+    np.testing.assert_allclose(result.values, expected, rtol=1e-10, atol=1e-12)
@@ -0,0 +1,54 @@
+# coding: utf-8
+"""
+Name: test_ncpool.py
+
+netcdf handle pool used from several threads.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+from ncmagics import fieldcache, ncpool, readnc
+
+
+@pytest.fixture
+def max_open():
+    """max_open.
+    restore max_open of the shared pool and clear the field cache.
+    """
+    default = ncpool.POOL.max_open
+    fieldcache.CACHE.clear()
+    yield ncpool.set_max_open
+    ncpool.set_max_open(default)
+    ncpool.POOL.close_all()
+    fieldcache.CACHE.clear()
+
+
+def _expected(ncfile: str) -> np.ndarray:
+    """_expected.
+    t of 850 hPa in ascending latitude.
+    """
+    with Dataset(ncfile) as dataset:
+        return np.asarray(dataset.variables["t"][0, 2])[::-1]
+
+
+@pytest.mark.parametrize("n_open", [1, 4, 16])
+def test_threaded_multi_file_read(ncfiles, max_open, n_open):
+    """read many files from threads while handles are opened and evicted."""
+    max_open(n_open)
+    cal_phys = readnc.CalcPhysics(ncfiles[0])
+    expected = [_expected(ncfile) for ncfile in ncfiles]
+
+    def _read(i: int) -> np.ndarray:
+        fieldcache.CACHE.clear()
+        return np.asarray(cal_phys.get_parameter("t", ncfile=ncfiles[i % len(ncfiles)],
+                                                 isobaric_surface=850))
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(_read, range(50 * len(ncfiles))))
+    for i, result in enumerate(results):
+        np.testing.assert_array_equal(result, expected[i % len(ncfiles)])
+    assert len(ncpool.POOL._handles) <= max(n_open, 8)
@@ -0,0 +1,97 @@
+# coding: utf-8
+"""
+Name: test_parcel.py
+
+CAPE and CIN against metpy.calc.surface_based_cape_cin and
+metpy.calc.most_unstable_cape_cin (virtual temperature, metpy >= 1.4).
+Differences come from the moist adiabat lookup table and the LCL of the
+ln p linear profile. A parcel which is buoyant below its LCL (most unstable
+parcel above an inversion) has its LFC at the LCL, and metpy.calc.lfc
+computes that LCL from the virtual temperature, which is higher, so
+metpy's CAPE is smaller by up to 16 % for those columns.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import warnings
+import numpy as np
+import pytest
+import metpy.calc as mpcalc
+from metpy.units import units
+from ncmagics import parcel, thermo
+
+LEVELS = np.array([1000, 975, 950, 925, 900, 850, 800, 700, 600, 500, 400, 300, 250, 200, 150, 100],
+                  dtype=np.float64)
+# |CAPE - metpy| <= CAPE_RTOL * CAPE + CAPE_ATOL [J/kg]
+# (measured: 101 J/kg at 8059 J/kg; 97 J/kg at 619 J/kg of most unstable parcel above an inversion).
+CAPE_RTOL = 0.03
+CAPE_ATOL = 50.
+ELEVATED_CAPE_RTOL = 0.1
+CIN_ATOL = 5.
+
+
+def _columns(n_column=40, seed=0):
+    """_columns.
+    random troposphere-like columns. The first 10 columns have an inversion
+    at 950-925 hPa (most unstable parcel above the surface).
+
+    Returns:
+        temperature, dewpoint [K] of shape (level, column)
+    """
+    rng = np.random.default_rng(seed)
+    height = 44330 * (1 - (LEVELS / 1013.25) ** 0.19)
+    lapse_rate = rng.uniform(5.5, 8, n_column) / 1000
+    temperature = rng.uniform(285, 305, n_column) - lapse_rate * height[:, np.newaxis]
+    temperature = np.maximum(temperature, 210)
+    relative_humidity = rng.uniform(0.4, 0.95, n_column) * np.exp(
+        -height[:, np.newaxis] / rng.uniform(2500, 6000, n_column))
+    relative_humidity = np.clip(relative_humidity, 0.05, 1)
+    dewpoint = thermo.dewpoint(relative_humidity * thermo.saturation_vapor_pressure(temperature))
+    temperature[2:4, :10] += 4
+    return temperature, dewpoint
+
+
+@pytest.mark.parametrize("parcel_type, metpy_cape_cin", [
+    ("surface", mpcalc.surface_based_cape_cin),
+    ("most_unstable", mpcalc.most_unstable_cape_cin),
+])
+def test_cape_cin(parcel_type, metpy_cape_cin):
+    """CAPE and CIN of all columns at once agree with metpy."""
+    temperature, dewpoint = _columns()
+    cape, cin, _ = parcel.cape_cin(LEVELS * 100, temperature[:, np.newaxis], dewpoint[:, np.newaxis],
+                                   parcel=parcel_type, virtual_temperature=True)
+    expected = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for index in range(temperature.shape[1]):
+            expected.append([value.m_as("J/kg") for value in metpy_cape_cin(
+                LEVELS * units.hPa, temperature[:, index] * units.K, dewpoint[:, index] * units.K)])
+    expected_cape, expected_cin = np.array(expected).T
+
+    rtol = np.full(len(expected_cape), CAPE_RTOL)
+    if parcel_type == "most_unstable":
+        rtol[:10] = ELEVATED_CAPE_RTOL
+    assert np.all(np.abs(cape[0] - expected_cape) <= rtol * expected_cape + CAPE_ATOL)
+    # a barely buoyant parcel (CAPE < 1 J/kg) may have no LFC in metpy (CIN = 0).
+    buoyant = (cape[0] > 1) & (expected_cape > 1)
+    assert buoyant.sum() > 20
+    np.testing.assert_allclose(cin[0][buoyant], expected_cin[buoyant], rtol=0, atol=CIN_ATOL)
+
+
+def test_most_unstable_depth_from_surface_pressure():
+    """depth of the most unstable layer is measured from surface_pressure."""
+    temperature, dewpoint = _columns(n_column=1)
+    # warm and moist 700 hPa: max theta_e, 25 kPa above the lowest level (950 hPa)
+    # but 26.5 kPa above the ground.
+    level_700 = np.flatnonzero(LEVELS == 700)[0]
+    temperature[level_700] += 15
+    dewpoint[level_700] = temperature[level_700] - 0.5
+
+    _, _, lcl_pressure = parcel.cape_cin(
+        LEVELS * 100, temperature[:, np.newaxis], dewpoint[:, np.newaxis],
+        parcel="most_unstable", surface_pressure=96500., depth=26000.)
+    in_layer = (LEVELS <= 965) & (LEVELS >= 705)
+    theta_e = thermo.equivalent_potential_temperature(LEVELS * 100, temperature[:, 0], dewpoint[:, 0])
+    start = np.flatnonzero(in_layer)[np.argmax(theta_e[in_layer])]
+    expected, _ = parcel.lcl(LEVELS[start] * 100, temperature[start, 0], dewpoint[start, 0])
+    np.testing.assert_allclose(lcl_pressure[0, 0], expected)
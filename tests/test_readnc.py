@@ -0,0 +1,203 @@
+# coding: utf-8
+"""
+Name: test_readnc.py
+
+CalcPhysics: reads shared by several threads, levels, orientation of
+lat lon, decoding of packed variables, disk cache and multi-time files.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import numpy as np
+import pytest
+import metpy.interpolate
+from netCDF4 import Dataset
+from conftest import LEVELS, write_ncfile
+from ncmagics import diskcache, fieldcache, readnc
+
+
+def test_shared_instance_get_parameters(ncfiles):
+    """one instance reads several levels of many files from threads."""
+    cal_phys = readnc.CalcPhysics(ncfiles[0], masked=False)
+    fieldcache.CACHE.clear()
+    expected = [cal_phys.get_parameters(["t"], levels=[850, 500], ncfile=ncfile)["t"]
+                for ncfile in ncfiles]
+
+    def _read(i: int) -> np.ndarray:
+        fieldcache.CACHE.clear()
+        return cal_phys.get_parameters(["t"], levels=[850, 500],
+                                       ncfile=ncfiles[i % len(ncfiles)])["t"]
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(_read, range(20 * len(ncfiles))))
+    for i, result in enumerate(results):
+        assert result.shape == (2,) + expected[0].shape[1:]
+        np.testing.assert_array_equal(result, expected[i % len(ncfiles)])
+    fieldcache.CACHE.clear()
+
+
+def test_float_level(ncfiles):
+    """level given as float (850.0) is read as the file level 850."""
+    cal_phys = readnc.CalcPhysics(ncfiles[0], masked=False)
+    np.testing.assert_array_equal(cal_phys.get_parameter("t", isobaric_surface=850.0),
+                                  cal_phys.get_parameter("t", isobaric_surface=850))
+
+
+def test_interpolated_level(ncfiles):
+    """level between file levels is linear in ln(p) (same as metpy.interpolate)."""
+    cal_phys = readnc.CalcPhysics(ncfiles[0], masked=False, dtype=np.float64)
+    result = cal_phys.get_parameter("t", isobaric_surface=600)
+    t_700 = cal_phys.get_parameter("t", isobaric_surface=700)
+    t_500 = cal_phys.get_parameter("t", isobaric_surface=500)
+    weight = np.log(600 / 700) / np.log(500 / 700)
+    np.testing.assert_allclose(result, t_700 + weight * (t_500 - t_700), rtol=1e-12)
+
+    field = cal_phys.get_parameter("t")
+    levels = np.array([int(level) for level in cal_phys.isobaric_surface_dict], dtype=np.float64)
+    levels = np.broadcast_to(levels[:, np.newaxis, np.newaxis], field.shape)
+    expected = metpy.interpolate.log_interpolate_1d(np.array([600.]), levels, field, axis=0)[0]
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+
+
+def test_exact_and_interpolated_levels(ncfiles):
+    """exact levels are copied, the other levels are interpolated in one call."""
+    cal_phys = readnc.CalcPhysics(ncfiles[0], masked=False)
+    result = cal_phys.get_parameters(["t"], levels=[850, 600, 925, 400])["t"]
+    assert result.shape[0] == 4
+    np.testing.assert_array_equal(result[0], cal_phys.get_parameter("t", isobaric_surface=850))
+    np.testing.assert_array_equal(result[2], cal_phys.get_parameter("t", isobaric_surface=925))
+    np.testing.assert_allclose(result[1], cal_phys.get_parameter("t", isobaric_surface=600))
+    np.testing.assert_allclose(result[3], cal_phys.get_parameter("t", isobaric_surface=400))
+
+
+@pytest.mark.parametrize("level", [1050, 250])
+def test_level_outside_file(ncfiles, level):
+    """level outside of the file levels (1000-300) is not extrapolated."""
+    cal_phys = readnc.CalcPhysics(ncfiles[0], masked=False)
+    with pytest.raises(ValueError, match="outside"):
+        cal_phys.get_parameter("t", isobaric_surface=level)
+    with pytest.raises(ValueError, match="outside"):
+        cal_phys.get_parameters(["t"], levels=[850, level])
+
+
+@pytest.mark.parametrize("region", ["japan", (20, 50, 170, 200), "global"])
+def test_orientation(tmp_path, region):
+    """descending lat and -180-180 lon file is read as ascending lat and 0-360 lon.
+    170-200 E crosses the end of -180-180 lon (two hyperslabs)."""
+    rng = np.random.default_rng(0)
+    lat = np.arange(-90, 90.1, 2.5)
+    lon = np.arange(0, 360, 2.5)
+    field = rng.normal(250, 10, (len(LEVELS), len(lat), len(lon))).astype(np.float32)
+    baseline = write_ncfile(str(tmp_path / "baseline.nc"), lat=lat, lon=lon, temperature=field)
+    # the same field stored north to south and from -180.
+    roll = np.flatnonzero(lon == 180)[0]
+    flipped = write_ncfile(str(tmp_path / "flipped.nc"), lat=lat[::-1],
+                           lon=np.concatenate([lon[roll:] - 360, lon[:roll]]),
+                           temperature=np.roll(field[:, ::-1], -roll, axis=-1))
+
+    cal_phys = readnc.CalcPhysics(baseline, region=region, masked=False, dtype=np.float64)
+    region = cal_phys.region
+    in_lat = (lat >= region.lat_min) & (lat <= region.lat_max)
+    in_lon = (lon >= region.lon_min) & (lon <= region.lon_max)
+    expected = field[:, in_lat][:, :, in_lon]
+    np.testing.assert_array_equal(cal_phys.get_parameter("t"), expected)
+
+    for ncfile in (baseline, flipped):
+        cal_phys = readnc.CalcPhysics(ncfile, region=region, masked=False, dtype=np.float64)
+        read_lat, read_lon = cal_phys.get_lat_lon()
+        np.testing.assert_array_equal(read_lat, lat[in_lat])
+        np.testing.assert_array_equal(read_lon, lon[in_lon])
+        np.testing.assert_array_equal(cal_phys.get_parameter("t"), expected)
+        masked = cal_phys.get_parameter("t", isobaric_surface=500, masked=True)
+        np.testing.assert_array_equal(masked, expected[LEVELS.index(500)])
+
+
+def _write_packed(ncfile: str) -> np.ndarray:
+    """_write_packed.
+    add int16 "prmsl" (time, lat, lon) packed by scale_factor, add_offset with _FillValue.
+
+    Returns:
+        np.ndarray: raw values (lat, lon)
+    """
+    with Dataset(ncfile, "a") as dataset:
+        shape = (len(dataset.dimensions["lat"]), len(dataset.dimensions["lon"]))
+        raw = np.random.default_rng(0).integers(-30000, 30000, shape).astype(np.int16)
+        raw[::7, ::5] = -32767
+        variable = dataset.createVariable("prmsl", "i2", ("time", "lat", "lon"), fill_value=-32767)
+        variable.scale_factor = 0.1
+        variable.add_offset = 101325.
+        variable.set_auto_maskandscale(False)
+        variable[0] = raw
+    return raw
+
+
+def test_packed_fill_value(tmp_path):
+    """masked=False decodes int16 to float32 and fill value to NaN."""
+    ncfile = write_ncfile(str(tmp_path / "surface.nc"))
+    raw = _write_packed(ncfile)
+    cal_phys = readnc.CalcPhysics(ncfile, region="global")
+    # ascending lat: the raw lat axis is descending.
+    raw = raw[::-1]
+    fill = raw == -32767
+
+    result = cal_phys.get_parameter("prmsl", masked=False)
+    assert result.dtype == np.float32 and result.flags.c_contiguous
+    np.testing.assert_array_equal(np.isnan(result), fill)
+    expected = raw.astype(np.float32) * np.float32(0.1) + np.float32(101325.)
+    np.testing.assert_array_equal(result[~fill], expected[~fill])
+
+    # default (masked=True) is np.array() of netCDF4 masked array, as before.
+    with Dataset(ncfile) as dataset:
+        baseline = np.array(dataset.variables["prmsl"][0])[::-1]
+    np.testing.assert_array_equal(cal_phys.get_parameter("prmsl"), baseline)
+    np.testing.assert_allclose(baseline[~fill], result[~fill], rtol=1e-6)
+
+    as_float64 = cal_phys.get_parameter("prmsl", masked=False, dtype=np.float64)
+    assert as_float64.dtype == np.float64
+    np.testing.assert_array_equal(np.isnan(as_float64), fill)
+
+
+def test_disk_cache_invalidation(ncfiles, tmp_path, monkeypatch):
+    """the field is loaded from disk cache, and read again after the file is touched."""
+    loaded = []
+    load = diskcache.CACHE.load
+
+    def _load(ncfile, key):
+        data = load(ncfile, key)
+        loaded.append(data is not None)
+        return data
+
+    monkeypatch.setattr(diskcache.CACHE, "load", _load)
+    monkeypatch.setattr(diskcache.CACHE, "cache_dir", str(tmp_path / "cache"))
+    cal_phys = readnc.CalcPhysics(ncfiles[0], masked=False)
+    fieldcache.CACHE.clear()
+    expected = np.array(cal_phys.get_parameter("t", isobaric_surface=850))
+    fieldcache.CACHE.clear()
+    np.testing.assert_array_equal(cal_phys.get_parameter("t", isobaric_surface=850), expected)
+    assert loaded == [False, True]
+
+    stat = os.stat(ncfiles[0])
+    os.utime(ncfiles[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    fieldcache.CACHE.clear()
+    np.testing.assert_array_equal(cal_phys.get_parameter("t", isobaric_surface=850), expected)
+    fieldcache.CACHE.clear()
+    np.testing.assert_array_equal(cal_phys.get_parameter("t", isobaric_surface=850), expected)
+    assert loaded == [False, True, False, True]
+    fieldcache.CACHE.clear()
+
+
+def test_iter_times(tmp_path):
+    """iter_times() streams every time of the file (the same as time_index=)."""
+    ncfile = write_ncfile(str(tmp_path / "troposphere.nc"), n_time=3)
+    cal_phys = readnc.CalcPhysics(ncfile, masked=False)
+    first = cal_phys.get_parameters(["t"], levels=[850, 500])["t"]
+    times = []
+    for time_index, (valid_time, params) in enumerate(cal_phys.iter_times(["t"], levels=[850, 500])):
+        times.append((valid_time.day, valid_time.hour))
+        np.testing.assert_allclose(params["t"], first + np.float32(time_index), rtol=1e-6)
+        np.testing.assert_array_equal(
+            params["t"][1], cal_phys.get_parameter("t", isobaric_surface=500, time_index=time_index))
+    assert times == [(10, 0), (10, 6), (10, 12)]
+    assert [(valid_time.day, valid_time.hour) for valid_time in cal_phys.get_valid_times()] == times
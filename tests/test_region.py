@@ -0,0 +1,34 @@
+# coding: utf-8
+"""
+Name: test_region.py
+
+cache of region index slices.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import numpy as np
+import pytest
+from ncmagics import region
+
+
+@pytest.fixture
+def max_slices():
+    """max_slices.
+    restore max number of cached index slices.
+    """
+    default = region._MAX_SLICES
+    yield region.set_max_slices
+    region.set_max_slices(default)
+
+
+def test_index_slices_are_bounded(max_slices):
+    """least recently used index slices are dropped."""
+    max_slices(2)
+    japan = region.get_region("japan")
+    lon = np.arange(0., 360., 1.25)
+    area_indexes = [japan.index_slices(np.arange(10., 70. + i), lon) for i in range(5)]
+    assert len(region._SLICE_CACHE) == 2
+    assert japan.index_slices(np.arange(10., 74.), lon) is area_indexes[4]
+    assert japan.index_slices(np.arange(10., 70.), lon) is not area_indexes[0]
+    assert japan.index_slices(np.arange(10., 70.), lon) == area_indexes[0]
@@ -0,0 +1,170 @@
+# coding: utf-8
+"""
+Name: test_thermo.py
+
+thermodynamic kernels against metpy.calc.
+The kernels use the Bolton (1980) saturation vapor pressure of MetPy 1.1
+(requirements.txt). MetPy >= 1.4 uses Ambaum (2020) instead, so quantities
+derived from it (mixing ratio from rh, dewpoint from rh, equivalent potential
+temperature) differ by the tolerances below, largest for cold air
+(< 233 K: up to 6 % in mixing ratio, 0.4 K in dewpoint).
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import warnings
+import numpy as np
+import pytest
+import metpy.calc as mpcalc
+from metpy.units import units
+from ncmagics import thermo
+from ncmagics.meteotool import MeteoTools
+from conftest import write_ncfile
+
+LEVELS = (1000, 925, 850, 700, 500, 300)
+
+
+def _sample(dtype=np.float64):
+    """_sample.
+    (pressure, temperature, dewpoint depression) grid.
+
+    Returns:
+        pressure [Pa], temperature [K], dewpoint [K] of shape (6, 15, 7)
+    """
+    pressure = np.array([1000, 925, 850, 700, 500, 300])[:, np.newaxis, np.newaxis] * 100.
+    temperature = np.arange(243.15, 313.2, 5)[np.newaxis, :, np.newaxis]
+    depression = np.array([0., 0.5, 2, 5, 10, 20, 30])[np.newaxis, np.newaxis, :]
+    pressure, temperature, depression = np.broadcast_arrays(pressure, temperature, depression)
+    return (pressure.astype(dtype), temperature.astype(dtype),
+            (temperature - depression).astype(dtype))
+
+
+@pytest.fixture(scope="module")
+def metpy_wet_bulb():
+    """metpy_wet_bulb.
+    metpy.calc.wet_bulb_temperature of _sample() (slow, so computed once).
+    """
+    pressure, temperature, dewpoint = _sample()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return mpcalc.wet_bulb_temperature(
+            pressure * units.Pa, temperature * units.K, dewpoint * units.K).m_as(units.K)
+
+
+@pytest.mark.parametrize("max_depression, tolerance", [(2, 0.05), (10, 0.15), (30, 0.3)])
+def test_wet_bulb_temperature(metpy_wet_bulb, max_depression, tolerance):
+    """difference from metpy grows with dewpoint depression."""
+    pressure, temperature, dewpoint = _sample()
+    wet_bulb = thermo.wet_bulb_temperature(pressure, temperature, dewpoint)
+    selected = temperature - dewpoint <= max_depression
+    assert np.abs(wet_bulb - metpy_wet_bulb)[selected].max() < tolerance
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_wet_bulb_temperature_out_alias(dtype):
+    """out=temperature (module docstring example) gives the same result."""
+    pressure, temperature, dewpoint = _sample(dtype)
+    expected = thermo.wet_bulb_temperature(pressure, temperature, dewpoint)
+    temp_k = temperature.copy()
+    result = thermo.wet_bulb_temperature(pressure, temp_k, dewpoint, out=temp_k)
+    assert result is temp_k
+    assert result.dtype == dtype
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-3)
+
+
+def _atmosphere(dtype=np.float64):
+    """_atmosphere.
+    (pressure, temperature, relative humidity) of troposphere-like range.
+
+    Returns:
+        pressure [Pa], temperature [K], relative humidity [0-1] of shape (6, 11, 20)
+    """
+    pressure = np.array(LEVELS, dtype=np.float64)[:, np.newaxis, np.newaxis] * 100
+    temperature = 288 * (pressure / 100000) ** 0.19 + np.linspace(-30, 20, 11)[:, np.newaxis]
+    relative_humidity = np.linspace(0.05, 1, 20)
+    return tuple(array.astype(dtype) for array in
+                 np.broadcast_arrays(pressure, temperature, relative_humidity))
+
+
+def _reference_dewpoint(pressure, temperature, relative_humidity):
+    """_reference_dewpoint.
+    dewpoint of thermo (compared with metpy by test_kernel "dewpoint").
+    """
+    mixing_ratio = thermo.mixing_ratio_from_relative_humidity(pressure, temperature, relative_humidity)
+    return thermo.dewpoint(thermo.vapor_pressure(pressure, mixing_ratio))
+
+
+# name: (thermo, metpy, rtol, atol)
+KERNELS = {
+    "potential_temperature": (
+        lambda p, t, rh: thermo.potential_temperature(p, t),
+        lambda p, t, rh: mpcalc.potential_temperature(p * units.Pa, t * units.K).m_as(units.K),
+        0, 0),
+    "mixing_ratio_from_relative_humidity": (
+        thermo.mixing_ratio_from_relative_humidity,
+        lambda p, t, rh: mpcalc.mixing_ratio_from_relative_humidity(
+            p * units.Pa, t * units.K, rh).m_as(units.dimensionless),
+        5e-3, 1e-6),  # Ambaum
+    "dewpoint": (
+        lambda p, t, rh: thermo.dewpoint(thermo.saturation_vapor_pressure(t) * rh),
+        lambda p, t, rh: mpcalc.dewpoint(
+            thermo.saturation_vapor_pressure(t.astype(np.float64)) * rh * units.Pa).m_as(units.K),
+        0, 0),
+    "equivalent_potential_temperature": (
+        lambda p, t, rh: thermo.equivalent_potential_temperature(p, t, _reference_dewpoint(p, t, rh)),
+        lambda p, t, rh: mpcalc.equivalent_potential_temperature(
+            p * units.Pa, t * units.K,
+            _reference_dewpoint(p, t, rh).astype(np.float64) * units.K).m_as(units.K),
+        1.5e-3, 0),  # Ambaum
+}
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("name", list(KERNELS))
+def test_kernel(name, dtype):
+    """kernel agrees with metpy.calc and keeps the input dtype."""
+    kernel, reference, rtol, atol = KERNELS[name]
+    pressure, temperature, relative_humidity = _atmosphere(dtype)
+    result = kernel(pressure, temperature, relative_humidity)
+    assert result.dtype == dtype
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = reference(*(array.astype(np.float64) for array in
+                               (pressure, temperature, relative_humidity)))
+    np.testing.assert_allclose(result, expected, rtol=rtol + 8 * np.finfo(dtype).eps, atol=atol)
+
+
+@pytest.fixture(scope="module")
+def tools(tmp_path_factory):
+    """tools.
+    MeteoTools of thermo kernels and of metpy.calc (use_pint).
+    """
+    ncfile = write_ncfile(str(tmp_path_factory.mktemp("thermo") / "troposphere.nc"))
+    return MeteoTools(ncfile), MeteoTools(ncfile, use_pint=True)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_thermo_state(tools, dtype):
+    """ThermoState of thermo kernels agrees with that of metpy.calc."""
+    thermo_tools, pint_tools = tools
+    pressure, temperature, relative_humidity = _atmosphere(dtype)
+    for index, level in enumerate(LEVELS):
+        state = thermo_tools.thermo_state(temperature[index], relative_humidity[index] * 100, level)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            expected = pint_tools.thermo_state(temperature[index].astype(np.float64),
+                                               relative_humidity[index].astype(np.float64) * 100,
+                                               level)
+            expected_mask = pint_tools.cal_diff_temp_dewpoint(state=expected)
+        assert state.eqv_potential_temperature.dtype == dtype
+        np.testing.assert_allclose(state.mixing_ratio, expected.mixing_ratio, rtol=5e-3, atol=1e-6)
+        np.testing.assert_allclose(state.dewpoint_depression, expected.dewpoint_depression,
+                                   rtol=0, atol=0.4)
+        np.testing.assert_allclose(state.eqv_potential_temperature,
+                                   expected.eqv_potential_temperature, rtol=3e-3)
+
+        # 湿数 < 3 area differs only at borderline points
+        # (e.g. 6 of 11421 grid points of a 81x141 field).
+        mask = thermo_tools.cal_diff_temp_dewpoint(state=state)
+        differ = np.isnan(mask) != np.isnan(expected_mask)
+        assert np.all(np.abs(expected.dewpoint_depression[differ] - 3) < 0.4)
@@ -0,0 +1,90 @@
+# coding: utf-8
+"""
+Name: test_vinterp.py
+
+IsentropicInterpolator with metpy.interpolate.interpolate_to_isosurface.
+
+Author: Ryosuke Tomita
+Date: 2022/03/01
+"""
+import metpy.interpolate
+import numpy as np
+import pytest
+from ncmagics.meteotool import MeteoTools
+from ncmagics.vinterp import IsentropicInterpolator
+from conftest import write_ncfile
+
+# below the column, inside (some columns have inversions), above the column.
+ISENTROPIC = [250, 285, 300, 320, 340, 400]
+
+
+def _columns(seed=1):
+    """_columns.
+    potential temperature [K] and a field of (level, lat, lon), lowest level first.
+    Noise makes inversions (several crossings) in some columns.
+    NaN in ptl_temp (e.g. below the ground) and in the field.
+    """
+    rng = np.random.default_rng(seed)
+    n_level = 6
+    ptl_temp = 280 + 12 * np.arange(n_level)[:, np.newaxis, np.newaxis] + rng.normal(0, 8, (n_level, 8, 9))
+    ptl_temp[1, 0, 0] = np.nan
+    ptl_temp[0, 1, :3] = np.nan
+    phys_val = rng.normal(0, 10, ptl_temp.shape)
+    phys_val[3, 2, 2] = np.nan
+    return ptl_temp, phys_val
+
+
+def _metpy_isentropic(ptl_temp: np.ndarray, phys_val: np.ndarray, isentropic) -> np.ndarray:
+    """_metpy_isentropic.
+    (isentropic, lat, lon) by metpy (highest level first).
+    """
+    return np.stack([
+        metpy.interpolate.interpolate_to_isosurface(ptl_temp[::-1], phys_val[::-1], theta)
+        for theta in isentropic
+    ])
+
+
+@pytest.fixture(scope="module")
+def tools(tmp_path_factory):
+    """tools.
+    MeteoTools of thermo kernels and of metpy (use_pint).
+    """
+    ncfile = write_ncfile(str(tmp_path_factory.mktemp("vinterp") / "troposphere.nc"))
+    return MeteoTools(ncfile), MeteoTools(ncfile, use_pint=True)
+
+
+def test_isentropic_interpolator():
+    """values and NaN positions are the same as metpy, also outside of the column."""
+    ptl_temp, phys_val = _columns()
+    expected = _metpy_isentropic(ptl_temp, phys_val, ISENTROPIC)
+    result = IsentropicInterpolator(ptl_temp, ISENTROPIC)(phys_val)
+    assert result.shape == (len(ISENTROPIC),) + ptl_temp.shape[1:]
+    np.testing.assert_array_equal(np.isnan(result), np.isnan(expected))
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-12)
+
+    # below the column is the lowest level, above the column is the highest level.
+    finite = ~np.isnan(ptl_temp).any(axis=0) & ~np.isnan(phys_val[[0, -1]]).any(axis=0)
+    np.testing.assert_array_equal(result[0][finite], phys_val[0][finite])
+    np.testing.assert_array_equal(result[-1][finite], phys_val[-1][finite])
+
+    # highest level first, and scalar isentropic.
+    top_first = IsentropicInterpolator(ptl_temp[::-1], ISENTROPIC, bottom_first=False)
+    np.testing.assert_array_equal(top_first(phys_val[::-1]), result)
+    for index, theta in enumerate(ISENTROPIC):
+        np.testing.assert_array_equal(IsentropicInterpolator(ptl_temp, theta)(phys_val), result[index])
+
+
+@pytest.mark.parametrize("reverse", [True, False])
+def test_isentropic_surface_value(tools, reverse):
+    """isentropic_interpolator() and isentropic_surface_value() of both paths agree."""
+    thermo_tools, pint_tools = tools
+    ptl_temp, phys_val = _columns()
+    if not reverse:
+        ptl_temp, phys_val = ptl_temp[::-1], phys_val[::-1]
+    volume = thermo_tools.isentropic_interpolator(ptl_temp, ISENTROPIC, reverse)(phys_val)
+    for index, theta in enumerate(ISENTROPIC):
+        expected = pint_tools.isentropic_surface_value(ptl_temp, phys_val, theta, reverse)
+        result = thermo_tools.isentropic_surface_value(ptl_temp, phys_val, theta, reverse)
+        np.testing.assert_array_equal(np.isnan(result), np.isnan(expected))
+        np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-12)
+        np.testing.assert_array_equal(volume[index], result)
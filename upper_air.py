@@ -56,23 +56,26 @@ def main():
 
     meteo_tool = meteotool.MeteoTools(args["file"])
     lat, lon = meteo_tool.get_lat_lon()
+    grid = meteo_tool.get_grid()
     isobaric_surface = (850, 500, 300)
     label_max = (30, 0, "-30")
     lebel_min = (-30, -60, "-60")
 
+    # get parameter (level, lat, lon)
+    params = meteo_tool.get_parameters(['t', 'r', 'gh', 'u', 'v'], levels=isobaric_surface)
+
     for i, pressure in enumerate(isobaric_surface):
-        # get parameter
-        temp_c = meteo_tool.get_parameter('t', isobaric_surface=pressure) - 273.15
-        rh = meteo_tool.get_parameter('r', isobaric_surface=pressure)
-        height_gpm = meteo_tool.get_parameter('gh', isobaric_surface=pressure)
-        u_wind = meteo_tool.get_parameter('u', isobaric_surface=pressure)
-        v_wind = meteo_tool.get_parameter('v', isobaric_surface=pressure)
+        temp_c = params['t'][i] - 273.15
+        rh = params['r'][i]
+        height_gpm = params['gh'][i]
+        u_wind = params['u'][i]
+        v_wind = params['v'][i]
 
         # calcurate difference between temperature to dewpoint.
         diff_temp_dewpoint = meteo_tool.cal_diff_temp_dewpoint(temp_c, rh, pressure)
 
         # plot
-        jp_map = japanmap.JpMap()
+        jp_map = japanmap.JpMap(grid=grid)
         jp_map.contour_plot(lon, lat, height_gpm)
         jp_map.shade_plot(lon, lat, temp_c,
                 label="temperature ($^\circ$C)",
@@ -52,17 +52,20 @@ def main():
 
     meteo_tool = meteotool.MeteoTools(args["file"])
     lat, lon = meteo_tool.get_lat_lon()
+    grid = meteo_tool.get_grid()
     isobaric_surface = (850, 500, 300)
 
+    # get parameter (level, lat, lon)
+    params = meteo_tool.get_parameters(['t', 'r', 'gh', 'u', 'v'], levels=isobaric_surface)
+
     for i, pressure in enumerate(isobaric_surface):
-        # get parameter
-        temp_c = meteo_tool.get_parameter('t', isobaric_surface=pressure) - 273.15
-        rh = meteo_tool.get_parameter('r', isobaric_surface=pressure)
-        height_gpm = meteo_tool.get_parameter('gh', isobaric_surface=pressure)
-        u_wind = meteo_tool.get_parameter('u', isobaric_surface=pressure)
-        v_wind = meteo_tool.get_parameter('v', isobaric_surface=pressure)
-
-        jp_map = japanmap.JpMap()
+        temp_c = params['t'][i] - 273.15
+        rh = params['r'][i]
+        height_gpm = params['gh'][i]
+        u_wind = params['u'][i]
+        v_wind = params['v'][i]
+
+        jp_map = japanmap.JpMap(grid=grid)
         jp_map.contour_plot(lon, lat, height_gpm)
         jp_map.shade_plot(lon, lat, rh,
                           label="relative humidity (%)",